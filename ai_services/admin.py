@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ChatSession, ChatMessage, UserEmbedding, CourseEmbedding, AIFeedback
+from .models import ChatSession, ChatMessage, UserEmbedding, CourseEmbedding, CoursePopularity, UserRecommendation, AIFeedback, LLMCallLog
 
 class ChatMessageInline(admin.TabularInline):
     model = ChatMessage
@@ -8,7 +8,7 @@ class ChatMessageInline(admin.TabularInline):
 
 @admin.register(ChatSession)
 class ChatSessionAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'title', 'created_at', 'updated_at')
+    list_display = ('id', 'user', 'course', 'title', 'created_at', 'updated_at')
     list_filter = ('created_at', 'updated_at')
     search_fields = ('user__email', 'user__username', 'title')
     inlines = [ChatMessageInline]
@@ -24,19 +24,36 @@ class ChatMessageAdmin(admin.ModelAdmin):
 
 @admin.register(UserEmbedding)
 class UserEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'updated_at')
+    list_display = ('id', 'user', 'model_name', 'dimensions', 'updated_at')
     list_filter = ('updated_at',)
     search_fields = ('user__email', 'user__username')
 
 @admin.register(CourseEmbedding)
 class CourseEmbeddingAdmin(admin.ModelAdmin):
-    list_display = ('id', 'course', 'updated_at')
+    list_display = ('id', 'course', 'model_name', 'dimensions', 'updated_at')
     list_filter = ('updated_at',)
     search_fields = ('course__title',)
 
+@admin.register(CoursePopularity)
+class CoursePopularityAdmin(admin.ModelAdmin):
+    list_display = ('id', 'course', 'enrollment_count', 'trending_score', 'updated_at')
+    list_filter = ('level', 'updated_at')
+    search_fields = ('course__title',)
+
+@admin.register(UserRecommendation)
+class UserRecommendationAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'course', 'rank', 'score', 'generated_at')
+    list_filter = ('generated_at',)
+    search_fields = ('user__email', 'course__title')
+
 @admin.register(AIFeedback)
 class AIFeedbackAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'content_type', 'content_id', 'score', 'created_at')
     list_filter = ('content_type', 'created_at')
     search_fields = ('user__email', 'feedback')
 
+@admin.register(LLMCallLog)
+class LLMCallLogAdmin(admin.ModelAdmin):
+    list_display = ('id', 'endpoint', 'user', 'operation', 'model', 'route', 'route_reason', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'retries', 'outcome', 'cost', 'created_at')
+    list_filter = ('outcome', 'operation', 'model', 'route', 'route_reason', 'endpoint', 'created_at')
+    search_fields = ('endpoint', 'user__email', 'error')
@@ -0,0 +1,318 @@
+import os
+import time
+import numpy as np
+from django.conf import settings
+from .vectors import get_snapshot_dir, load_course_snapshot
+
+ANN_INDEX_FILE = 'courses-ann.npz'
+
+def top_k(scores, count):
+    """
+    Return the positions of the `count` highest scores, best first.
+    """
+    count = min(count, len(scores))
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    if count < len(scores):
+        top = np.argpartition(-scores, count - 1)[:count]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+class IVFIndex:
+    """
+    Inverted-file index: course vectors are clustered with KMeans and a query
+    only scores the rows in the `probes` clusters whose centroids are closest.
+    """
+    name = 'ivf'
+
+    def __init__(self, centroids, order, offsets):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, vectors, n_clusters=None, sample_size=50000, seed=0):
+        """
+        Cluster a normalized matrix into inverted lists.
+
+        Args:
+            vectors: Normalized (N, D) float32 matrix
+            n_clusters: Number of clusters (defaults to sqrt(N))
+            sample_size: Rows used to fit KMeans; all rows are assigned afterwards
+            seed: Random seed for reproducible builds
+        """
+        from sklearn.cluster import KMeans
+
+        n_clusters = n_clusters or max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > sample_size:
+            sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+
+        kmeans = KMeans(n_clusters=n_clusters, n_init=1, random_state=seed)
+        kmeans.fit(sample)
+
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms == 0, 1, norms)
+
+        # Assign in chunks so the (N, clusters) score matrix stays small
+        labels = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 10000):
+            block = np.asarray(vectors[start:start + 10000])
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(labels, kind='stable')
+        offsets = np.searchsorted(labels[order], np.arange(n_clusters + 1))
+        return cls(centroids, order, offsets)
+
+    def candidates(self, query, probes):
+        probes = min(max(1, probes), len(self.centroids))
+        clusters = top_k(self.centroids @ query, probes)
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in clusters])
+
+    def arrays(self):
+        return {'centroids': self.centroids, 'order': self.order, 'offsets': self.offsets}
+
+class LSHIndex:
+    """
+    Random-hyperplane LSH: each vector is bucketed by the signs of its
+    projections onto `n_bits` random hyperplanes. A query visits its own
+    bucket first, then up to `probes - 1` neighbouring buckets, flipping the
+    bits whose projections were closest to zero first (multi-probe LSH).
+    """
+    name = 'lsh'
+
+    # Only the least certain bits are considered for flipping
+    MAX_FLIP_BITS = 10
+
+    def __init__(self, planes, order, codes, offsets):
+        self.planes = planes
+        self.order = order
+        self.codes = codes
+        self.offsets = offsets
+        self._weights = np.left_shift(np.int64(1), np.arange(len(planes), dtype=np.int64))
+
+    @classmethod
+    def build(cls, vectors, n_bits=None, bucket_size=32, seed=0):
+        """
+        Hash a normalized matrix into sign-pattern buckets.
+
+        Args:
+            vectors: Normalized (N, D) float32 matrix
+            n_bits: Hyperplanes per code (defaults to about N / bucket_size buckets)
+            bucket_size: Target rows per bucket when n_bits is not given
+            seed: Random seed for reproducible builds
+        """
+        n_bits = n_bits or int(np.clip(np.ceil(np.log2(max(len(vectors), 1) / bucket_size)), 1, 62))
+        rng = np.random.default_rng(seed)
+        planes = rng.standard_normal((n_bits, vectors.shape[1])).astype(np.float32)
+        weights = np.left_shift(np.int64(1), np.arange(n_bits, dtype=np.int64))
+
+        row_codes = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), 10000):
+            block = np.asarray(vectors[start:start + 10000])
+            row_codes[start:start + len(block)] = ((block @ planes.T) > 0).astype(np.int64) @ weights
+
+        order = np.argsort(row_codes, kind='stable')
+        codes, offsets = np.unique(row_codes[order], return_index=True)
+        offsets = np.append(offsets, len(order))
+        return cls(planes, order, codes, offsets)
+
+    def _probe_codes(self, query, probes):
+        projections = self.planes @ query
+        code = int(((projections > 0).astype(np.int64) @ self._weights))
+        if probes <= 1:
+            return [code]
+
+        # Rank flip sets of the least certain bits by total margin
+        uncertain = np.argsort(np.abs(projections))[:self.MAX_FLIP_BITS]
+        margins = np.abs(projections[uncertain])
+        subsets = np.arange(1, 1 << len(uncertain), dtype=np.int64)
+        membership = (subsets[:, None] >> np.arange(len(uncertain))) & 1
+        ranked = membership[np.argsort(membership @ margins, kind='stable')][:probes - 1]
+
+        flips = ranked @ self._weights[uncertain]
+        return [code] + [code ^ int(flip) for flip in flips]
+
+    def candidates(self, query, probes):
+        codes = np.array(self._probe_codes(query, probes), dtype=np.int64)
+        slots = np.searchsorted(self.codes, codes)
+        found = (slots < len(self.codes)) & (self.codes[np.minimum(slots, len(self.codes) - 1)] == codes)
+        chunks = [self.order[self.offsets[s]:self.offsets[s + 1]] for s in slots[found]]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def arrays(self):
+        return {'planes': self.planes, 'order': self.order, 'codes': self.codes, 'offsets': self.offsets}
+
+ANN_BACKENDS = {
+    IVFIndex.name: IVFIndex,
+    LSHIndex.name: LSHIndex,
+}
+
+def ann_search(ann, vectors, query, count, probes, exclude_mask=None):
+    """
+    Score only the ANN candidates for a query.
+
+    Args:
+        ann: An IVFIndex or LSHIndex built over `vectors`
+        vectors: The normalized matrix the index was built from
+        query: Normalized query vector
+        count: Number of results to return
+        probes: Clusters (IVF) or buckets (LSH) to visit
+        exclude_mask: Optional boolean array over rows to leave out
+
+    Returns:
+        tuple: (row positions, scores), best first
+    """
+    candidates = ann.candidates(query, probes)
+    if exclude_mask is not None and len(candidates):
+        candidates = candidates[~exclude_mask[candidates]]
+    if len(candidates) == 0:
+        return candidates, np.empty(0, dtype=np.float32)
+
+    candidates = np.sort(candidates)  # Sequential reads from the memory-mapped matrix
+    scores = vectors[candidates] @ query
+    top = top_k(scores, count)
+    return candidates[top], scores[top]
+
+def save_ann_index(ann, generation, directory=None):
+    """
+    Persist an ANN index next to the snapshot it was built from.
+    """
+    directory = directory or get_snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{generation}.{ANN_INDEX_FILE}")
+    with open(temp_path, 'wb') as index_file:
+        np.savez(index_file, backend=np.array(ann.name), generation=np.array(generation or ''), **ann.arrays())
+    os.replace(temp_path, os.path.join(directory, ANN_INDEX_FILE))
+
+def load_ann_index(generation, directory=None):
+    """
+    Load the persisted ANN index if it was built from the given snapshot generation.
+
+    Returns:
+        IVFIndex or LSHIndex, or None when there is no matching index
+    """
+    path = os.path.join(directory or get_snapshot_dir(), ANN_INDEX_FILE)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['generation']) != (generation or ''):
+                return None
+            backend = ANN_BACKENDS.get(str(data['backend']))
+            if backend is None:
+                return None
+            return backend(**{key: data[key] for key in data.files if key not in ('backend', 'generation')})
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def build_ann_index(backend, directory=None, **options):
+    """
+    Build an ANN index over the current course snapshot and persist it.
+
+    Args:
+        backend: 'ivf' or 'lsh'
+        directory: Snapshot directory (defaults to EMBEDDING_SNAPSHOT_DIR)
+        **options: Passed to the backend's build (n_clusters, n_bits, seed, ...)
+
+    Returns:
+        tuple: (ann, vectors) or None when there is no snapshot to index
+    """
+    snapshot = load_course_snapshot(directory)
+    if snapshot is None:
+        return None
+
+    manifest, vectors, _ = snapshot
+    ann = ANN_BACKENDS[backend].build(vectors, **options)
+    save_ann_index(ann, manifest['generation'], directory)
+    return ann, vectors
+
+def evaluate_ann(vectors, ann, queries, count=10, probe_values=(1, 2, 4, 8, 16, 32)):
+    """
+    Measure recall@count and per-query latency of an ANN index against exact search.
+
+    Args:
+        vectors: The normalized matrix the index was built from
+        ann: The ANN index
+        queries: Normalized (Q, D) query matrix
+        count: Number of results per query
+        probe_values: Probe counts to evaluate
+
+    Returns:
+        dict: Exact-search latency and one row per probe count with recall,
+            candidate count and latency percentiles in milliseconds
+    """
+    exact_results = []
+    exact_times = []
+    for query in queries:
+        started = time.perf_counter()
+        exact_results.append(set(top_k(vectors @ query, count).tolist()))
+        exact_times.append((time.perf_counter() - started) * 1000)
+
+    rows = []
+    for probes in probe_values:
+        recalls = []
+        times = []
+        candidate_counts = []
+        for query, expected in zip(queries, exact_results):
+            started = time.perf_counter()
+            positions, _ = ann_search(ann, vectors, query, count, probes)
+            times.append((time.perf_counter() - started) * 1000)
+            recalls.append(len(expected.intersection(positions.tolist())) / max(len(expected), 1))
+            candidate_counts.append(len(ann.candidates(query, probes)))
+
+        rows.append({
+            'probes': probes,
+            'recall': float(np.mean(recalls)),
+            'mean_candidates': float(np.mean(candidate_counts)),
+            'latency_ms_p50': float(np.percentile(times, 50)),
+            'latency_ms_p95': float(np.percentile(times, 95)),
+        })
+
+    return {
+        'backend': ann.name,
+        'courses': len(vectors),
+        'queries': len(queries),
+        'count': count,
+        'exact_latency_ms_p50': float(np.percentile(exact_times, 50)),
+        'exact_latency_ms_p95': float(np.percentile(exact_times, 95)),
+        'operating_points': rows,
+    }
+
+def sample_queries(vectors, count, seed=0):
+    """
+    Pick normalized query vectors for offline evaluation.
+
+    Real user vectors are preferred; course vectors fill in when there are
+    too few users.
+
+    Returns:
+        numpy.ndarray: (Q, D) query matrix
+    """
+    from .embedding_index import normalize
+    from .models import UserEmbedding
+    from .vectors import CURRENT_VECTOR_FORMAT
+
+    queries = []
+    rows = UserEmbedding.objects.filter(
+        vector_format=CURRENT_VECTOR_FORMAT, dimensions=vectors.shape[1]
+    ).order_by('?')[:count]
+    for embedding in rows:
+        queries.append(normalize(embedding.get_vector()))
+
+    if len(queries) < count:
+        rng = np.random.default_rng(seed)
+        positions = rng.choice(len(vectors), min(count - len(queries), len(vectors)), replace=False)
+        queries.extend(np.asarray(vectors[np.sort(positions)]))
+
+    return np.vstack(queries)
+
+def get_ann_settings():
+    return (
+        getattr(settings, 'RECOMMENDER_ANN_BACKEND', 'exact'),
+        getattr(settings, 'RECOMMENDER_ANN_MIN_COURSES', 20000),
+        getattr(settings, 'RECOMMENDER_ANN_PROBES', 8),
+    )
@@ -1,11 +1,8 @@
 import numpy as np
 from django.db.models import Avg, Count, Sum, F, Q
 from django.utils import timezone
-from openai import OpenAI
 from django.conf import settings
-
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+from .model_routing import routed_completion, validate_json_object
 
 def analyze_quiz_results(quiz_id, user_id=None):
     """
@@ -100,6 +97,86 @@ def analyze_quiz_results(quiz_id, user_id=None):
         print(f"Error analyzing quiz results: {str(e)}")
         return None
 
+def collect_feedback_data(user, course_id=None):
+    """
+    Collect the per-course performance data personalized feedback is based on.
+    
+    Args:
+        user: User object
+        course_id: Optional course ID to filter results
+        
+    Returns:
+        list: Course performance data, or None if the user has no enrollments
+    """
+    from courses.models import Enrollment, LessonProgress, QuizAttempt
+    
+    # Get enrollments
+    enrollments_query = Enrollment.objects.filter(user=user)
+    if course_id:
+        enrollments_query = enrollments_query.filter(course_id=course_id)
+    
+    if not enrollments_query.exists():
+        return None
+    
+    # Collect data for analysis
+    course_data = []
+    
+    for enrollment in enrollments_query:
+        course = enrollment.course
+        
+        # Get lesson progress
+        lesson_progress = LessonProgress.objects.filter(enrollment=enrollment)
+        completed_lessons = lesson_progress.filter(status='completed').count()
+        total_lessons = lesson_progress.count()
+        
+        # Get quiz attempts
+        quiz_attempts = QuizAttempt.objects.filter(
+            user=user,
+            quiz__lesson__course=course,
+            is_completed=True
+        )
+        
+        avg_score = quiz_attempts.aggregate(avg=Avg('score'))['avg'] or 0
+        
+        # Identify strengths and weaknesses based on quiz performance
+        strengths = []
+        weaknesses = []
+        
+        if quiz_attempts.exists():
+            # Group quiz responses by question type and calculate average scores
+            from courses.models import QuizResponse
+            
+            question_type_scores = QuizResponse.objects.filter(
+                attempt__in=quiz_attempts
+            ).values(
+                'question__question_type'
+            ).annotate(
+                avg_score=Avg('score'),
+                max_possible=Avg('question__points')
+            )
+            
+            for item in question_type_scores:
+                question_type = item['question__question_type']
+                score_pct = (item['avg_score'] / item['max_possible']) * 100 if item['max_possible'] else 0
+                
+                if score_pct >= 80:
+                    strengths.append(question_type)
+                elif score_pct <= 60:
+                    weaknesses.append(question_type)
+        
+        course_data.append({
+            'course_id': course.id,
+            'course_title': course.title,
+            'progress': enrollment.progress,
+            'completed_lessons': completed_lessons,
+            'total_lessons': total_lessons,
+            'avg_quiz_score': avg_score,
+            'strengths': strengths,
+            'weaknesses': weaknesses
+        })
+    
+    return course_data
+
 def generate_personalized_feedback(user_id, course_id=None):
     """
     Generate personalized feedback for a user based on their performance.
@@ -111,85 +188,22 @@ def generate_personalized_feedback(user_id, course_id=None):
     Returns:
         dict: Personalized feedback
     """
-    from courses.models import Enrollment, LessonProgress, QuizAttempt
     from django.contrib.auth import get_user_model
     
     User = get_user_model()
     
     try:
         user = User.objects.get(id=user_id)
-        
-        # Get enrollments
-        enrollments_query = Enrollment.objects.filter(user=user)
-        if course_id:
-            enrollments_query = enrollments_query.filter(course_id=course_id)
+        course_data = collect_feedback_data(user, course_id)
         
         # If no enrollments, return early
-        if not enrollments_query.exists():
+        if course_data is None:
             return {
                 'user_id': user_id,
                 'message': "No course data available for analysis",
                 'recommendations': []
             }
         
-        # Collect data for analysis
-        course_data = []
-        
-        for enrollment in enrollments_query:
-            course = enrollment.course
-            
-            # Get lesson progress
-            lesson_progress = LessonProgress.objects.filter(enrollment=enrollment)
-            completed_lessons = lesson_progress.filter(status='completed').count()
-            total_lessons = lesson_progress.count()
-            
-            # Get quiz attempts
-            quiz_attempts = QuizAttempt.objects.filter(
-                user=user,
-                quiz__lesson__course=course,
-                is_completed=True
-            )
-            
-            avg_score = quiz_attempts.aggregate(avg=Avg('score'))['avg'] or 0
-            
-            # Identify strengths and weaknesses based on quiz performance
-            strengths = []
-            weaknesses = []
-            
-            if quiz_attempts.exists():
-                # Group quiz responses by question type and calculate average scores
-                from courses.models import QuizResponse, Question
-                from django.db.models import Avg, F, Q
-                
-                question_type_scores = QuizResponse.objects.filter(
-                    attempt__in=quiz_attempts
-                ).values(
-                    'question__question_type'
-                ).annotate(
-                    avg_score=Avg('score'),
-                    max_possible=Avg('question__points')
-                )
-                
-                for item in question_type_scores:
-                    question_type = item['question__question_type']
-                    score_pct = (item['avg_score'] / item['max_possible']) * 100 if item['max_possible'] else 0
-                    
-                    if score_pct >= 80:
-                        strengths.append(question_type)
-                    elif score_pct <= 60:
-                        weaknesses.append(question_type)
-            
-            course_data.append({
-                'course_id': course.id,
-                'course_title': course.title,
-                'progress': enrollment.progress,
-                'completed_lessons': completed_lessons,
-                'total_lessons': total_lessons,
-                'avg_quiz_score': avg_score,
-                'strengths': strengths,
-                'weaknesses': weaknesses
-            })
-        
         # Generate personalized feedback using AI
         feedback = generate_ai_feedback(user, course_data)
         
@@ -207,6 +221,83 @@ def generate_personalized_feedback(user_id, course_id=None):
             'error': str(e)
         }
 
+def build_feedback_messages(user, course_data):
+    """
+    Build the OpenAI chat messages for personalized feedback.
+    
+    Args:
+        user: User object
+        course_data: List of course performance data
+        
+    Returns:
+        list: Chat messages
+    """
+    # Prepare prompt for the AI
+    prompt = f"""
+    I need to generate personalized learning feedback for a student based on their performance data.
+    
+    Student information:
+    - Name: {user.first_name} {user.last_name}
+    - Learning interests: {', '.join(user.interests) if user.interests else 'Not specified'}
+    - Learning style: {user.learning_style if user.learning_style else 'Not specified'}
+    
+    Course performance data:
+    """
+    
+    for course in course_data:
+        prompt += f"""
+        Course: {course['course_title']}
+        - Progress: {course['progress']:.1f}%
+        - Completed lessons: {course['completed_lessons']} of {course['total_lessons']}
+        - Average quiz score: {course['avg_quiz_score']:.1f}%
+        - Strengths: {', '.join(course['strengths']) if course['strengths'] else 'None identified'}
+        - Weaknesses: {', '.join(course['weaknesses']) if course['weaknesses'] else 'None identified'}
+        """
+    
+    prompt += """
+    Please provide:
+    1. A personalized assessment of the student's performance
+    2. 3-5 specific recommendations for improvement
+    3. Suggested learning resources or activities based on their performance
+    
+    Format your response as JSON with the following structure:
+    {
+        "assessment": "Overall assessment of performance",
+        "recommendations": [
+            "Specific recommendation 1",
+            "Specific recommendation 2",
+            ...
+        ],
+        "resources": [
+            {
+                "title": "Resource title",
+                "description": "Brief description",
+                "type": "article|video|exercise|quiz"
+            },
+            ...
+        ]
+    }
+    """
+    
+    return [
+        {"role": "system", "content": "You are an expert educational advisor who provides personalized learning feedback."},
+        {"role": "user", "content": prompt}
+    ]
+
+def fallback_feedback():
+    """
+    Generic feedback used when the AI call fails.
+    """
+    return {
+        "assessment": "Unable to generate personalized assessment at this time.",
+        "recommendations": [
+            "Continue working through your course materials",
+            "Review any lessons where you scored below 70%",
+            "Reach out to instructors if you need additional help"
+        ],
+        "resources": []
+    }
+
 def generate_ai_feedback(user, course_data):
     """
     Generate AI-powered feedback based on user performance data.
@@ -219,60 +310,11 @@ def generate_ai_feedback(user, course_data):
         dict: AI-generated feedback
     """
     try:
-        # Prepare prompt for the AI
-        prompt = f"""
-        I need to generate personalized learning feedback for a student based on their performance data.
-        
-        Student information:
-        - Name: {user.first_name} {user.last_name}
-        - Learning interests: {', '.join(user.interests) if user.interests else 'Not specified'}
-        - Learning style: {user.learning_style if user.learning_style else 'Not specified'}
-        
-        Course performance data:
-        """
-        
-        for course in course_data:
-            prompt += f"""
-            Course: {course['course_title']}
-            - Progress: {course['progress']:.1f}%
-            - Completed lessons: {course['completed_lessons']} of {course['total_lessons']}
-            - Average quiz score: {course['avg_quiz_score']:.1f}%
-            - Strengths: {', '.join(course['strengths']) if course['strengths'] else 'None identified'}
-            - Weaknesses: {', '.join(course['weaknesses']) if course['weaknesses'] else 'None identified'}
-            """
-        
-        prompt += """
-        Please provide:
-        1. A personalized assessment of the student's performance
-        2. 3-5 specific recommendations for improvement
-        3. Suggested learning resources or activities based on their performance
-        
-        Format your response as JSON with the following structure:
-        {
-            "assessment": "Overall assessment of performance",
-            "recommendations": [
-                "Specific recommendation 1",
-                "Specific recommendation 2",
-                ...
-            ],
-            "resources": [
-                {
-                    "title": "Resource title",
-                    "description": "Brief description",
-                    "type": "article|video|exercise|quiz"
-                },
-                ...
-            ]
-        }
-        """
-        
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert educational advisor who provides personalized learning feedback."},
-                {"role": "user", "content": prompt}
-            ],
+        response = routed_completion(
+            'feedback',
+            build_feedback_messages(user, course_data),
+            validate=validate_json_object('assessment', 'recommendations'),
             response_format={"type": "json_object"},
             max_tokens=1000,
             temperature=0.5,
@@ -288,15 +330,7 @@ def generate_ai_feedback(user, course_data):
     
     except Exception as e:
         print(f"Error generating AI feedback: {str(e)}")
-        return {
-            "assessment": "Unable to generate personalized assessment at this time.",
-            "recommendations": [
-                "Continue working through your course materials",
-                "Review any lessons where you scored below 70%",
-                "Reach out to instructors if you need additional help"
-            ],
-            "resources": []
-        }
+        return fallback_feedback()
 
 def identify_knowledge_gaps(user_id):
     """
@@ -374,6 +408,114 @@ def identify_knowledge_gaps(user_id):
         print(f"Error identifying knowledge gaps: {str(e)}")
         return []
 
+def days_until(target_date):
+    """
+    Days from today until a 'YYYY-MM-DD' target date, or None without one.
+    """
+    if not target_date:
+        return None
+    from datetime import datetime
+    today = timezone.now().date()
+    target = datetime.strptime(target_date, '%Y-%m-%d').date()
+    return (target - today).days
+
+def collect_study_plan_data(user, course_id=None):
+    """
+    Collect the prioritized remaining lessons of a user's active courses.
+    
+    Args:
+        user: User object
+        course_id: Optional course ID to focus on
+        
+    Returns:
+        list: Course data, or None if the user has no active enrollments
+    """
+    from courses.models import Enrollment, LessonProgress
+    
+    # Get enrollments
+    enrollments_query = Enrollment.objects.filter(user=user, status='active')
+    if course_id:
+        enrollments_query = enrollments_query.filter(course_id=course_id)
+    
+    if not enrollments_query.exists():
+        return None
+    
+    # Collect course data
+    courses_data = []
+    
+    for enrollment in enrollments_query:
+        course = enrollment.course
+        
+        # Get incomplete lessons
+        incomplete_lessons = LessonProgress.objects.filter(
+            enrollment=enrollment
+        ).exclude(
+            status='completed'
+        ).select_related('lesson')
+        
+        # Skip if all lessons are completed
+        if not incomplete_lessons.exists():
+            continue
+        
+        # Get knowledge gaps
+        knowledge_gaps = identify_knowledge_gaps(user.id)
+        problem_lesson_ids = [gap['lesson_id'] for gap in knowledge_gaps]
+        
+        # Prioritize lessons
+        prioritized_lessons = []
+        
+        # First priority: Lessons with knowledge gaps
+        for progress in incomplete_lessons:
+            if progress.lesson.id in problem_lesson_ids:
+                prioritized_lessons.append({
+                    'lesson_id': progress.lesson.id,
+                    'lesson_title': progress.lesson.title,
+                    'priority': 'high',
+                    'status': progress.status,
+                    'duration': progress.lesson.duration,
+                    'order': progress.lesson.order
+                })
+        
+        # Second priority: Lessons in progress
+        for progress in incomplete_lessons:
+            if progress.status == 'in_progress' and progress.lesson.id not in problem_lesson_ids:
+                prioritized_lessons.append({
+                    'lesson_id': progress.lesson.id,
+                    'lesson_title': progress.lesson.title,
+                    'priority': 'medium',
+                    'status': progress.status,
+                    'duration': progress.lesson.duration,
+                    'order': progress.lesson.order
+                })
+        
+        # Third priority: Not started lessons
+        for progress in incomplete_lessons:
+            if progress.status == 'not_started' and progress.lesson.id not in problem_lesson_ids:
+                prioritized_lessons.append({
+                    'lesson_id': progress.lesson.id,
+                    'lesson_title': progress.lesson.title,
+                    'priority': 'normal',
+                    'status': progress.status,
+                    'duration': progress.lesson.duration,
+                    'order': progress.lesson.order
+                })
+        
+        # Sort by priority and then by lesson order
+        prioritized_lessons.sort(key=lambda x: (
+            0 if x['priority'] == 'high' else 1 if x['priority'] == 'medium' else 2,
+            x['order']
+        ))
+        
+        courses_data.append({
+            'course_id': course.id,
+            'course_title': course.title,
+            'progress': enrollment.progress,
+            'remaining_lessons': len(prioritized_lessons),
+            'lessons': prioritized_lessons
+        })
+    
+    return courses_data
+
 def generate_study_plan(user_id, course_id=None, target_date=None):
     """
     Generate a personalized study plan based on user performance and goals.
@@ -386,21 +528,16 @@ def generate_study_plan(user_id, course_id=None, target_date=None):
     Returns:
         dict: Personalized study plan
     """
-    from courses.models import Enrollment, LessonProgress, Course
     from django.contrib.auth import get_user_model
     
     User = get_user_model()
     
     try:
         user = User.objects.get(id=user_id)
-        
-        # Get enrollments
-        enrollments_query = Enrollment.objects.filter(user=user, status='active')
-        if course_id:
-            enrollments_query = enrollments_query.filter(course_id=course_id)
+        courses_data = collect_study_plan_data(user, course_id)
         
         # If no enrollments, return early
-        if not enrollments_query.exists():
+        if courses_data is None:
             return {
                 'user_id': user_id,
                 'message': "No active courses found for study plan",
@@ -408,93 +545,13 @@ def generate_study_plan(user_id, course_id=None, target_date=None):
             }
         
         # Calculate days until target date
-        days_remaining = None
-        if target_date:
-            from datetime import datetime
-            today = timezone.now().date()
-            target = datetime.strptime(target_date, '%Y-%m-%d').date()
-            days_remaining = (target - today).days
-            
-            if days_remaining <= 0:
-                return {
-                    'user_id': user_id,
-                    'message': "Target date must be in the future",
-                    'plan': []
-                }
-        
-        # Collect course data
-        courses_data = []
-        
-        for enrollment in enrollments_query:
-            course = enrollment.course
-            
-            # Get incomplete lessons
-            incomplete_lessons = LessonProgress.objects.filter(
-                enrollment=enrollment
-            ).exclude(
-                status='completed'
-            ).select_related('lesson')
-            
-            # Skip if all lessons are completed
-            if not incomplete_lessons.exists():
-                continue
-            
-            # Get knowledge gaps
-            knowledge_gaps = identify_knowledge_gaps(user_id)
-            problem_lesson_ids = [gap['lesson_id'] for gap in knowledge_gaps]
-            
-            # Prioritize lessons
-            prioritized_lessons = []
-            
-            # First priority: Lessons with knowledge gaps
-            for progress in incomplete_lessons:
-                if progress.lesson.id in problem_lesson_ids:
-                    prioritized_lessons.append({
-                        'lesson_id': progress.lesson.id,
-                        'lesson_title': progress.lesson.title,
-                        'priority': 'high',
-                        'status': progress.status,
-                        'duration': progress.lesson.duration,
-                        'order': progress.lesson.order
-                    })
-            
-            # Second priority: Lessons in progress
-            for progress in incomplete_lessons:
-                if progress.status == 'in_progress' and progress.lesson.id not in problem_lesson_ids:
-                    prioritized_lessons.append({
-                        'lesson_id': progress.lesson.id,
-                        'lesson_title': progress.lesson.title,
-                        'priority': 'medium',
-                        'status': progress.status,
-                        'duration': progress.lesson.duration,
-                        'order': progress.lesson.order
-                    })
-            
-            # Third priority: Not started lessons
-            for progress in incomplete_lessons:
-                if progress.status == 'not_started' and progress.lesson.id not in problem_lesson_ids:
-                    prioritized_lessons.append({
-                        'lesson_id': progress.lesson.id,
-                        'lesson_title': progress.lesson.title,
-                        'priority': 'normal',
-                        'status': progress.status,
-                        'duration': progress.lesson.duration,
-                        'order': progress.lesson.order
-                    })
-            
-            # Sort by priority and then by lesson order
-            prioritized_lessons.sort(key=lambda x: (
-                0 if x['priority'] == 'high' else 1 if x['priority'] == 'medium' else 2,
-                x['order']
-            ))
-            
-            courses_data.append({
-                'course_id': course.id,
-                'course_title': course.title,
-                'progress': enrollment.progress,
-                'remaining_lessons': len(prioritized_lessons),
-                'lessons': prioritized_lessons
-            })
+        days_remaining = days_until(target_date)
+        if days_remaining is not None and days_remaining <= 0:
+            return {
+                'user_id': user_id,
+                'message': "Target date must be in the future",
+                'plan': []
+            }
         
         # Generate study plan
         study_plan = generate_ai_study_plan(user, courses_data, days_remaining)
@@ -516,9 +573,9 @@ def generate_study_plan(user_id, course_id=None, target_date=None):
             'plan': []
         }
 
-def generate_ai_study_plan(user, courses_data, days_remaining=None):
+def build_study_plan_messages(user, courses_data, days_remaining=None):
     """
-    Generate AI-powered study plan based on course data.
+    Build the OpenAI chat messages for a study plan.
     
     Args:
         user: User object
@@ -526,84 +583,151 @@ def generate_ai_study_plan(user, courses_data, days_remaining=None):
         days_remaining: Optional days until target date
         
     Returns:
-        dict: AI-generated study plan
+        list: Chat messages
     """
-    try:
-        # Prepare prompt for the AI
-        prompt = f"""
-        I need to generate a personalized study plan for a student based on their course data.
-        
-        Student information:
-        - Name: {user.first_name} {user.last_name}
-        - Learning interests: {', '.join(user.interests) if user.interests else 'Not specified'}
-        - Learning style: {user.learning_style if user.learning_style else 'Not specified'}
+    # Prepare prompt for the AI
+    prompt = f"""
+    I need to generate a personalized study plan for a student based on their course data.
+    
+    Student information:
+    - Name: {user.first_name} {user.last_name}
+    - Learning interests: {', '.join(user.interests) if user.interests else 'Not specified'}
+    - Learning style: {user.learning_style if user.learning_style else 'Not specified'}
+    """
+    
+    if days_remaining:
+        prompt += f"\nThe student has {days_remaining} days to complete their courses.\n"
+    
+    prompt += "\nCourse data:\n"
+    
+    for course in courses_data:
+        prompt += f"""
+        Course: {course['course_title']}
+        - Current progress: {course['progress']:.1f}%
+        - Remaining lessons: {course['remaining_lessons']}
+        
+        Lessons to complete:
         """
         
-        if days_remaining:
-            prompt += f"\nThe student has {days_remaining} days to complete their courses.\n"
+        for lesson in course['lessons'][:10]:  # Limit to first 10 lessons to avoid token limits
+            prompt += f"- {lesson['lesson_title']} (Priority: {lesson['priority']}, Duration: {lesson['duration']} minutes)\n"
+    
+    prompt += """
+    Please create a structured study plan that:
+    1. Distributes the workload evenly over the available time
+    2. Prioritizes high-priority lessons
+    3. Groups related topics together when possible
+    4. Includes time for review and practice
+    5. Accounts for the student's learning style
+    
+    Format your response as JSON with the following structure:
+    {
+        "overview": "Brief overview of the study plan",
+        "recommendations": [
+            "General recommendation 1",
+            "General recommendation 2",
+            ...
+        ],
+        "weekly_plan": [
+            {
+                "week": 1,
+                "focus": "Main focus for this week",
+                "days": [
+                    {
+                        "day": "Monday",
+                        "activities": [
+                            {
+                                "course": "Course title",
+                                "lesson": "Lesson title",
+                                "duration": 30,
+                                "type": "lesson|review|practice"
+                            },
+                            ...
+                        ]
+                    },
+                    ...
+                ]
+            },
+            ...
+        ]
+    }
+    """
+    
+    return [
+        {"role": "system", "content": "You are an expert educational advisor who creates personalized study plans."},
+        {"role": "user", "content": prompt}
+    ]
+
+def fallback_study_plan(days_remaining=None):
+    """
+    Basic weekly study plan used when the AI call fails.
+    """
+    weeks_needed = 1
+    if days_remaining:
+        weeks_needed = max(1, days_remaining // 7)
+    
+    fallback_plan = {
+        "overview": "Basic study plan to help you complete your courses",
+        "recommendations": [
+            "Focus on high-priority lessons first",
+            "Spend at least 30 minutes per day on your courses",
+            "Take breaks between study sessions",
+            "Review material regularly to reinforce learning"
+        ],
+        "weekly_plan": []
+    }
+    
+    # Add basic weekly structure
+    for week in range(weeks_needed):
+        week_plan = {
+            "week": week + 1,
+            "focus": "Complete high-priority lessons",
+            "days": []
+        }
         
-        prompt += "\nCourse data:\n"
+        # Add days
+        for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
+            day_plan = {
+                "day": day,
+                "activities": [
+                    {
+                        "course": "Your course",
+                        "lesson": "Next priority lesson",
+                        "duration": 45,
+                        "type": "lesson"
+                    },
+                    {
+                        "course": "Your course",
+                        "lesson": "Review previous material",
+                        "duration": 15,
+                        "type": "review"
+                    }
+                ]
+            }
+            week_plan["days"].append(day_plan)
         
-        for course in courses_data:
-            prompt += f"""
-            Course: {course['course_title']}
-            - Current progress: {course['progress']:.1f}%
-            - Remaining lessons: {course['remaining_lessons']}
-            
-            Lessons to complete:
-            """
-            
-            for lesson in course['lessons'][:10]:  # Limit to first 10 lessons to avoid token limits
-                prompt += f"- {lesson['lesson_title']} (Priority: {lesson['priority']}, Duration: {lesson['duration']} minutes)\n"
-        
-        prompt += """
-        Please create a structured study plan that:
-        1. Distributes the workload evenly over the available time
-        2. Prioritizes high-priority lessons
-        3. Groups related topics together when possible
-        4. Includes time for review and practice
-        5. Accounts for the student's learning style
-        
-        Format your response as JSON with the following structure:
-        {
-            "overview": "Brief overview of the study plan",
-            "recommendations": [
-                "General recommendation 1",
-                "General recommendation 2",
-                ...
-            ],
-            "weekly_plan": [
-                {
-                    "week": 1,
-                    "focus": "Main focus for this week",
-                    "days": [
-                        {
-                            "day": "Monday",
-                            "activities": [
-                                {
-                                    "course": "Course title",
-                                    "lesson": "Lesson title",
-                                    "duration": 30,
-                                    "type": "lesson|review|practice"
-                                },
-                                ...
-                            ]
-                        },
-                        ...
-                    ]
-                },
-                ...
-            ]
-        }
-        """
+        fallback_plan["weekly_plan"].append(week_plan)
+    
+    return fallback_plan
+
+def generate_ai_study_plan(user, courses_data, days_remaining=None):
+    """
+    Generate AI-powered study plan based on course data.
+    
+    Args:
+        user: User object
+        courses_data: List of course data
+        days_remaining: Optional days until target date
         
+    Returns:
+        dict: AI-generated study plan
+    """
+    try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert educational advisor who creates personalized study plans."},
-                {"role": "user", "content": prompt}
-            ],
+        response = routed_completion(
+            'study_plan',
+            build_study_plan_messages(user, courses_data, days_remaining),
+            validate=validate_json_object('overview', 'weekly_plan'),
             response_format={"type": "json_object"},
             max_tokens=2000,
             temperature=0.5,
@@ -621,53 +745,4 @@ def generate_ai_study_plan(user, courses_data, days_remaining=None):
         print(f"Error generating AI study plan: {str(e)}")
         
         # Return a basic fallback plan
-        weeks_needed = 1
-        if days_remaining:
-            weeks_needed = max(1, days_remaining // 7)
-        
-        fallback_plan = {
-            "overview": "Basic study plan to help you complete your courses",
-            "recommendations": [
-                "Focus on high-priority lessons first",
-                "Spend at least 30 minutes per day on  [
-                "Focus on high-priority lessons first",
-                "Spend at least 30 minutes per day on your courses",
-                "Take breaks between study sessions",
-                "Review material regularly to reinforce learning"
-            ],
-            "weekly_plan": []
-        }
-        
-        # Add basic weekly structure
-        for week in range(weeks_needed):
-            week_plan = {
-                "week": week + 1,
-                "focus": "Complete high-priority lessons",
-                "days": []
-            }
-            
-            # Add days
-            for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]:
-                day_plan = {
-                    "day": day,
-                    "activities": [
-                        {
-                            "course": "Your course",
-                            "lesson": "Next priority lesson",
-                            "duration": 45,
-                            "type": "lesson"
-                        },
-                        {
-                            "course": "Your course",
-                            "lesson": "Review previous material",
-                            "duration": 15,
-                            "type": "review"
-                        }
-                    ]
-                }
-                week_plan["days"].append(day_plan)
-            
-            fallback_plan["weekly_plan"].append(week_plan)
-        
-        return fallback_plan
-
+        return fallback_study_plan(days_remaining)
@@ -0,0 +1,262 @@
+import json
+from asgiref.sync import sync_to_async
+from .assessment_services import (
+    build_feedback_messages, build_study_plan_messages, collect_feedback_data,
+    collect_study_plan_data, days_until, fallback_feedback, fallback_study_plan
+)
+from .response_cache import check_response_cache, store_cached_response
+from .llm import atranscribe
+from .model_routing import arouted_completion, validate_essay_grade, validate_json_object
+from .services import (
+    AI_RESPONSE_FALLBACK, ESSAY_GRADING_FALLBACK, build_chat_messages,
+    build_essay_grading_messages, essay_grade_or_default
+)
+from .voice_services import (
+    attach_spoken_response, finish_voice_question, is_builtin_command,
+    process_command_text, start_voice_question
+)
+
+async def get_ai_response_async(message, context_messages, user, session=None, use_cache=True):
+    """
+    Async version of services.get_ai_response.
+
+    Args:
+        message: The user's message
+        context_messages: Previous messages in the conversation
+        user: The user object
+        session: Optional ChatSession (summary and response cache scope)
+        use_cache: False to bypass the response cache
+
+    Returns:
+        str: The AI response
+    """
+    course_id = session.course_id if session is not None else None
+    cached, probe = await sync_to_async(check_response_cache)(message, context_messages, user, course_id, use_cache)
+    if cached is not None:
+        return cached
+
+    # The context queryset is evaluated here, off the event loop
+    messages = await sync_to_async(build_chat_messages)(message, context_messages, user, session, probe is None)
+
+    try:
+        response = await arouted_completion(
+            'chat',
+            messages,
+            max_tokens=1000,
+            temperature=0.7,
+        )
+
+        answer = response.choices[0].message.content
+        await sync_to_async(store_cached_response)(probe, answer)
+        return answer
+
+    except Exception as e:
+        print(f"Error getting AI response: {str(e)}")
+        return AI_RESPONSE_FALLBACK
+
+async def grade_essay_async(essay_text, rubric='', max_score=100):
+    """
+    Async version of services.grade_essay.
+
+    Returns:
+        tuple: (score, feedback)
+    """
+    try:
+        response = await arouted_completion(
+            'essay_grading',
+            build_essay_grading_messages(essay_text, rubric, max_score),
+            validate=validate_essay_grade,
+            max_tokens=1000,
+            temperature=0.3,
+        )
+
+        return essay_grade_or_default(response.choices[0].message.content, max_score)
+
+    except Exception as e:
+        print(f"Error grading essay: {str(e)}")
+        return 0, ESSAY_GRADING_FALLBACK
+
+async def generate_ai_feedback_async(user, course_data):
+    """
+    Async version of assessment_services.generate_ai_feedback.
+    """
+    try:
+        response = await arouted_completion(
+            'feedback',
+            build_feedback_messages(user, course_data),
+            validate=validate_json_object('assessment', 'recommendations'),
+            response_format={"type": "json_object"},
+            max_tokens=1000,
+            temperature=0.5,
+        )
+
+        return json.loads(response.choices[0].message.content)
+
+    except Exception as e:
+        print(f"Error generating AI feedback: {str(e)}")
+        return fallback_feedback()
+
+async def generate_personalized_feedback_async(user, course_id=None):
+    """
+    Async version of assessment_services.generate_personalized_feedback.
+
+    Args:
+        user: User object
+        course_id: Optional course ID to filter results
+
+    Returns:
+        dict: Personalized feedback
+    """
+    try:
+        course_data = await sync_to_async(collect_feedback_data)(user, course_id)
+
+        if course_data is None:
+            return {
+                'user_id': user.id,
+                'message': "No course data available for analysis",
+                'recommendations': []
+            }
+
+        feedback = await generate_ai_feedback_async(user, course_data)
+
+        return {
+            'user_id': user.id,
+            'course_data': course_data,
+            'feedback': feedback
+        }
+
+    except Exception as e:
+        print(f"Error generating personalized feedback: {str(e)}")
+        return {
+            'user_id': user.id,
+            'message': "Error generating feedback",
+            'error': str(e)
+        }
+
+async def generate_ai_study_plan_async(user, courses_data, days_remaining=None):
+    """
+    Async version of assessment_services.generate_ai_study_plan.
+    """
+    try:
+        response = await arouted_completion(
+            'study_plan',
+            build_study_plan_messages(user, courses_data, days_remaining),
+            validate=validate_json_object('overview', 'weekly_plan'),
+            response_format={"type": "json_object"},
+            max_tokens=2000,
+            temperature=0.5,
+        )
+
+        return json.loads(response.choices[0].message.content)
+
+    except Exception as e:
+        print(f"Error generating AI study plan: {str(e)}")
+        return fallback_study_plan(days_remaining)
+
+async def generate_study_plan_async(user, course_id=None, target_date=None):
+    """
+    Async version of assessment_services.generate_study_plan.
+
+    Args:
+        user: User object
+        course_id: Optional course ID to focus on
+        target_date: Optional target completion date ('YYYY-MM-DD')
+
+    Returns:
+        dict: Personalized study plan
+    """
+    try:
+        courses_data = await sync_to_async(collect_study_plan_data)(user, course_id)
+
+        if courses_data is None:
+            return {
+                'user_id': user.id,
+                'message': "No active courses found for study plan",
+                'plan': []
+            }
+
+        days_remaining = days_until(target_date)
+        if days_remaining is not None and days_remaining <= 0:
+            return {
+                'user_id': user.id,
+                'message': "Target date must be in the future",
+                'plan': []
+            }
+
+        study_plan = await generate_ai_study_plan_async(user, courses_data, days_remaining)
+
+        return {
+            'user_id': user.id,
+            'target_date': target_date,
+            'days_remaining': days_remaining,
+            'courses': courses_data,
+            'study_plan': study_plan
+        }
+
+    except Exception as e:
+        print(f"Error generating study plan: {str(e)}")
+        return {
+            'user_id': user.id,
+            'message': "Error generating study plan",
+            'error': str(e),
+            'plan': []
+        }
+
+async def transcribe_audio_async(audio_file_path):
+    """
+    Async version of voice_services.transcribe_audio.
+
+    Returns:
+        str: Transcribed text, or None on failure
+    """
+    try:
+        transcription = await atranscribe(audio_file_path, model="whisper-1")
+        return transcription.text
+    except Exception as e:
+        print(f"Error transcribing audio: {str(e)}")
+        return None
+
+async def process_command_text_async(command_text, user):
+    """
+    Async version of voice_services.process_command_text.
+
+    Built-in commands are quick database lookups and run as they are;
+    questions for the assistant await the model.
+
+    Returns:
+        dict: Response with action and data
+    """
+    if is_builtin_command(command_text):
+        return await sync_to_async(process_command_text)(command_text, user)
+
+    session, context_messages = await sync_to_async(start_voice_question)(command_text, user)
+    ai_response = await get_ai_response_async(command_text, context_messages, user, session)
+    return await sync_to_async(finish_voice_question)(session, command_text, ai_response)
+
+async def process_voice_command_async(audio_file_path, user):
+    """
+    Async version of voice_services.process_voice_command.
+
+    Returns:
+        dict: Response with action and data
+    """
+    try:
+        transcription = await transcribe_audio_async(audio_file_path)
+
+        if not transcription:
+            return {
+                'success': False,
+                'message': 'Failed to transcribe audio'
+            }
+
+        command_response = await process_command_text_async(transcription, user)
+
+        # Speech synthesis is a blocking network call that touches no models
+        return await sync_to_async(attach_spoken_response, thread_sensitive=False)(command_response)
+
+    except Exception as e:
+        print(f"Error processing voice command: {str(e)}")
+        return {
+            'success': False,
+            'message': 'Error processing voice command'
+        }
@@ -0,0 +1,203 @@
+"""
+Async (ASGI) versions of the LLM-bound AI endpoints.
+
+DRF views are synchronous, so under ASGI each request holds a worker thread
+for the whole model call. These plain Django async views await the OpenAI
+client instead, so one worker process can keep many model calls in flight.
+Authentication, parsing and validation still go through DRF's configured
+authenticators, parsers and serializers, and responses match the sync
+endpoints. Under WSGI they work too, but without the concurrency benefit.
+"""
+import functools
+import os
+import tempfile
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .async_services import (
+    generate_personalized_feedback_async, generate_study_plan_async,
+    get_ai_response_async, grade_essay_async, process_command_text_async,
+    process_voice_command_async
+)
+from .llm_usage import llm_call_tags
+from .models import ChatSession, ChatMessage, AIFeedback
+from .serializers import (
+    ChatMessageSerializer, ChatMessageCreateSerializer, EssayGradingRequestSerializer
+)
+
+def _prepare_request(request):
+    """
+    Wrap a Django request in a DRF Request, authenticate it and parse the body.
+
+    Runs in a thread: authenticators hit the database.
+    """
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    if not drf_request.user or not drf_request.user.is_authenticated:
+        raise NotAuthenticated()
+    drf_request.data  # Parse now so views can read it from the event loop
+    return drf_request
+
+def async_api_view(methods):
+    """
+    Decorator for async views: method check, DRF authentication
+    (IsAuthenticated), body parsing and LLM call attribution. The view
+    receives the DRF Request.
+
+    Args:
+        methods: Allowed HTTP methods
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+            try:
+                drf_request = await sync_to_async(_prepare_request)(request)
+            except APIException as e:
+                return JsonResponse({"detail": e.detail}, status=e.status_code)
+            with llm_call_tags(f"async.{view.__name__}", drf_request.user):
+                return await view(drf_request, *args, **kwargs)
+
+        # Like DRF views: authenticators enforce CSRF where it applies
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+@async_api_view(['POST'])
+async def send_message(request, pk):
+    """
+    Send a message to the AI assistant and get a response.
+    """
+    try:
+        session = await ChatSession.objects.aget(pk=pk, user=request.user)
+    except (ChatSession.DoesNotExist, ValueError):
+        return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    serializer = ChatMessageCreateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # Save user message
+    user_message = await ChatMessage.objects.acreate(
+        session=session,
+        role='user',
+        content=serializer.validated_data['content']
+    )
+
+    # Get context from previous messages
+    context_messages = ChatMessage.objects.filter(session=session).order_by('created_at')
+
+    ai_response = await get_ai_response_async(
+        user_message.content, context_messages, request.user,
+        session=session, use_cache=serializer.validated_data['use_cache']
+    )
+
+    # Save AI response
+    assistant_message = await ChatMessage.objects.acreate(
+        session=session,
+        role='assistant',
+        content=ai_response
+    )
+
+    # Update session timestamp
+    await session.asave()
+
+    return JsonResponse({
+        'user_message': ChatMessageSerializer(user_message).data,
+        'assistant_message': ChatMessageSerializer(assistant_message).data
+    })
+
+@async_api_view(['POST'])
+async def grade_essay(request):
+    """
+    Grade an essay using AI.
+    """
+    serializer = EssayGradingRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    score, feedback = await grade_essay_async(
+        serializer.validated_data['essay_text'],
+        serializer.validated_data.get('rubric', ''),
+        serializer.validated_data['max_score']
+    )
+
+    # Save feedback
+    await AIFeedback.objects.acreate(
+        user=request.user,
+        content_type='essay',
+        content_id=0,  # No specific content ID for direct grading
+        feedback=feedback,
+        score=score
+    )
+
+    return JsonResponse({
+        'score': score,
+        'feedback': feedback
+    })
+
+@async_api_view(['GET'])
+async def personalized_feedback(request):
+    """
+    Get personalized feedback based on performance.
+    """
+    feedback = await generate_personalized_feedback_async(request.user, request.query_params.get('course_id'))
+    return JsonResponse(feedback)
+
+@async_api_view(['POST'])
+async def study_plan(request):
+    """
+    Generate a personalized study plan.
+    """
+    plan = await generate_study_plan_async(
+        request.user, request.data.get('course_id'), request.data.get('target_date')
+    )
+    return JsonResponse(plan)
+
+def _save_upload(upload, suffix='.wav'):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        for chunk in upload.chunks():
+            temp_file.write(chunk)
+        return temp_file.name
+
+@async_api_view(['POST'])
+async def voice_command(request):
+    """
+    Process a voice command (audio file or text).
+    """
+    if 'audio' not in request.FILES and 'text' not in request.data:
+        return JsonResponse(
+            {"error": "No audio file or text provided"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        if 'audio' in request.FILES:
+            # Save the file temporarily, off the event loop
+            temp_file_path = await sync_to_async(_save_upload, thread_sensitive=False)(request.FILES['audio'])
+
+            try:
+                response = await process_voice_command_async(temp_file_path, request.user)
+            finally:
+                await sync_to_async(os.unlink, thread_sensitive=False)(temp_file_path)
+
+            return JsonResponse(response)
+
+        response = await process_command_text_async(request.data['text'], request.user)
+        return JsonResponse(response)
+
+    except Exception as e:
+        return JsonResponse(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
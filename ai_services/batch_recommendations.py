@@ -0,0 +1,149 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .embedding_index import course_index
+from .embedding_providers import active_embedding_model
+from .models import UserEmbedding, UserRecommendation
+from .vectors import CURRENT_VECTOR_FORMAT, decode_vector
+
+def _user_blocks(dimensions, block_size, user_ids=None):
+    """
+    Yield (user IDs, normalized vectors) for users with a current-format
+    embedding, `block_size` users at a time, walking by primary key.
+    """
+    embeddings = UserEmbedding.objects.filter(
+        vector_format=CURRENT_VECTOR_FORMAT, model_name=active_embedding_model(), dimensions=dimensions
+    )
+    if user_ids is not None:
+        embeddings = embeddings.filter(user_id__in=user_ids)
+
+    last_id = 0
+    while True:
+        rows = list(
+            embeddings.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'user_id', 'embedding_vector')[:block_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+
+        vectors = np.vstack([decode_vector(blob, dimensions=dimensions) for _, _, blob in rows])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        yield [user_id for _, user_id, _ in rows], vectors
+
+def _enrolled_mask(user_ids, sorted_course_ids, course_order):
+    """
+    Sparse (users, courses) mask of enrollments, in course matrix column order.
+    """
+    from courses.models import Enrollment
+
+    rows = {user_id: i for i, user_id in enumerate(user_ids)}
+    pairs = Enrollment.objects.filter(user_id__in=user_ids).values_list('user_id', 'course_id')
+
+    mask_rows = []
+    mask_columns = []
+    for user_id, course_id in pairs:
+        slot = np.searchsorted(sorted_course_ids, course_id)
+        if slot < len(sorted_course_ids) and sorted_course_ids[slot] == course_id:
+            mask_rows.append(rows[user_id])
+            mask_columns.append(course_order[slot])
+
+    return csr_matrix(
+        (np.ones(len(mask_rows), dtype=bool), (mask_rows, mask_columns)),
+        shape=(len(user_ids), len(sorted_course_ids)),
+    )
+
+def _top_courses(user_vectors, course_vectors, enrolled, count, course_block_size):
+    """
+    Top-`count` course positions and scores per user, excluding enrolled courses.
+
+    Courses are scored `course_block_size` columns at a time and merged into a
+    running top-k, so memory stays at users x (course_block_size + count).
+
+    Returns:
+        tuple: (positions, scores), each (users, count) and best first;
+            unused slots have a score of -inf
+    """
+    users = len(user_vectors)
+    best_scores = np.full((users, count), -np.inf, dtype=np.float32)
+    best_positions = np.full((users, count), -1, dtype=np.int64)
+
+    for start in range(0, len(course_vectors), course_block_size):
+        block = np.asarray(course_vectors[start:start + course_block_size])
+        scores = user_vectors @ block.T
+
+        block_mask = enrolled[:, start:start + len(block)].tocoo()
+        scores[block_mask.row, block_mask.col] = -np.inf
+
+        positions = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+        scores = np.hstack([best_scores, scores])
+        positions = np.hstack([best_positions, positions])
+
+        keep = np.argpartition(-scores, count - 1, axis=1)[:, :count]
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+        best_positions = np.take_along_axis(positions, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind='stable')
+    return np.take_along_axis(best_positions, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+def generate_batch_recommendations(count=None, user_ids=None, user_block_size=None, course_block_size=None):
+    """
+    Compute top-`count` recommendations for every user with an embedding and
+    store them in UserRecommendation.
+
+    Users are processed in blocks: each block is scored against the course
+    matrix with one matrix multiply per course block, enrolled courses are
+    masked out with a sparse matrix, and the block's rows are replaced in a
+    single transaction before the next block is loaded. Memory use depends
+    on the block sizes and catalog size, not on the number of users.
+
+    Args:
+        count: Recommendations per user (defaults to RECOMMENDATION_DIGEST_COUNT)
+        user_ids: Optional iterable of user IDs to limit the run to
+        user_block_size: Users scored per block
+        course_block_size: Courses scored per matrix multiply
+
+    Returns:
+        dict: Number of users processed and recommendations written
+    """
+    count = count or getattr(settings, 'RECOMMENDATION_DIGEST_COUNT', 10)
+    user_block_size = user_block_size or getattr(settings, 'RECOMMENDATION_BATCH_USER_BLOCK', 2000)
+    course_block_size = course_block_size or getattr(settings, 'RECOMMENDATION_BATCH_COURSE_BLOCK', 10000)
+
+    course_vectors, course_ids = course_index.matrix()
+    stats = {'users': 0, 'recommendations': 0}
+    if len(course_ids) == 0:
+        return stats
+
+    course_order = np.argsort(course_ids)
+    sorted_course_ids = course_ids[course_order]
+    generated_at = timezone.now()
+
+    for block_user_ids, user_vectors in _user_blocks(course_index.dimensions, user_block_size, user_ids):
+        enrolled = _enrolled_mask(block_user_ids, sorted_course_ids, course_order)
+        positions, scores = _top_courses(user_vectors, course_vectors, enrolled, count, course_block_size)
+
+        recommendations = []
+        for row, user_id in enumerate(block_user_ids):
+            for rank, (position, score) in enumerate(zip(positions[row], scores[row]), start=1):
+                if not np.isfinite(score):
+                    break
+                recommendations.append(UserRecommendation(
+                    user_id=user_id,
+                    course_id=int(course_ids[position]),
+                    rank=rank,
+                    score=float(score),
+                    generated_at=generated_at,
+                ))
+
+        with transaction.atomic():
+            UserRecommendation.objects.filter(user_id__in=block_user_ids).delete()
+            UserRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+
+        stats['users'] += len(block_user_ids)
+        stats['recommendations'] += len(recommendations)
+
+    return stats
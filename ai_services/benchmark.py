@@ -0,0 +1,163 @@
+import tempfile
+import time
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from courses.models import Category, Course, Enrollment
+from .embedding_index import course_index
+from .embedding_providers import active_embedding_model
+from .models import CourseEmbedding
+
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+def _percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+def build_synthetic_catalog(courses, users, dimensions=64, topics=50, enrollments_per_user=10, holdout=0.2, seed=0):
+    """
+    Insert a deterministic synthetic catalog, users and enrollments.
+
+    Course vectors are noisy copies of `topics` random centroids. Each user
+    prefers one or two topics and enrolls in courses drawn mostly from them;
+    a `holdout` share of each user's enrollments is not inserted and is
+    returned as ground truth for precision/recall.
+
+    Returns:
+        dict: User ID to the set of held-out course IDs
+    """
+    User = get_user_model()
+    rng = np.random.default_rng(seed)
+    model_name = active_embedding_model()
+
+    instructor = User.objects.create(email=f"bench-instructor-{seed}@example.com", username=f"bench-instructor-{seed}")
+    categories = Category.objects.bulk_create([
+        Category(name=f"Benchmark {i}", slug=f"benchmark-{seed}-{i}") for i in range(topics)
+    ])
+
+    centroids = rng.standard_normal((topics, dimensions)).astype(np.float32)
+    course_topics = rng.integers(topics, size=courses)
+    vectors = centroids[course_topics] + 0.6 * rng.standard_normal((courses, dimensions)).astype(np.float32)
+
+    course_ids = []
+    for start in range(0, courses, 2000):
+        created = Course.objects.bulk_create([
+            Course(
+                title=f"Benchmark course {i}",
+                slug=f"benchmark-{seed}-{i}",
+                description="Synthetic benchmark course",
+                category=categories[course_topics[i]],
+                instructor=instructor,
+                is_published=True,
+            )
+            for i in range(start, min(start + 2000, courses))
+        ])
+        embeddings = []
+        for offset, course in enumerate(created):
+            embedding = CourseEmbedding(course=course)
+            embedding.set_vector(vectors[start + offset], model_name)
+            embeddings.append(embedding)
+        CourseEmbedding.objects.bulk_create(embeddings)
+        course_ids.extend(course.id for course in created)
+    course_ids = np.array(course_ids)
+
+    by_topic = [course_ids[course_topics == topic] for topic in range(topics)]
+    created_users = User.objects.bulk_create([
+        User(email=f"bench-{seed}-{j}@example.com", username=f"bench-{seed}-{j}") for j in range(users)
+    ])
+
+    held_out = {}
+    enrollments = []
+    for user in created_users:
+        preferred = [topic for topic in rng.choice(topics, 2, replace=False) if len(by_topic[topic])]
+        pool = np.concatenate([by_topic[topic] for topic in preferred]) if preferred else course_ids
+        picks = rng.choice(pool, min(enrollments_per_user, len(pool)), replace=False)
+        cut = max(1, int(round(len(picks) * holdout)))
+        held_out[user.id] = set(int(course_id) for course_id in picks[:cut])
+        enrollments.extend(Enrollment(user=user, course_id=int(course_id)) for course_id in picks[cut:])
+    Enrollment.objects.bulk_create(enrollments, batch_size=5000)
+
+    return held_out
+
+def run_benchmark(courses, users=200, count=10, dimensions=64, seed=0, snapshot=False):
+    """
+    Time `generate_course_recommendations` end to end on a synthetic catalog.
+
+    Everything runs inside a transaction that is rolled back, with a private
+    in-memory cache and, with `snapshot`, a temporary snapshot directory, so
+    the real catalog, cache and snapshot are untouched. The database should
+    otherwise be empty (e.g. a development database), since existing courses
+    would join the synthetic catalog.
+
+    Args:
+        courses: Number of synthetic courses
+        users: Number of synthetic users to query
+        count: K for recommendations and precision/recall@K
+        dimensions: Embedding dimensions
+        seed: Random seed; the same seed gives the same catalog
+        snapshot: Serve from a memory-mapped snapshot (with ANN/compression per settings)
+
+    Returns:
+        dict: Latency percentiles (ms) and query counts for cold (cache miss)
+            and cached calls, plus precision and recall@K
+    """
+    from .services import generate_course_recommendations
+    from .tasks import build_course_embedding_snapshot
+
+    User = get_user_model()
+
+    with tempfile.TemporaryDirectory() as snapshot_dir, override_settings(
+        CACHES=BENCHMARK_CACHES,
+        EMBEDDING_SNAPSHOT_DIR=snapshot_dir,
+        USER_EMBEDDING_MODE='incremental',
+    ):
+        with transaction.atomic():
+            started = time.perf_counter()
+            held_out = build_synthetic_catalog(courses, users, dimensions=dimensions, seed=seed)
+            course_index.invalidate()
+            if snapshot:
+                build_course_embedding_snapshot()
+            course_index.load()
+            setup_seconds = time.perf_counter() - started
+
+            results = {'cold': [], 'cached': []}
+            queries = {'cold': [], 'cached': []}
+            precisions = []
+            recalls = []
+            for user in User.objects.filter(id__in=list(held_out)):
+                for phase in ('cold', 'cached'):
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        recommendations = generate_course_recommendations(user, count=count)
+                        results[phase].append((time.perf_counter() - started) * 1000)
+                    queries[phase].append(len(captured))
+
+                expected = held_out[user.id]
+                hits = len(expected.intersection(item['id'] for item in recommendations))
+                precisions.append(hits / count)
+                recalls.append(hits / len(expected))
+
+            transaction.set_rollback(True)
+
+        course_index.invalidate()
+
+    return {
+        'courses': courses,
+        'users': users,
+        'count': count,
+        'dimensions': dimensions,
+        'seed': seed,
+        'snapshot': snapshot,
+        'setup_seconds': setup_seconds,
+        'latency_ms': {phase: _percentiles(values) for phase, values in results.items()},
+        'queries': {phase: _percentiles(values) for phase, values in queries.items()},
+        f'precision_at_{count}': float(np.mean(precisions)),
+        f'recall_at_{count}': float(np.mean(recalls)),
+    }
@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce, Length
+
+# Tokens the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+
+def count_tokens(text):
+    """
+    Count the tokens of a text for the chat model.
+
+    Uses tiktoken when it is installed and falls back to the
+    4-characters-per-token estimate otherwise.
+    """
+    global _encoding
+
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model('gpt-4')
+        except (ImportError, KeyError) as e:
+            print(f"Error loading tiktoken, estimating tokens from length: {str(e)}")
+            _encoding = False
+
+    if _encoding:
+        return len(_encoding.encode(text or '', disallowed_special=()))
+    return len(text or '') // 4 + 1
+
+def get_chat_context_settings():
+    return (
+        getattr(settings, 'CHAT_CONTEXT_TOKEN_BUDGET', 3000),
+        getattr(settings, 'CHAT_CONTEXT_MAX_MESSAGES', 50),
+        getattr(settings, 'CHAT_RECENT_TOKENS', 1500),
+        getattr(settings, 'CHAT_SUMMARY_MAX_TOKENS', 400),
+    )
+
+def message_tokens(token_count, content):
+    # Rows written before token counting have no stored count
+    return (token_count if token_count is not None else count_tokens(content)) + MESSAGE_OVERHEAD_TOKENS
+
+def fit_history(context_messages, message, budget, after_id=None):
+    """
+    Pick the most recent messages that fit in a token budget.
+
+    Args:
+        context_messages: Messages in the session (a queryset)
+        message: The message being answered; when it is already saved as
+            the newest message it is left out, as the caller appends it
+        budget: Tokens available for history
+        after_id: Only consider messages newer than this ID (the ones not
+            yet folded into the session summary)
+
+    Returns:
+        list: Chat messages ({"role", "content"}), oldest first
+    """
+    _, max_messages, _, _ = get_chat_context_settings()
+
+    history = context_messages.order_by('-created_at', '-id')
+    if after_id is not None:
+        history = history.filter(id__gt=after_id)
+    rows = history.values_list('role', 'content', 'token_count')[:max_messages]
+
+    selected = []
+    for position, (role, content, token_count) in enumerate(rows):
+        if position == 0 and role == 'user' and content == message:
+            continue
+        budget -= message_tokens(token_count, content)
+        if budget < 0:
+            break
+        selected.append({"role": role, "content": content})
+
+    return selected[::-1]
+
+def needs_summary(session_id):
+    """
+    Whether a session's unsummarized history has outgrown CHAT_RECENT_TOKENS.
+    """
+    from .models import ChatMessage, ChatSession
+
+    _, _, recent_tokens, _ = get_chat_context_settings()
+
+    summarized_through = ChatSession.objects.filter(id=session_id).values_list('summarized_through', flat=True).first()
+    unsummarized = ChatMessage.objects.filter(session_id=session_id)
+    if summarized_through is not None:
+        unsummarized = unsummarized.filter(id__gt=summarized_through)
+    # Same count as message_tokens, with the length estimate for rows without one
+    estimated = Coalesce('token_count', Length('content') / 4 + 1) + Value(MESSAGE_OVERHEAD_TOKENS)
+    total = unsummarized.aggregate(tokens=Sum(estimated))['tokens'] or 0
+    return total > recent_tokens
+
+def summarize_session(session_id):
+    """
+    Fold the oldest unsummarized messages of a session into its running summary.
+
+    Messages are folded until the unsummarized tail is at most half of
+    CHAT_RECENT_TOKENS, so a session is summarized every few turns rather
+    than every turn. The last exchange is kept verbatim however long it is.
+    The model sees only the previous summary and the folded messages, so
+    the cost per update does not grow with the session.
+
+    Args:
+        session_id: The ChatSession ID
+
+    Returns:
+        bool: True if the summary was updated
+    """
+    from .models import ChatMessage, ChatSession
+    from .llm import chat_completion
+
+    _, _, recent_tokens, summary_max_tokens = get_chat_context_settings()
+
+    session = ChatSession.objects.filter(id=session_id).first()
+    if session is None:
+        return False
+
+    unsummarized = ChatMessage.objects.filter(session_id=session_id)
+    if session.summarized_through is not None:
+        unsummarized = unsummarized.filter(id__gt=session.summarized_through)
+    rows = list(unsummarized.order_by('created_at', 'id').values_list('id', 'role', 'content', 'token_count'))
+
+    # Keep the newest messages verbatim, at least from the last user message on
+    last_exchange = max((i for i, row in enumerate(rows) if row[1] == 'user'), default=len(rows) - 1)
+    kept_tokens = 0
+    split = len(rows)
+    while split > 0:
+        tokens = message_tokens(rows[split - 1][3], rows[split - 1][2])
+        if kept_tokens + tokens > recent_tokens // 2:
+            break
+        kept_tokens += tokens
+        split -= 1
+
+    folded = rows[:min(split, last_exchange)]
+    if not folded:
+        return False
+
+    transcript = '\n'.join(f"{role}: {content}" for _, role, content, _ in folded)
+    prompt = f"""
+    Update the running summary of a conversation between a student and an AI learning assistant.
+    Keep the topics covered, questions asked, explanations given, the student's goals and
+    difficulties, and anything the assistant promised or should remember. Be concise.
+
+    Current summary:
+    {session.summary or 'None yet.'}
+
+    New messages:
+    {transcript}
+
+    Reply with the updated summary only.
+    """
+
+    try:
+        response = chat_completion(
+            model=getattr(settings, 'CHAT_SUMMARY_MODEL', 'gpt-3.5-turbo'),
+            messages=[
+                {"role": "system", "content": "You summarize tutoring conversations accurately and briefly."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=summary_max_tokens,
+            temperature=0.3,
+        )
+        summary = response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Error summarizing chat session {session_id}: {str(e)}")
+        return False
+
+    # Only apply if no other update got there first
+    updated = ChatSession.objects.filter(
+        id=session_id, summarized_through=session.summarized_through
+    ).update(
+        summary=summary,
+        summary_token_count=count_tokens(summary),
+        summarized_through=folded[-1][0],
+    )
+    return bool(updated)
@@ -0,0 +1,182 @@
+import numpy as np
+from scipy.sparse import csc_matrix
+from django.conf import settings
+from django.db import transaction
+from .models import CourseNeighbor
+
+SOURCE_COLLABORATIVE = 'collaborative'
+
+def build_enrollment_matrix(chunk_size=100000):
+    """
+    Build a binary sparse user x course matrix from Enrollment.
+
+    Rows are streamed in chunks into int64 arrays (primary keys are
+    BigAutoField), so the IDs take about 16 bytes per enrollment. The
+    sparse matrix itself is indexed with int32 row and column positions.
+
+    Returns:
+        tuple: (matrix in CSC format, course IDs by column)
+    """
+    from courses.models import Enrollment
+
+    user_chunks = []
+    course_chunks = []
+    users = []
+    courses = []
+    pairs = Enrollment.objects.order_by().values_list('user_id', 'course_id').iterator(chunk_size=chunk_size)
+    for user_id, course_id in pairs:
+        users.append(user_id)
+        courses.append(course_id)
+        if len(users) >= chunk_size:
+            user_chunks.append(np.array(users, dtype=np.int64))
+            course_chunks.append(np.array(courses, dtype=np.int64))
+            users, courses = [], []
+    user_chunks.append(np.array(users, dtype=np.int64))
+    course_chunks.append(np.array(courses, dtype=np.int64))
+
+    user_ids = np.concatenate(user_chunks)
+    course_ids = np.concatenate(course_chunks)
+    _, rows = np.unique(user_ids, return_inverse=True)
+    columns_ids, columns = np.unique(course_ids, return_inverse=True)
+
+    matrix = csc_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows.astype(np.int32), columns.astype(np.int32))),
+        shape=(int(rows.max()) + 1 if len(rows) else 0, len(columns_ids)),
+    )
+    # Enrollment is unique per (user, course), but clamp duplicates just in case
+    matrix.data[:] = 1
+    return matrix, columns_ids
+
+def build_collaborative_neighbors(neighbors=None, min_support=None, block_size=None):
+    """
+    Rebuild the collaborative CourseNeighbor lists from co-enrollments.
+
+    Course-course similarity is cosine over the binary enrollment columns:
+    co-enrollments / sqrt(enrollments_i * enrollments_j). It is computed
+    `block_size` courses at a time as a sparse product, so only a
+    courses x block_size slice of the similarity matrix exists at once, and
+    each block's lists are replaced before the next block is computed.
+
+    Args:
+        neighbors: Neighbours kept per course (defaults to RECOMMENDER_NEIGHBORS)
+        min_support: Minimum co-enrollments for a pair to count
+        block_size: Courses per sparse product
+
+    Returns:
+        int: Number of neighbour rows written
+    """
+    neighbors = neighbors or getattr(settings, 'RECOMMENDER_NEIGHBORS', 20)
+    min_support = min_support or getattr(settings, 'RECOMMENDER_COLLAB_MIN_SUPPORT', 2)
+    block_size = block_size or getattr(settings, 'RECOMMENDER_COLLAB_BLOCK_SIZE', 2000)
+
+    matrix, course_ids = build_enrollment_matrix()
+    transposed = matrix.T.tocsr()
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    written = 0
+
+    for start in range(0, len(course_ids), block_size):
+        block = slice(start, min(start + block_size, len(course_ids)))
+        # Co-enrollment counts between every course and this block's courses
+        co_counts = (transposed @ matrix[:, block]).tocsc()
+
+        rows = []
+        for offset in range(block.stop - block.start):
+            column = start + offset
+            first, last = co_counts.indptr[offset], co_counts.indptr[offset + 1]
+            others = co_counts.indices[first:last]
+            shared = co_counts.data[first:last]
+
+            keep = (others != column) & (shared >= min_support)
+            others, shared = others[keep], shared[keep]
+            if len(others) == 0:
+                continue
+
+            scores = shared / np.sqrt(counts[others] * counts[column])
+            order = np.lexsort((others, -scores))[:neighbors]
+            rows.extend(
+                CourseNeighbor(
+                    course_id=int(course_ids[column]),
+                    neighbor_id=int(course_ids[others[i]]),
+                    source=SOURCE_COLLABORATIVE,
+                    rank=rank,
+                    score=float(scores[i]),
+                )
+                for rank, i in enumerate(order, start=1)
+            )
+
+        with transaction.atomic():
+            CourseNeighbor.objects.filter(
+                source=SOURCE_COLLABORATIVE, course_id__in=course_ids[block].tolist()
+            ).delete()
+            CourseNeighbor.objects.bulk_create(rows, batch_size=1000)
+        written += len(rows)
+
+    # Courses that lost all their enrollments keep no stale lists
+    CourseNeighbor.objects.filter(source=SOURCE_COLLABORATIVE).exclude(course_id__in=course_ids.tolist()).delete()
+    return written
+
+def collaborative_scores(course_ids):
+    """
+    Item-item scores for courses related to the given ones, normalized to [0, 1].
+
+    Each candidate's score is the sum of its similarities to `course_ids`,
+    read from the neighbour table in one query.
+
+    Args:
+        course_ids: Courses the user is enrolled in
+
+    Returns:
+        dict: Course ID to score
+    """
+    if not course_ids:
+        return {}
+
+    scores = {}
+    neighbors = CourseNeighbor.objects.filter(
+        source=SOURCE_COLLABORATIVE, course_id__in=course_ids
+    ).values_list('neighbor_id', 'score')
+    for neighbor_id, score in neighbors:
+        scores[neighbor_id] = scores.get(neighbor_id, 0.0) + score
+
+    if scores:
+        top = max(scores.values())
+        scores = {course_id: score / top for course_id, score in scores.items()}
+    return scores
+
+def blend_rankings(embedding_ranking, cf_scores, user_vector, depth, weight=None):
+    """
+    Blend embedding similarity with collaborative scores.
+
+    Candidates found only by collaborative filtering are scored against the
+    user vector so every course gets both components.
+
+    Args:
+        embedding_ranking: (course_id, similarity) pairs from the embedding index
+        cf_scores: Course ID to normalized collaborative score
+        user_vector: The user's embedding vector
+        depth: Length of the blended ranking
+        weight: Share of the collaborative score (defaults to RECOMMENDER_COLLAB_WEIGHT)
+
+    Returns:
+        list: (course_id, blended score) pairs, best first
+    """
+    from .embedding_index import course_index, normalize
+
+    weight = getattr(settings, 'RECOMMENDER_COLLAB_WEIGHT', 0.3) if weight is None else weight
+    if not cf_scores or not weight:
+        return embedding_ranking[:depth]
+
+    similarities = dict(embedding_ranking)
+    query = normalize(user_vector)
+    for course_id in cf_scores:
+        if course_id not in similarities:
+            course_vector = course_index.get_vector(course_id)
+            if course_vector is not None:
+                similarities[course_id] = float(course_vector @ query)
+
+    blended = [
+        (course_id, (1 - weight) * similarity + weight * cf_scores.get(course_id, 0.0))
+        for course_id, similarity in similarities.items()
+    ]
+    blended.sort(key=lambda item: -item[1])
+    return blended[:depth]
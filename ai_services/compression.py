@@ -0,0 +1,242 @@
+import os
+import time
+import numpy as np
+from django.conf import settings
+from .ann import top_k
+from .vectors import get_snapshot_dir, load_course_snapshot
+
+COMPRESSED_INDEX_FILE = 'courses-compact.npz'
+
+# Rows converted from int8 to float32 at a time while scoring
+SCORE_BLOCK_ROWS = 16384
+
+class CompressedVectors:
+    """
+    PCA-reduced, optionally int8-quantized copy of a normalized matrix.
+
+    Each row x is stored as codes c and a per-row scale s with
+    x ~= mean + components.T @ (s * c). Dot products with a query q are then
+    s * (c @ (components @ q)) + mean @ q, so the query is projected once and
+    every row costs `n_components` multiply-adds instead of the full
+    dimension count.
+    """
+
+    def __init__(self, mean, components, codes, scales=None):
+        self.mean = mean
+        self.components = components
+        self.codes = codes
+        self.scales = scales
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def quantized(self):
+        return self.scales is not None
+
+    @classmethod
+    def fit(cls, vectors, n_components=128, quantize=True, sample_size=50000, seed=0):
+        """
+        Fit PCA on a normalized matrix and compress every row.
+
+        Args:
+            vectors: Normalized (N, D) float32 matrix
+            n_components: Reduced dimensions (clamped to N and D)
+            quantize: Store int8 codes with a per-row scale instead of float32
+            sample_size: Rows used to fit the PCA; all rows are transformed afterwards
+            seed: Random seed for reproducible builds
+        """
+        from sklearn.decomposition import PCA
+
+        n_components = min(n_components, len(vectors), vectors.shape[1])
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > sample_size:
+            sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+
+        pca = PCA(n_components=n_components, svd_solver='randomized', random_state=seed)
+        pca.fit(np.asarray(sample, dtype=np.float32))
+        mean = pca.mean_.astype(np.float32)
+        components = pca.components_.astype(np.float32)
+
+        reduced = np.empty((len(vectors), n_components), dtype=np.int8 if quantize else np.float32)
+        scales = np.empty(len(vectors), dtype=np.float32) if quantize else None
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = (np.asarray(vectors[start:start + SCORE_BLOCK_ROWS]) - mean) @ components.T
+            if quantize:
+                block_scales = np.abs(block).max(axis=1) / 127
+                block_scales[block_scales == 0] = 1
+                reduced[start:start + len(block)] = np.rint(block / block_scales[:, None])
+                scales[start:start + len(block)] = block_scales
+            else:
+                reduced[start:start + len(block)] = block
+
+        compressed = cls(mean, components, reduced, scales)
+        compressed.explained_variance = float(pca.explained_variance_ratio_.sum())
+        return compressed
+
+    def scores(self, query):
+        """
+        Approximate dot products of every row with a normalized query.
+        """
+        projected = self.components @ query
+        offset = float(self.mean @ query)
+
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCORE_BLOCK_ROWS):
+            block = self.codes[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ projected
+        if self.quantized:
+            scores *= self.scales
+        return scores + offset
+
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.quantized else 0)
+
+    def arrays(self):
+        arrays = {'mean': self.mean, 'components': self.components, 'codes': self.codes}
+        if self.quantized:
+            arrays['scales'] = self.scales
+        return arrays
+
+def compact_search(compressed, vectors, query, count, rerank, exclude_mask=None):
+    """
+    Rank rows by their compressed scores, then rescore the best
+    `count * rerank` candidates against the full-precision vectors.
+
+    Args:
+        compressed: CompressedVectors built over `vectors`
+        vectors: The normalized (usually memory-mapped) full-precision matrix
+        query: Normalized query vector
+        count: Number of results to return
+        rerank: Candidate multiplier for exact rescoring (0 disables it)
+        exclude_mask: Optional boolean array over rows to leave out
+
+    Returns:
+        tuple: (row positions, scores), best first
+    """
+    scores = compressed.scores(query)
+    if exclude_mask is not None:
+        scores[exclude_mask] = -np.inf
+
+    available = int(np.isfinite(scores).sum())
+    if not rerank:
+        top = top_k(scores, min(count, available))
+        return top, scores[top]
+
+    candidates = np.sort(top_k(scores, min(count * rerank, available)))
+    exact = np.asarray(vectors[candidates]) @ query
+    top = top_k(exact, count)
+    return candidates[top], exact[top]
+
+def save_compressed_vectors(compressed, generation, directory=None):
+    """
+    Persist compressed vectors next to the snapshot they were built from.
+    """
+    directory = directory or get_snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f".{generation}.{COMPRESSED_INDEX_FILE}")
+    with open(temp_path, 'wb') as index_file:
+        np.savez(index_file, generation=np.array(generation or ''), **compressed.arrays())
+    os.replace(temp_path, os.path.join(directory, COMPRESSED_INDEX_FILE))
+
+def load_compressed_vectors(generation, directory=None):
+    """
+    Load the compressed vectors if they were built from the given snapshot generation.
+
+    Returns:
+        CompressedVectors, or None when there is no matching file
+    """
+    path = os.path.join(directory or get_snapshot_dir(), COMPRESSED_INDEX_FILE)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['generation']) != (generation or ''):
+                return None
+            scales = data['scales'] if 'scales' in data.files else None
+            return CompressedVectors(data['mean'], data['components'], data['codes'], scales)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def build_compressed_vectors(directory=None, **options):
+    """
+    Compress the current course snapshot and persist the result.
+
+    Args:
+        directory: Snapshot directory (defaults to EMBEDDING_SNAPSHOT_DIR)
+        **options: Passed to CompressedVectors.fit (n_components, quantize, seed, ...)
+
+    Returns:
+        tuple: (compressed, vectors) or None when there are too few courses to compress
+    """
+    snapshot = load_course_snapshot(directory)
+    if snapshot is None or len(snapshot[2]) < 2:
+        return None
+
+    manifest, vectors, _ = snapshot
+    _, n_components, quantize, _ = get_compression_settings()
+    options.setdefault('n_components', n_components)
+    options.setdefault('quantize', quantize)
+    compressed = CompressedVectors.fit(vectors, **options)
+    save_compressed_vectors(compressed, manifest['generation'], directory)
+    return compressed, vectors
+
+def evaluate_compression(vectors, compressed, queries, count=10, rerank_values=(0, 2, 4, 8)):
+    """
+    Measure top-K overlap with full-precision ranking and per-query latency.
+
+    Args:
+        vectors: The normalized matrix the compressed vectors were built from
+        compressed: The CompressedVectors
+        queries: Normalized (Q, D) query matrix
+        count: Number of results per query
+        rerank_values: Rerank multipliers to evaluate (0 scores compressed vectors only)
+
+    Returns:
+        dict: Storage sizes, exact-search latency, and one row per rerank
+            multiplier with mean top-K overlap and latency percentiles in milliseconds
+    """
+    exact_results = []
+    exact_times = []
+    for query in queries:
+        started = time.perf_counter()
+        exact_results.append(set(top_k(np.asarray(vectors) @ query, count).tolist()))
+        exact_times.append((time.perf_counter() - started) * 1000)
+
+    rows = []
+    for rerank in rerank_values:
+        overlaps = []
+        times = []
+        for query, expected in zip(queries, exact_results):
+            started = time.perf_counter()
+            positions, _ = compact_search(compressed, vectors, query, count, rerank)
+            times.append((time.perf_counter() - started) * 1000)
+            overlaps.append(len(expected.intersection(positions.tolist())) / max(len(expected), 1))
+
+        rows.append({
+            'rerank': rerank,
+            'overlap': float(np.mean(overlaps)),
+            'latency_ms_p50': float(np.percentile(times, 50)),
+            'latency_ms_p95': float(np.percentile(times, 95)),
+        })
+
+    return {
+        'courses': len(vectors),
+        'queries': len(queries),
+        'count': count,
+        'dimensions': int(vectors.shape[1]),
+        'components': int(compressed.components.shape[0]),
+        'quantized': compressed.quantized,
+        'full_bytes': int(vectors.shape[0] * vectors.shape[1] * 4),
+        'compressed_bytes': int(compressed.nbytes()),
+        'exact_latency_ms_p50': float(np.percentile(exact_times, 50)),
+        'exact_latency_ms_p95': float(np.percentile(exact_times, 95)),
+        'operating_points': rows,
+    }
+
+def get_compression_settings():
+    return (
+        getattr(settings, 'RECOMMENDER_COMPACT_SCORING', True),
+        getattr(settings, 'RECOMMENDER_PCA_COMPONENTS', 128),
+        getattr(settings, 'RECOMMENDER_QUANTIZE', True),
+        getattr(settings, 'RECOMMENDER_COMPACT_RERANK', 4),
+    )
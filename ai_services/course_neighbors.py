@@ -0,0 +1,178 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from .ann import top_k
+from .embedding_index import course_index
+from .models import CourseNeighbor
+
+SOURCE_CONTENT = 'content'
+
+def _neighbor_rows(course_id, ranked):
+    return [
+        CourseNeighbor(
+            course_id=course_id,
+            neighbor_id=neighbor_id,
+            source=SOURCE_CONTENT,
+            rank=rank,
+            score=score,
+        )
+        for rank, (neighbor_id, score) in enumerate(ranked, start=1)
+    ]
+
+def _replace_lists(course_ids, rows):
+    with transaction.atomic():
+        CourseNeighbor.objects.filter(source=SOURCE_CONTENT, course_id__in=course_ids).delete()
+        CourseNeighbor.objects.bulk_create(rows, batch_size=1000)
+
+def build_content_neighbors(neighbors=None, block_size=None):
+    """
+    Rebuild every course's content neighbour list from the embedding matrix.
+
+    Courses are scored `block_size` rows at a time against the full matrix,
+    so memory stays at block_size x courses scores.
+
+    Args:
+        neighbors: Neighbours kept per course (defaults to RECOMMENDER_NEIGHBORS)
+        block_size: Courses scored per matrix multiply
+
+    Returns:
+        int: Number of neighbour rows written
+    """
+    neighbors = neighbors or getattr(settings, 'RECOMMENDER_NEIGHBORS', 20)
+    block_size = block_size or getattr(settings, 'RECOMMENDER_NEIGHBOR_BLOCK_SIZE', 1000)
+
+    vectors, ids = course_index.matrix()
+    written = 0
+
+    for start in range(0, len(ids), block_size):
+        block_ids = ids[start:start + block_size]
+        scores = np.asarray(vectors[start:start + block_size]) @ np.asarray(vectors).T
+        scores[np.arange(len(block_ids)), np.arange(start, start + len(block_ids))] = -np.inf
+
+        rows = []
+        for offset, course_id in enumerate(block_ids):
+            top = top_k(scores[offset], min(neighbors, len(ids) - 1))
+            rows.extend(_neighbor_rows(int(course_id), [(int(ids[i]), float(scores[offset, i])) for i in top]))
+
+        _replace_lists(block_ids.tolist(), rows)
+        written += len(rows)
+
+    CourseNeighbor.objects.filter(source=SOURCE_CONTENT).exclude(course_id__in=ids.tolist()).delete()
+    return written
+
+def _nearest(course_id, vector, neighbors):
+    return [
+        (neighbor_id, score)
+        for neighbor_id, score in course_index.search(vector, neighbors, exclude_ids=[course_id])
+    ]
+
+def _merge(entries, course_id, score, neighbors):
+    """
+    Apply one course's new score to a stored list without searching.
+
+    Args:
+        entries: The list's stored (neighbor_id, score) pairs
+        course_id: The course whose embedding changed
+        score: Its new similarity to the list's owner, or None if removed
+        neighbors: Neighbours kept per course
+
+    Returns:
+        list: The new (neighbor_id, score) pairs, None if the list is
+            unchanged, or False if it must be refilled with a search
+    """
+    rest = [(neighbor_id, value) for neighbor_id, value in entries if neighbor_id != course_id]
+    contained = len(rest) < len(entries)
+    full = len(entries) >= neighbors
+    weakest = min((value for _, value in rest), default=None)
+
+    # A full list that loses this course, or sees it drop below every other
+    # entry, may now have a better neighbour it never stored
+    if full and contained and (score is None or (weakest is not None and score < weakest)):
+        return False
+    if not contained and (score is None or (full and weakest is not None and score <= weakest)):
+        return None
+
+    if score is not None:
+        rest.append((course_id, score))
+    return sorted(rest, key=lambda entry: entry[1], reverse=True)[:neighbors]
+
+def update_content_neighbors(course_id, neighbors=None):
+    """
+    Update the content neighbour lists after one course's embedding changed.
+
+    One index search finds the course's RECOMMENDER_NEIGHBOR_CANDIDATES
+    nearest courses; the first `neighbors` are its own list. Similarity is
+    symmetric, so those are the courses that may now rank this course among
+    their neighbours. Their stored lists, and the lists that already contain
+    this course, are loaded and merged with the new score. Only a full list
+    that loses this course (or sees it fall below every other entry) is
+    refilled with a search of its own. A list further away that would now
+    take this course is corrected by the next build_content_neighbors.
+
+    Args:
+        course_id: The course whose embedding changed (or was removed)
+        neighbors: Neighbours kept per course (defaults to RECOMMENDER_NEIGHBORS)
+
+    Returns:
+        int: Number of lists rewritten
+    """
+    neighbors = neighbors or getattr(settings, 'RECOMMENDER_NEIGHBORS', 20)
+    vector = course_index.get_vector(course_id)
+
+    candidates = max(neighbors, getattr(settings, 'RECOMMENDER_NEIGHBOR_CANDIDATES', 100))
+    ranked = _nearest(course_id, vector, candidates) if vector is not None else []
+    scores = dict(ranked)
+
+    containing = CourseNeighbor.objects.filter(
+        source=SOURCE_CONTENT, neighbor_id=course_id
+    ).values_list('course_id', flat=True)
+    stored = {}
+    for other_id, neighbor_id, score in CourseNeighbor.objects.filter(
+        source=SOURCE_CONTENT, course_id__in=set(containing) | set(scores)
+    ).exclude(course_id=course_id).values_list('course_id', 'neighbor_id', 'score'):
+        stored.setdefault(other_id, []).append((neighbor_id, score))
+
+    lists = {course_id: ranked[:neighbors]}
+    for other_id, entries in stored.items():
+        other_vector = None
+        score = scores.get(other_id)
+        if score is None and vector is not None:
+            other_vector = course_index.get_vector(other_id)
+            if other_vector is None:
+                lists[other_id] = []
+                continue
+            score = float(other_vector @ vector)
+
+        merged = _merge(entries, course_id, score, neighbors)
+        if merged is False:
+            if other_vector is None:
+                other_vector = course_index.get_vector(other_id)
+            merged = _nearest(other_id, other_vector, neighbors) if other_vector is not None else []
+        if merged is not None:
+            lists[other_id] = merged
+
+    rows = []
+    for other_id, entries in lists.items():
+        rows.extend(_neighbor_rows(other_id, entries))
+
+    _replace_lists(list(lists), rows)
+    return len(lists)
+
+def get_similar_courses(course_slug, count=10, source=SOURCE_CONTENT):
+    """
+    Read a course's stored neighbour list with one indexed query.
+
+    Args:
+        course_slug: Slug of the course
+        count: Number of courses to return
+        source: 'content' (embedding similarity) or 'collaborative' (co-enrollment)
+
+    Returns:
+        list: Course dicts with similarity scores, most similar first
+    """
+    from .services import _format_recommendation
+
+    neighbors = CourseNeighbor.objects.filter(
+        course__slug=course_slug, source=source
+    ).select_related('neighbor').order_by('rank')[:count]
+    return [_format_recommendation(entry.neighbor, entry.score) for entry in neighbors]
@@ -0,0 +1,390 @@
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from .ann import ann_search, get_ann_settings, load_ann_index, top_k
+from .embedding_providers import active_embedding_model
+from .compression import compact_search, get_compression_settings, load_compressed_vectors
+from .models import CourseEmbedding
+from .vectors import CURRENT_VECTOR_FORMAT, decode_vector, load_course_snapshot, read_snapshot_manifest
+
+def normalize(vector):
+    """
+    Return a float32 unit-length copy of a vector (zero vectors stay zero).
+
+    Args:
+        vector: 1-D array-like embedding
+
+    Returns:
+        numpy.ndarray: The normalized float32 vector
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return vector
+    return vector / norm
+
+def indexed_embeddings():
+    """
+    Course embeddings in the active vector space (current format, active model).
+    """
+    return CourseEmbedding.objects.filter(vector_format=CURRENT_VECTOR_FORMAT, model_name=active_embedding_model())
+
+class CourseEmbeddingIndex:
+    """
+    Process-level index of course embeddings for recommendation scoring.
+
+    Vectors are kept as a pre-normalized float32 matrix with a parallel array
+    of course IDs, so cosine similarity against every course is a single
+    matrix-vector product. The bulk of the catalog lives in a read-only base
+    matrix, memory-mapped from the shared snapshot written by
+    `write_course_snapshot` when one exists, so every worker on a host shares
+    one copy. Rows written since the snapshot are held in a small in-process
+    delta that shadows the base: writes made in this process are applied with
+    `upsert`, and writes made by other processes are picked up by `refresh`,
+    which only loads rows whose `updated_at` is newer than the last rows it
+    read (less a small overlap for late commits).
+
+    When the snapshot has PCA/int8 compressed vectors (see compression.py),
+    base rows are ranked on the compact form and only the best candidates are
+    rescored against the memory-mapped originals.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._base_vectors = np.empty((0, 0), dtype=np.float32)
+        self._base_ids = np.empty(0, dtype=np.int64)
+        self._base_positions = {}
+        self._shadowed = np.zeros(0, dtype=bool)
+        self._delta = {}
+        self._delta_vectors = None
+        self._delta_ids = None
+        self._dimensions = 0
+        self._generation = None
+        self._ann = None
+        self._compact = None
+        self._synced_at = None
+        self._checked_at = 0.0
+        self._loaded = False
+
+    def __len__(self):
+        return int(len(self._base_ids) - self._shadowed.sum()) + len(self._delta)
+
+    @property
+    def dimensions(self):
+        return self._dimensions
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def load(self):
+        """
+        Build the index from the shared snapshot, or from the database if
+        there is no snapshot, then apply rows written since.
+        """
+        snapshot = load_course_snapshot()
+        if snapshot is not None and snapshot[0]['count'] and snapshot[0]['model_name'] != active_embedding_model():
+            snapshot = None  # Written for another provider; wait for the next snapshot
+
+        with self._lock:
+            if snapshot is not None:
+                manifest, vectors, ids = snapshot
+                self._base_vectors = vectors
+                self._base_ids = ids
+                self._dimensions = manifest['dimensions']
+                self._generation = manifest['generation']
+                self._ann = self._load_ann(manifest['generation'])
+                self._compact = self._load_compact(manifest['generation'], len(ids))
+                self._synced_at = parse_datetime(manifest['synced_at']) if manifest['synced_at'] else None
+            else:
+                self._base_vectors, self._base_ids, self._synced_at = self._read_database()
+                self._dimensions = self._base_vectors.shape[1] if len(self._base_ids) else 0
+                self._generation = None
+                self._ann = None
+                self._compact = None
+
+            self._base_positions = {int(course_id): i for i, course_id in enumerate(self._base_ids)}
+            self._shadowed = np.zeros(len(self._base_ids), dtype=bool)
+            self._delta = {}
+            self._delta_vectors = None
+            self._delta_ids = None
+            self._loaded = True
+
+        if snapshot is not None:
+            self._apply_changes()
+        self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """
+        Drop everything in memory; the next use reloads from scratch.
+        """
+        with self._lock:
+            self._loaded = False
+
+    def _load_ann(self, generation):
+        backend, _, _ = get_ann_settings()
+        if backend == 'exact':
+            return None
+        ann = load_ann_index(generation)
+        if ann is None or ann.name != backend:
+            return None
+        return ann
+
+    def _load_compact(self, generation, rows):
+        if not get_compression_settings()[0]:
+            return None
+        compact = load_compressed_vectors(generation)
+        if compact is None or len(compact) != rows:
+            return None
+        return compact
+
+    def _load_late_files(self):
+        if self._generation is None:
+            return
+        with self._lock:
+            if self._ann is None:
+                self._ann = self._load_ann(self._generation)
+            if self._compact is None:
+                self._compact = self._load_compact(self._generation, len(self._base_ids))
+
+    def _read_database(self):
+        rows = indexed_embeddings().values_list('course_id', 'embedding_vector', 'dimensions', 'updated_at')
+
+        ids = []
+        vectors = []
+        dimensions = 0
+        synced_at = None
+        for course_id, blob, row_dimensions, updated_at in rows.iterator(chunk_size=2000):
+            if not dimensions:
+                dimensions = row_dimensions
+            if row_dimensions != dimensions:
+                continue
+            ids.append(course_id)
+            vectors.append(normalize(decode_vector(blob, dimensions=dimensions)))
+            if synced_at is None or updated_at > synced_at:
+                synced_at = updated_at
+
+        matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        return matrix, np.array(ids, dtype=np.int64), synced_at
+
+    def _apply_changes(self):
+        # Rows are stamped before their transaction commits, so one stamped
+        # just before the watermark can become visible after it; re-read a
+        # margin of RECOMMENDER_INDEX_SYNC_MARGIN seconds to catch those
+        changed = indexed_embeddings()
+        if self._synced_at is not None:
+            margin = timedelta(seconds=getattr(settings, 'RECOMMENDER_INDEX_SYNC_MARGIN', 60))
+            changed = changed.filter(updated_at__gte=self._synced_at - margin)
+
+        synced_at = self._synced_at
+        rows = changed.values_list('course_id', 'embedding_vector', 'dimensions', 'updated_at')
+        for course_id, blob, dimensions, updated_at in rows:
+            # Like _read_database, leave out rows of other dimensions
+            if not self._dimensions or dimensions == self._dimensions:
+                self.upsert(course_id, decode_vector(blob, dimensions=dimensions))
+            if synced_at is None or updated_at > synced_at:
+                synced_at = updated_at
+
+        # Only database reads move the watermark, never this process's own writes
+        with self._lock:
+            self._synced_at = synced_at
+
+    def refresh(self, force=False):
+        """
+        Pull in embeddings written by other processes since the last sync.
+
+        The check is throttled by RECOMMENDER_INDEX_REFRESH_INTERVAL seconds.
+        The index is reloaded when a new snapshot generation has been written,
+        when rows have been deleted, or, if there is no snapshot, when the
+        delta outgrows RECOMMENDER_INDEX_MAX_DELTA. The ANN index and
+        compressed vectors are written after the snapshot's manifest, so
+        they are loaded here if they were not there yet when it was.
+
+        Args:
+            force: Check the database even if the refresh interval has not elapsed
+        """
+        if not self._loaded:
+            self.load()
+            return
+
+        interval = getattr(settings, 'RECOMMENDER_INDEX_REFRESH_INTERVAL', 30)
+        if not force and time.monotonic() - self._checked_at < interval:
+            return
+
+        manifest = read_snapshot_manifest()
+        if manifest is not None and manifest['generation'] != self._generation:
+            self.load()
+            return
+
+        self._load_late_files()
+        self._apply_changes()
+        self._checked_at = time.monotonic()
+
+        # Deleted courses cascade to their embeddings, so a size mismatch means
+        # rows went away. Rows of other dimensions are never indexed, so they
+        # are not counted.
+        stored = indexed_embeddings()
+        if self._dimensions:
+            stored = stored.filter(dimensions=self._dimensions)
+        stored = stored.count()
+        if stored != len(self):
+            self.load()
+            return
+
+        # Without a snapshot to fall back on, fold a large delta into a fresh base
+        max_delta = getattr(settings, 'RECOMMENDER_INDEX_MAX_DELTA', 5000)
+        if self._generation is None and len(self._delta) > max_delta:
+            self.load()
+
+    def upsert(self, course_id, vector):
+        """
+        Insert or replace the vector for a single course.
+
+        The sync watermark is left alone: rows other processes wrote before
+        this one may not have committed yet, and `refresh` must still read them.
+
+        Args:
+            course_id: The course ID
+            vector: The raw (unnormalized) embedding vector
+        """
+        vector = normalize(vector)
+
+        with self._lock:
+            if not self._dimensions:
+                self._dimensions = vector.shape[0]
+            if vector.shape[0] != self._dimensions:
+                # The embedding model changed dimensions; the old matrix is useless
+                self._loaded = False
+                return
+
+            position = self._base_positions.get(course_id)
+            if position is not None:
+                self._shadowed[position] = True
+
+            self._delta[course_id] = vector
+            self._delta_vectors = None
+            self._delta_ids = None
+
+    def remove(self, course_id):
+        """
+        Drop a course from the index.
+
+        Args:
+            course_id: The course ID
+        """
+        with self._lock:
+            position = self._base_positions.get(course_id)
+            if position is not None:
+                self._shadowed[position] = True
+            if self._delta.pop(course_id, None) is not None:
+                self._delta_vectors = None
+                self._delta_ids = None
+
+    def get_vector(self, course_id):
+        """
+        Return the normalized vector for a course, or None if it is not indexed.
+        """
+        self.refresh()
+        with self._lock:
+            if course_id in self._delta:
+                return self._delta[course_id]
+            position = self._base_positions.get(course_id)
+            if position is None or self._shadowed[position]:
+                return None
+            return np.array(self._base_vectors[position])
+
+    def matrix(self):
+        """
+        Return the full normalized matrix and parallel course IDs.
+
+        Base rows shadowed by the delta are dropped, so each course appears
+        exactly once.
+
+        Returns:
+            tuple: (vectors, ids)
+        """
+        self.refresh()
+
+        with self._lock:
+            base_vectors, base_ids, shadowed = self._base_vectors, self._base_ids, self._shadowed.copy()
+            delta_vectors, delta_ids = self._delta_arrays()
+
+        if shadowed.any():
+            keep = ~shadowed
+            base_vectors, base_ids = base_vectors[keep], base_ids[keep]
+        if len(delta_ids) == 0:
+            return base_vectors, base_ids
+        if len(base_ids) == 0:
+            return delta_vectors, delta_ids
+        return np.vstack([base_vectors, delta_vectors]), np.concatenate([base_ids, delta_ids])
+
+    def _delta_arrays(self):
+        if self._delta_ids is None:
+            if self._delta:
+                self._delta_ids = np.fromiter(self._delta.keys(), dtype=np.int64, count=len(self._delta))
+                self._delta_vectors = np.vstack(list(self._delta.values()))
+            else:
+                self._delta_ids = np.empty(0, dtype=np.int64)
+                self._delta_vectors = np.empty((0, self._dimensions), dtype=np.float32)
+        return self._delta_vectors, self._delta_ids
+
+    def search(self, query_vector, count, exclude_ids=None):
+        """
+        Find the courses most similar to a query vector.
+
+        Args:
+            query_vector: The raw (unnormalized) query embedding
+            count: Number of results to return
+            exclude_ids: Optional iterable of course IDs to leave out
+
+        Returns:
+            list: (course_id, similarity) tuples, most similar first
+        """
+        self.refresh()
+
+        query = normalize(query_vector)
+
+        with self._lock:
+            base_vectors, base_ids, shadowed = self._base_vectors, self._base_ids, self._shadowed.copy()
+            delta_vectors, delta_ids = self._delta_arrays()
+
+        if len(self) == 0 or count <= 0 or query.shape[0] != self._dimensions:
+            return []
+
+        exclude = np.array(list(exclude_ids), dtype=np.int64) if exclude_ids else None
+
+        base_mask = shadowed
+        if exclude is not None:
+            base_mask = base_mask | np.isin(base_ids, exclude)
+
+        # Base rows: approximate search over the snapshot when the catalog is large enough
+        _, min_courses, probes = get_ann_settings()
+        if self._ann is not None and len(base_ids) >= min_courses:
+            positions, base_scores = ann_search(self._ann, base_vectors, query, count, probes, base_mask)
+            base_ids = base_ids[positions]
+        elif self._compact is not None:
+            rerank = get_compression_settings()[3]
+            positions, base_scores = compact_search(self._compact, base_vectors, query, count, rerank, base_mask)
+            base_ids = base_ids[positions]
+        else:
+            base_scores = base_vectors @ query if len(base_ids) else np.empty(0, dtype=np.float32)
+            base_scores[shadowed] = -np.inf
+
+        # Delta rows are always scored exactly
+        delta_scores = delta_vectors @ query if len(delta_ids) else np.empty(0, dtype=np.float32)
+
+        scores = np.concatenate([base_scores, delta_scores])
+        ids = np.concatenate([base_ids, delta_ids])
+
+        if exclude is not None:
+            scores[np.isin(ids, exclude)] = -np.inf
+
+        available = int(np.isfinite(scores).sum())
+        top = top_k(scores, min(count, available))
+
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+course_index = CourseEmbeddingIndex()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import numpy as np
+from django.conf import settings
+from .metrics import increment
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+class EmbeddingProvider:
+    """
+    Turns texts into embedding vectors.
+
+    `name` is stored as the model_name of every vector a provider writes and
+    is part of the content fingerprint, so vectors from different providers
+    (or differently fitted local models) are never compared with each other.
+    """
+    name = ''
+
+    def embed(self, texts):
+        """
+        Embed a list of texts.
+
+        Returns:
+            list: One numpy.ndarray per text, or None where embedding failed
+        """
+        raise NotImplementedError
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    OpenAI embeddings API, one request per chunk of texts.
+    """
+
+    def __init__(self, model=OPENAI_EMBEDDING_MODEL):
+        self.model = model
+        self.name = model
+
+    def embed(self, texts):
+        """
+        Embed a chunk of texts in one API request, splitting it if rejected.
+
+        A request rejected as invalid (HTTP 400, e.g. an input over the token
+        limit) is retried as two halves, so one bad input only costs its own
+        embedding rather than the whole chunk. Any other failure fails the
+        chunk; the gateway has already retried it with backoff.
+        """
+        import openai
+        from .llm import create_embeddings
+
+        try:
+            response = create_embeddings(
+                model=self.model,
+                input=texts
+            )
+            vectors = [None] * len(texts)
+            for item in response.data:
+                vectors[item.index] = np.array(item.embedding, dtype=np.float32)
+            return vectors
+
+        except openai.BadRequestError as e:
+            if len(texts) == 1:
+                print(f"Error generating embeddings: {str(e)}")
+                return [None]
+            middle = len(texts) // 2
+            return self.embed(texts[:middle]) + self.embed(texts[middle:])
+
+        except Exception as e:
+            # Splitting would only fail again; let the fallback provider take it
+            print(f"Error generating embeddings: {str(e)}")
+            return [None] * len(texts)
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Local, stateless embeddings from scikit-learn's HashingVectorizer.
+
+    Words and word pairs are hashed into `dimensions` buckets, so no fitting
+    is needed and any process produces identical vectors. Similarity is
+    lexical rather than semantic, which is enough for development, tests,
+    benchmarks and outages.
+    """
+
+    def __init__(self, dimensions=512):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.name = f"local-hashing-{dimensions}"
+        self.vectorizer = HashingVectorizer(
+            n_features=dimensions, ngram_range=(1, 2), stop_words='english', alternate_sign=False, norm='l2'
+        )
+
+    def embed(self, texts):
+        matrix = self.vectorizer.transform(texts).astype(np.float32)
+        return list(matrix.toarray())
+
+class TfidfSvdEmbeddingProvider(EmbeddingProvider):
+    """
+    Local embeddings from TF-IDF followed by truncated SVD (LSA), fitted on
+    the course corpus with `fit_local_embedding_model`.
+
+    The fitted vocabulary, IDF weights and SVD components are stored as
+    plain arrays (no pickle) at EMBEDDING_LOCAL_MODEL_PATH. The name carries
+    a fingerprint of the fit, so refitting regenerates stored vectors.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = ''
+        self.vectorizer = None
+        self.components = None
+        self.load()
+
+    def load(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vocabulary = json.loads(str(data['vocabulary']))
+                idf = data['idf']
+                self.components = data['components']
+                self.name = str(data['name'])
+        except (FileNotFoundError, ValueError, KeyError):
+            return
+
+        self.vectorizer = TfidfVectorizer(vocabulary=vocabulary, ngram_range=(1, 2), stop_words='english', sublinear_tf=True)
+        self.vectorizer.idf_ = idf
+
+    @classmethod
+    def fit(cls, texts, path, dimensions=256):
+        """
+        Fit TF-IDF + SVD on a corpus and save it to `path`.
+
+        Args:
+            texts: Corpus texts (e.g. every course's embedding text)
+            path: Where to write the fitted model
+            dimensions: SVD components (clamped to the corpus size)
+
+        Returns:
+            TfidfSvdEmbeddingProvider: The fitted provider
+        """
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        vectorizer = TfidfVectorizer(
+            ngram_range=(1, 2), stop_words='english', sublinear_tf=True, min_df=2 if len(texts) >= 50 else 1
+        )
+        matrix = vectorizer.fit_transform(texts)
+        dimensions = max(1, min(dimensions, matrix.shape[0] - 1, matrix.shape[1] - 1))
+        svd = TruncatedSVD(n_components=dimensions, random_state=0)
+        svd.fit(matrix)
+        components = svd.components_.astype(np.float32)
+
+        vocabulary = json.dumps({term: int(index) for term, index in vectorizer.vocabulary_.items()})
+        fingerprint = hashlib.sha256(vocabulary.encode('utf-8') + components.tobytes()).hexdigest()[:12]
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as model_file:
+            np.savez(
+                model_file,
+                name=np.array(f"local-tfidf-svd-{dimensions}-{fingerprint}"),
+                vocabulary=np.array(vocabulary),
+                idf=vectorizer.idf_.astype(np.float64),
+                components=components,
+            )
+        os.replace(temp_path, path)
+        return cls(path)
+
+    def embed(self, texts):
+        if self.vectorizer is None:
+            print(f"Error generating embeddings: no fitted TF-IDF model at {self.path}")
+            return [None] * len(texts)
+        return list(np.asarray(self.vectorizer.transform(texts) @ self.components.T, dtype=np.float32))
+
+def _build_provider(name):
+    if name == 'openai':
+        return OpenAIEmbeddingProvider(getattr(settings, 'OPENAI_EMBEDDING_MODEL', OPENAI_EMBEDDING_MODEL))
+    if name == 'hashing':
+        return HashingEmbeddingProvider(getattr(settings, 'EMBEDDING_LOCAL_DIMENSIONS', 512))
+    if name == 'tfidf':
+        return TfidfSvdEmbeddingProvider(get_local_model_path())
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+_providers = {}
+
+def get_embedding_provider(name=None):
+    """
+    Return the configured embedding provider (EMBEDDING_PROVIDER by default).
+
+    Providers are built once per process.
+
+    Args:
+        name: 'openai', 'hashing' or 'tfidf'
+    """
+    name = name or getattr(settings, 'EMBEDDING_PROVIDER', 'openai')
+    if name not in _providers:
+        _providers[name] = _build_provider(name)
+    return _providers[name]
+
+def reset_embedding_providers():
+    """
+    Drop cached providers, e.g. after refitting the local model.
+    """
+    _providers.clear()
+
+def active_embedding_model():
+    """
+    Model name of the vector space recommendations are scored in.
+    """
+    return get_embedding_provider().name
+
+def get_local_model_path():
+    return getattr(settings, 'EMBEDDING_LOCAL_MODEL_PATH', os.path.join(settings.BASE_DIR, 'embedding_models', 'tfidf-svd.npz'))
+
+def embed_with_fallback(texts):
+    """
+    Embed texts with the configured provider, retrying failures with
+    EMBEDDING_FALLBACK_PROVIDER when one is set.
+
+    Fallback vectors are tagged with the fallback's model name, so they stay
+    out of the primary vector space and are regenerated by the next refresh
+    once the primary provider is back.
+
+    Args:
+        texts: List of texts to embed
+
+    Returns:
+        list: One (vector, model_name) tuple per text, or None where every
+            provider failed
+    """
+    primary = get_embedding_provider()
+    results = [
+        (vector, primary.name) if vector is not None else None
+        for vector in primary.embed(texts)
+    ]
+
+    failed = [i for i, result in enumerate(results) if result is None]
+    fallback_name = getattr(settings, 'EMBEDDING_FALLBACK_PROVIDER', 'hashing')
+    if failed and fallback_name and fallback_name != getattr(settings, 'EMBEDDING_PROVIDER', 'openai'):
+        fallback = get_embedding_provider(fallback_name)
+        for i, vector in zip(failed, fallback.embed([texts[i] for i in failed])):
+            if vector is not None:
+                results[i] = (vector, fallback.name)
+        increment('embeddings.fallback', len(failed))
+
+    return results
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .metrics import increment
+
+PENDING_KEY = 'embedding-refresh:{kind}:{object_id}'
+
+def _pending_key(kind, object_id):
+    return PENDING_KEY.format(kind=kind, object_id=object_id)
+
+def schedule_embedding_refresh(kind, object_id):
+    """
+    Queue a debounced embedding refresh for a course or user.
+
+    The refresh is enqueued only after the current transaction commits, and
+    at most one refresh per object is pending at a time: the first request
+    in a burst enqueues the task with a countdown of
+    EMBEDDING_REFRESH_DEBOUNCE seconds, and later requests inside that
+    window are absorbed by it.
+
+    Args:
+        kind: 'course' or 'user'
+        object_id: ID of the course or user
+    """
+    transaction.on_commit(lambda: _enqueue(kind, object_id))
+
+def schedule_embedding_retry(kind, object_id):
+    """
+    Queue another refresh of an object the primary provider failed to embed,
+    EMBEDDING_RETRY_DELAY seconds from now, so the fallback is only temporary.
+
+    Args:
+        kind: 'course' or 'user'
+        object_id: ID of the course or user
+    """
+    delay = getattr(settings, 'EMBEDDING_RETRY_DELAY', 600)
+    transaction.on_commit(lambda: _enqueue(kind, object_id, delay))
+
+def _enqueue(kind, object_id, countdown=None):
+    from .tasks import update_course_embedding_task, update_user_embedding_task
+
+    task = {'course': update_course_embedding_task, 'user': update_user_embedding_task}[kind]
+    countdown = countdown or getattr(settings, 'EMBEDDING_REFRESH_DEBOUNCE', 30)
+
+    # The marker outlives the countdown so a slow queue can't let a duplicate through
+    if not cache.add(_pending_key(kind, object_id), 1, timeout=countdown * 4 + 60):
+        increment(f'embeddings.{kind}.coalesced')
+        return
+
+    task.apply_async((object_id,), countdown=countdown)
+
+def clear_pending_refresh(kind, object_id):
+    """
+    Mark a refresh as started, so changes committed from now on queue a new one.
+    """
+    cache.delete(_pending_key(kind, object_id))
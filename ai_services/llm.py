@@ -0,0 +1,432 @@
+import asyncio
+import random
+import threading
+import time
+import httpx
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+from .llm_fixtures import wrap_client
+from .llm_usage import get_call_tags, record_llm_call, usage_tokens
+from .metrics import increment
+from .single_flight import asingle_flight, request_key, single_flight
+
+# Status codes worth retrying: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class CircuitOpenError(openai.OpenAIError):
+    """
+    Raised instead of calling the provider while the circuit breaker is open.
+    """
+
+def get_llm_settings():
+    return {
+        'timeout': getattr(settings, 'LLM_TIMEOUT', 30.0),
+        'connect_timeout': getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0),
+        'max_retries': getattr(settings, 'LLM_MAX_RETRIES', 2),
+        'retry_base_delay': getattr(settings, 'LLM_RETRY_BASE_DELAY', 0.5),
+        'retry_max_delay': getattr(settings, 'LLM_RETRY_MAX_DELAY', 8.0),
+        'max_connections': getattr(settings, 'LLM_MAX_CONNECTIONS', 20),
+        'max_keepalive': getattr(settings, 'LLM_MAX_KEEPALIVE_CONNECTIONS', 10),
+        'breaker_failures': getattr(settings, 'LLM_BREAKER_FAILURES', 5),
+        'breaker_reset': getattr(settings, 'LLM_BREAKER_RESET_SECONDS', 30.0),
+    }
+
+class CircuitBreaker:
+    """
+    Per-process circuit breaker.
+
+    After `failure_threshold` consecutive provider failures the circuit
+    opens and calls fail immediately with CircuitOpenError, so callers drop
+    to their fallbacks instead of queueing behind a sick provider. After
+    `reset_timeout` seconds one trial call is let through (half-open); its
+    success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """
+        Whether a call may go to the provider now.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    increment(f"llm.circuit.{self.name}.opened")
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        # A trial call ended without telling us anything about provider health
+        with self._lock:
+            self._trial_running = False
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_breaker = None
+
+def build_openai_client():
+    """
+    A live OpenAI client on a pooled keep-alive HTTP client. The SDK's own
+    retries are off because calls go through the retry loop here.
+    """
+    options = get_llm_settings()
+    return OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=0,
+        http_client=httpx.Client(
+            timeout=httpx.Timeout(options['timeout'], connect=options['connect_timeout']),
+            limits=httpx.Limits(
+                max_connections=options['max_connections'],
+                max_keepalive_connections=options['max_keepalive'],
+            ),
+        ),
+    )
+
+def build_async_openai_client():
+    """
+    Async version of build_openai_client.
+    """
+    options = get_llm_settings()
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        max_retries=0,
+        http_client=httpx.AsyncClient(
+            timeout=httpx.Timeout(options['timeout'], connect=options['connect_timeout']),
+            limits=httpx.Limits(
+                max_connections=options['max_connections'],
+                max_keepalive_connections=options['max_keepalive'],
+            ),
+        ),
+    )
+
+def get_client():
+    """
+    The process-wide client shared by every caller: live OpenAI, or the
+    record/replay backend selected by LLM_PROVIDER (see llm_fixtures).
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = wrap_client(build_openai_client)
+    return _client
+
+def get_async_client():
+    """
+    The process-wide async client, chosen like get_client().
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = wrap_client(build_async_openai_client, asynchronous=True)
+    return _async_client
+
+def get_breaker():
+    global _breaker
+    if _breaker is None:
+        with _lock:
+            if _breaker is None:
+                options = get_llm_settings()
+                _breaker = CircuitBreaker('openai', options['breaker_failures'], options['breaker_reset'])
+    return _breaker
+
+def is_retryable(error):
+    """
+    Whether an error means the provider is unhealthy (as opposed to a bad request).
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+def retry_delay(attempt, options):
+    """
+    Full-jitter exponential backoff before retry number `attempt` (1-based).
+    """
+    cap = min(options['retry_max_delay'], options['retry_base_delay'] * 2 ** (attempt - 1))
+    return random.uniform(0, cap)
+
+def _attempts(timeout):
+    """
+    Yield (attempt number, deadline, settings) for each try allowed,
+    stopping once the deadline has passed.
+    """
+    options = get_llm_settings()
+    deadline = time.monotonic() + (timeout or options['timeout'])
+    for attempt in range(options['max_retries'] + 1):
+        if time.monotonic() >= deadline:
+            return
+        yield attempt, deadline, options
+
+def _backoff(attempt, deadline, options):
+    """
+    Delay before the next attempt, or None if there is no time or retry left.
+    """
+    if attempt >= options['max_retries']:
+        return None
+    delay = retry_delay(attempt + 1, options)
+    if time.monotonic() + delay >= deadline:
+        return None
+    increment('llm.retry')
+    return delay
+
+class CallRecord:
+    """
+    Usage record of one gateway call, written through llm_usage.record_llm_call.
+    """
+
+    def __init__(self, kind, model):
+        self.kind = kind
+        self.model = model or ''
+        self.started = time.monotonic()
+        self.retries = 0
+        # Streams finish after the caller's tags may have been reset
+        self.tags = get_call_tags()
+
+    def finish(self, outcome, prompt_tokens=None, completion_tokens=None, error=None):
+        record_llm_call(
+            self.kind, self.model, self.started, self.retries, outcome,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, error=error, tags=self.tags
+        )
+
+class RecordedStream:
+    """
+    A streamed chat completion that records its usage once it ends.
+
+    Streams report no usage, so tokens are counted from the prompt and the
+    streamed text. A stream closed before its last chunk (e.g. the client
+    disconnected) is recorded as cancelled.
+    """
+
+    def __init__(self, stream, record, messages):
+        self.stream = stream
+        self.record = record
+        self.messages = messages
+        self.response = stream.response
+        self.chunks = []
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.chunks.append(chunk.choices[0].delta.content)
+                yield chunk
+        except Exception as e:
+            self._finish('error', e)
+            raise
+        self._finish('success')
+
+    def close(self):
+        self.response.close()
+        self._finish('cancelled')
+
+    def _finish(self, outcome, error=None):
+        from .chat_context import count_tokens
+
+        if self.finished:
+            return
+        self.finished = True
+        prompt_tokens = sum(count_tokens(message.get('content') or '') for message in self.messages)
+        self.record.finish(outcome, prompt_tokens, count_tokens(''.join(self.chunks)), error)
+
+def call_llm(operation, timeout=None, record=None, defer_record=False):
+    """
+    Run one provider call with the deadline, retries and circuit breaker.
+
+    Args:
+        operation: Callable taking (client, timeout) that makes one request;
+            it is called again for each retry
+        timeout: Deadline in seconds for the call including retries
+            (defaults to LLM_TIMEOUT)
+        record: CallRecord for usage reporting
+        defer_record: Leave recording a successful call to the caller
+
+    Returns:
+        The operation's result
+
+    Raises:
+        CircuitOpenError: The provider is marked unhealthy
+        openai.OpenAIError: The last error once retries or time run out
+    """
+    breaker = get_breaker()
+    record = record or CallRecord('chat', '')
+    error = None
+
+    for attempt, deadline, options in _attempts(timeout):
+        if not breaker.allow():
+            increment('llm.circuit.rejected')
+            error = CircuitOpenError(f"Circuit open for {breaker.name}")
+            record.finish('rejected', error=error)
+            raise error
+
+        try:
+            result = operation(get_client(), deadline - time.monotonic())
+        except Exception as e:
+            error = e
+            if not is_retryable(e):
+                breaker.release()
+                record.finish('error', error=e)
+                raise
+            breaker.record_failure()
+            increment('llm.failure')
+        else:
+            breaker.record_success()
+            if not defer_record:
+                record.finish('success', *usage_tokens(result))
+            return result
+
+        delay = _backoff(attempt, deadline, options)
+        if delay is None:
+            break
+        record.retries += 1
+        time.sleep(delay)
+
+    error = error or TimeoutError("LLM call deadline passed")
+    record.finish('error', error=error)
+    raise error
+
+async def acall_llm(operation, timeout=None, record=None):
+    """
+    Async version of call_llm; `operation` takes (async client, timeout)
+    and returns an awaitable.
+    """
+    breaker = get_breaker()
+    record = record or CallRecord('chat', '')
+    finish = sync_to_async(record.finish)
+    error = None
+
+    for attempt, deadline, options in _attempts(timeout):
+        if not breaker.allow():
+            increment('llm.circuit.rejected')
+            error = CircuitOpenError(f"Circuit open for {breaker.name}")
+            await finish('rejected', error=error)
+            raise error
+
+        try:
+            result = await operation(get_async_client(), deadline - time.monotonic())
+        except Exception as e:
+            error = e
+            if not is_retryable(e):
+                breaker.release()
+                await finish('error', error=e)
+                raise
+            breaker.record_failure()
+            increment('llm.failure')
+        else:
+            breaker.record_success()
+            await finish('success', *usage_tokens(result))
+            return result
+
+        delay = _backoff(attempt, deadline, options)
+        if delay is None:
+            break
+        record.retries += 1
+        await asyncio.sleep(delay)
+
+    error = error or TimeoutError("LLM call deadline passed")
+    await finish('error', error=error)
+    raise error
+
+def chat_completion(timeout=None, **kwargs):
+    """
+    Create a chat completion through the gateway.
+
+    Concurrent identical calls (same model, messages and parameters) are
+    coalesced into one upstream request whose result they share.
+
+    Args:
+        timeout: Deadline in seconds including retries
+        **kwargs: Passed to chat.completions.create. With stream=True only
+            opening the stream is retried, and streams are not coalesced.
+    """
+    def operation():
+        return call_llm(
+            lambda client, remaining: client.chat.completions.create(timeout=remaining, **kwargs),
+            timeout, CallRecord('chat', kwargs.get('model'))
+        )
+
+    if kwargs.get('stream'):
+        record = CallRecord('chat', kwargs.get('model'))
+        stream = call_llm(
+            lambda client, remaining: client.chat.completions.create(timeout=remaining, **kwargs),
+            timeout, record, defer_record=True
+        )
+        return RecordedStream(stream, record, kwargs.get('messages') or [])
+    return single_flight(request_key(**kwargs), operation)
+
+def create_embeddings(timeout=None, **kwargs):
+    """
+    Create embeddings through the gateway.
+    """
+    return call_llm(
+        lambda client, remaining: client.embeddings.create(timeout=remaining, **kwargs),
+        timeout, CallRecord('embeddings', kwargs.get('model'))
+    )
+
+def transcribe(audio_file_path, timeout=None, **kwargs):
+    """
+    Transcribe an audio file through the gateway (the file is reopened per attempt).
+    """
+    def operation(client, remaining):
+        with open(audio_file_path, "rb") as audio_file:
+            return client.audio.transcriptions.create(file=audio_file, timeout=remaining, **kwargs)
+    return call_llm(operation, timeout, CallRecord('transcription', kwargs.get('model')))
+
+async def achat_completion(timeout=None, **kwargs):
+    """
+    Async version of chat_completion (streams are not supported).
+    """
+    def operation():
+        return acall_llm(
+            lambda client, remaining: client.chat.completions.create(timeout=remaining, **kwargs),
+            timeout, CallRecord('chat', kwargs.get('model'))
+        )
+
+    return await asingle_flight(request_key(**kwargs), operation)
+
+async def atranscribe(audio_file_path, timeout=None, **kwargs):
+    """
+    Async version of transcribe.
+    """
+    async def operation(client, remaining):
+        with open(audio_file_path, "rb") as audio_file:
+            return await client.audio.transcriptions.create(file=audio_file, timeout=remaining, **kwargs)
+    return await acall_llm(operation, timeout, CallRecord('transcription', kwargs.get('model')))
@@ -0,0 +1,432 @@
+"""
+Record/replay backends for the LLM gateway (LLM_PROVIDER = 'record' or 'replay').
+
+'record' passes calls to OpenAI and writes each request/response pair to
+LLM_FIXTURE_DIR, keyed by a hash of the request. 'replay' answers from
+those files without network access, optionally sleeping as a synthetic
+latency model says, so the AI endpoints can be benchmarked and load tested
+deterministically on an isolated machine.
+
+The clients expose the parts of the OpenAI client interface the gateway
+uses: chat.completions.create (including stream=True), embeddings.create
+and audio.transcriptions.create.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+import openai
+from django.conf import settings
+from openai.types import CreateEmbeddingResponse
+from openai.types.audio import Transcription
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+RESPONSE_TYPES = {
+    'chat': ChatCompletion,
+    'embeddings': CreateEmbeddingResponse,
+    'transcription': Transcription,
+}
+
+class FixtureNotFoundError(openai.OpenAIError):
+    """
+    No recorded response matches a request being replayed.
+    """
+
+def get_fixture_settings():
+    return (
+        getattr(settings, 'LLM_FIXTURE_DIR', os.path.join(settings.BASE_DIR, 'llm_fixtures')),
+        getattr(settings, 'LLM_REPLAY_STRICT', False),
+        getattr(settings, 'LLM_REPLAY_LATENCY', 'none'),
+    )
+
+def request_fingerprint(kind, kwargs):
+    """
+    The parts of a request that decide its response: everything but the
+    timeout and streaming flag, with audio files replaced by a content hash.
+    """
+    request = {key: value for key, value in kwargs.items() if key not in ('timeout', 'stream')}
+    if 'file' in request:
+        audio_file = request['file']
+        request['file'] = hashlib.sha256(audio_file.read()).hexdigest()
+        audio_file.seek(0)
+    return {'kind': kind, **request}
+
+def fixture_key(fingerprint):
+    payload = json.dumps(fingerprint, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def pool_key(fingerprint, any_model=False):
+    """
+    Requests answered interchangeably in non-strict replay: same kind, model
+    (unless `any_model`) and response format.
+    """
+    model = '*' if any_model else fingerprint.get('model', '')
+    return f"{fingerprint['kind']}:{model}:{json.dumps(fingerprint.get('response_format'), sort_keys=True)}"
+
+class FixtureStore:
+    """
+    Request/response pairs on disk: <directory>/<kind>/<request hash>.json.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pools = None
+
+    def path(self, kind, key):
+        return os.path.join(self.directory, kind, f"{key}.json")
+
+    def save(self, fingerprint, response, latency):
+        kind = fingerprint['kind']
+        key = fixture_key(fingerprint)
+        os.makedirs(os.path.join(self.directory, kind), exist_ok=True)
+        fixture = {
+            'request': fingerprint,
+            'response': response,
+            'latency': latency,
+        }
+        # Write then rename, so a concurrent replay never reads half a file
+        temp_path = f"{self.path(kind, key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as fixture_file:
+            json.dump(fixture, fixture_file, default=str)
+        os.replace(temp_path, self.path(kind, key))
+        with self._lock:
+            self._pools = None
+
+    def _load_pools(self):
+        pools = {}
+        for kind in RESPONSE_TYPES:
+            kind_dir = os.path.join(self.directory, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            for name in sorted(os.listdir(kind_dir)):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(kind_dir, name)
+                with open(path) as fixture_file:
+                    request = json.load(fixture_file)['request']
+                pools.setdefault(pool_key(request), []).append(path)
+                pools.setdefault(pool_key(request, any_model=True), []).append(path)
+        return pools
+
+    def load(self, fingerprint, strict):
+        """
+        The recorded fixture for a request. Unless `strict`, a request that
+        was never recorded gets a fixture of the same kind, model and
+        response format (or, failing that, of any model, as routing may
+        pick models that were not recorded), chosen deterministically by
+        its hash.
+
+        Raises:
+            FixtureNotFoundError: Nothing to replay
+        """
+        key = fixture_key(fingerprint)
+        path = self.path(fingerprint['kind'], key)
+        if not os.path.exists(path):
+            if strict:
+                raise FixtureNotFoundError(f"No {fingerprint['kind']} fixture for request {key}")
+            with self._lock:
+                if self._pools is None:
+                    self._pools = self._load_pools()
+                candidates = self._pools.get(pool_key(fingerprint)) or self._pools.get(pool_key(fingerprint, any_model=True))
+            if not candidates:
+                raise FixtureNotFoundError(f"No {fingerprint['kind']} fixtures for {pool_key(fingerprint)}")
+            path = candidates[int(key, 16) % len(candidates)]
+        with open(path) as fixture_file:
+            return json.load(fixture_file)
+
+class LatencyModel:
+    """
+    How long a replayed call takes.
+
+    'none' answers at once, 'recorded' takes as long as the recorded call
+    did (times LLM_REPLAY_LATENCY_SCALE), and 'synthetic' takes
+    LLM_REPLAY_LATENCY_BASE seconds plus LLM_REPLAY_LATENCY_PER_TOKEN per
+    completion token, with log-normal jitter (LLM_REPLAY_LATENCY_JITTER is
+    its sigma). Streams spend the base delay before the first chunk and the
+    per-token time between chunks.
+    """
+
+    def __init__(self, mode, base=0.5, per_token=0.02, jitter=0.25, scale=1.0, seed=None):
+        self.mode = mode
+        self.base = base
+        self.per_token = per_token
+        self.jitter = jitter
+        self.scale = scale
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_settings(cls):
+        _, _, mode = get_fixture_settings()
+        return cls(
+            mode,
+            base=getattr(settings, 'LLM_REPLAY_LATENCY_BASE', 0.5),
+            per_token=getattr(settings, 'LLM_REPLAY_LATENCY_PER_TOKEN', 0.02),
+            jitter=getattr(settings, 'LLM_REPLAY_LATENCY_JITTER', 0.25),
+            scale=getattr(settings, 'LLM_REPLAY_LATENCY_SCALE', 1.0),
+            seed=getattr(settings, 'LLM_REPLAY_SEED', None),
+        )
+
+    def _noise(self):
+        return self.random.lognormvariate(0, self.jitter) if self.jitter else 1.0
+
+    def delays(self, fixture, chunk_tokens):
+        """
+        Seconds to wait before the response (first value) and before each
+        further chunk of `chunk_tokens` tokens.
+        """
+        if self.mode == 'recorded':
+            return [fixture.get('latency', 0.0) * self.scale] + [0.0] * len(chunk_tokens[1:])
+        if self.mode == 'synthetic':
+            noise = self._noise()
+            first = chunk_tokens[0] if chunk_tokens else 0
+            return [(self.base + self.per_token * first) * noise] + [self.per_token * tokens * noise for tokens in chunk_tokens[1:]]
+        return [0.0] * max(len(chunk_tokens), 1)
+
+def completion_text(fixture):
+    choices = fixture['response'].get('choices') or [{}]
+    return (choices[0].get('message') or {}).get('content') or ''
+
+def completion_tokens(fixture, text):
+    from .chat_context import count_tokens
+
+    usage = fixture['response'].get('usage') or {}
+    return usage.get('completion_tokens') or count_tokens(text)
+
+def fit_embeddings(response, inputs):
+    """
+    Match a replayed embeddings response to the request's inputs; a pooled
+    fixture recorded for other texts gives each input one of its vectors,
+    picked by the text's hash.
+    """
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+    data = response['data']
+    if len(data) == len(inputs):
+        return response
+    vectors = [item['embedding'] for item in sorted(data, key=lambda item: item['index'])]
+    return {
+        **response,
+        'data': [
+            {'embedding': vectors[int(hashlib.md5(str(text).encode('utf-8')).hexdigest(), 16) % len(vectors)], 'index': index, 'object': 'embedding'}
+            for index, text in enumerate(inputs)
+        ],
+    }
+
+def replayed_response(kind, fixture, kwargs):
+    response = fixture['response']
+    if kind == 'embeddings':
+        response = fit_embeddings(response, kwargs.get('input', []))
+    return RESPONSE_TYPES[kind](**response)
+
+def split_stream(fixture):
+    """
+    Stream chunks (ChatCompletionChunk) replaying a recorded completion, one per word.
+    """
+    from .chat_context import count_tokens
+
+    response = fixture['response']
+    words = completion_text(fixture).split(' ')
+    pieces = [word if position == 0 else f" {word}" for position, word in enumerate(words)]
+    chunks = [
+        ChatCompletionChunk(
+            id=response.get('id', 'replay'),
+            choices=[{'delta': {'content': piece}, 'index': 0, 'finish_reason': None}],
+            created=response.get('created', 0),
+            model=response.get('model', ''),
+            object='chat.completion.chunk',
+        )
+        for piece in pieces
+    ]
+    return chunks, [count_tokens(piece) for piece in pieces]
+
+def _timeout_error():
+    return openai.APITimeoutError(request=httpx.Request('POST', 'https://api.openai.com/replay'))
+
+class _ReplayResponse:
+    """
+    Stands in for the HTTP response of a replayed stream.
+    """
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class ReplayStream:
+    def __init__(self, chunks, delays, timeout):
+        self.chunks = chunks
+        self.delays = delays
+        self.timeout = timeout
+        self.response = _ReplayResponse()
+
+    def __iter__(self):
+        for chunk, delay in zip(self.chunks, self.delays):
+            if self.response.closed:
+                return
+            if self.timeout is not None and delay > self.timeout:
+                time.sleep(self.timeout)
+                raise _timeout_error()
+            time.sleep(delay)
+            yield chunk
+
+class ReplayClient:
+    """
+    Answers gateway calls from recorded fixtures, without network access.
+    """
+
+    def __init__(self, store, latency, strict=False):
+        self.store = store
+        self.latency = latency
+        self.strict = strict
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=lambda **kwargs: self._replay('embeddings', kwargs))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=lambda **kwargs: self._replay('transcription', kwargs)))
+
+    def _wait(self, delay, timeout):
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise _timeout_error()
+        time.sleep(delay)
+
+    def _replay(self, kind, kwargs):
+        fixture = self.store.load(request_fingerprint(kind, kwargs), self.strict)
+        tokens = completion_tokens(fixture, completion_text(fixture)) if kind == 'chat' else 0
+        self._wait(self.latency.delays(fixture, [tokens])[0], kwargs.get('timeout'))
+        return replayed_response(kind, fixture, kwargs)
+
+    def _chat(self, **kwargs):
+        if not kwargs.get('stream'):
+            return self._replay('chat', kwargs)
+        fixture = self.store.load(request_fingerprint('chat', kwargs), self.strict)
+        chunks, chunk_tokens = split_stream(fixture)
+        return ReplayStream(chunks, self.latency.delays(fixture, chunk_tokens), kwargs.get('timeout'))
+
+class AsyncReplayClient(ReplayClient):
+    """
+    ReplayClient for the async gateway; waits without blocking the event loop.
+    """
+
+    def __init__(self, store, latency, strict=False):
+        super().__init__(store, latency, strict)
+        self.embeddings = SimpleNamespace(create=lambda **kwargs: self._areplay('embeddings', kwargs))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=lambda **kwargs: self._areplay('transcription', kwargs)))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: self._areplay('chat', kwargs)))
+
+    async def _areplay(self, kind, kwargs):
+        fixture = self.store.load(request_fingerprint(kind, kwargs), self.strict)
+        tokens = completion_tokens(fixture, completion_text(fixture)) if kind == 'chat' else 0
+        delay = self.latency.delays(fixture, [tokens])[0]
+        timeout = kwargs.get('timeout')
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise _timeout_error()
+        await asyncio.sleep(delay)
+        return replayed_response(kind, fixture, kwargs)
+
+class RecordingStream:
+    """
+    Passes a live stream through and records it as one completion once it ends.
+    """
+
+    def __init__(self, stream, on_complete):
+        self.stream = stream
+        self.response = stream.response
+        self.on_complete = on_complete
+
+    def __iter__(self):
+        chunks = []
+        for chunk in self.stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+            yield chunk
+        self.on_complete(''.join(chunks))
+
+class RecordingClient:
+    """
+    Passes gateway calls to a real client and records each response.
+    """
+
+    def __init__(self, client, store):
+        self.client = client
+        self.store = store
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=lambda **kwargs: self._record('embeddings', client.embeddings.create, kwargs))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(
+            create=lambda **kwargs: self._record('transcription', client.audio.transcriptions.create, kwargs)
+        ))
+
+    def _record(self, kind, create, kwargs):
+        fingerprint = request_fingerprint(kind, kwargs)
+        started = time.monotonic()
+        response = create(**kwargs)
+        self.store.save(fingerprint, response.model_dump(), time.monotonic() - started)
+        return response
+
+    def _chat(self, **kwargs):
+        if not kwargs.get('stream'):
+            return self._record('chat', self.client.chat.completions.create, kwargs)
+
+        fingerprint = request_fingerprint('chat', kwargs)
+        started = time.monotonic()
+
+        def save(content):
+            response = {
+                'id': 'recorded-stream',
+                'choices': [{'finish_reason': 'stop', 'index': 0, 'message': {'role': 'assistant', 'content': content}}],
+                'created': int(time.time()),
+                'model': kwargs.get('model', ''),
+                'object': 'chat.completion',
+            }
+            self.store.save(fingerprint, response, time.monotonic() - started)
+
+        return RecordingStream(self.client.chat.completions.create(**kwargs), save)
+
+class AsyncRecordingClient(RecordingClient):
+    """
+    RecordingClient for the async gateway (streams are not supported).
+    """
+
+    def __init__(self, client, store):
+        super().__init__(client, store)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: self._arecord('chat', client.chat.completions.create, kwargs)
+        ))
+        self.embeddings = SimpleNamespace(create=lambda **kwargs: self._arecord('embeddings', client.embeddings.create, kwargs))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(
+            create=lambda **kwargs: self._arecord('transcription', client.audio.transcriptions.create, kwargs)
+        ))
+
+    async def _arecord(self, kind, create, kwargs):
+        fingerprint = request_fingerprint(kind, kwargs)
+        started = time.monotonic()
+        response = await create(**kwargs)
+        self.store.save(fingerprint, response.model_dump(), time.monotonic() - started)
+        return response
+
+def wrap_client(build_client, asynchronous=False):
+    """
+    The gateway client for LLM_PROVIDER: 'openai' (live), 'record' or 'replay'.
+
+    Args:
+        build_client: Callable returning the live OpenAI or AsyncOpenAI
+            client (not called when replaying)
+        asynchronous: Whether this is the async client
+    """
+    provider = getattr(settings, 'LLM_PROVIDER', 'openai')
+    if provider == 'openai':
+        return build_client()
+
+    directory, strict, _ = get_fixture_settings()
+    store = FixtureStore(directory)
+    if provider == 'replay':
+        latency = LatencyModel.from_settings()
+        return AsyncReplayClient(store, latency, strict) if asynchronous else ReplayClient(store, latency, strict)
+    if provider == 'record':
+        return AsyncRecordingClient(build_client(), store) if asynchronous else RecordingClient(build_client(), store)
+    raise ValueError(f"Unknown LLM provider: {provider}")
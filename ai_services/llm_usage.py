@@ -0,0 +1,176 @@
+import contextlib
+import contextvars
+import time
+from django.conf import settings
+from .metrics import increment
+
+# Entry point and user that LLM calls are attributed to (set per request / task)
+_call_tags = contextvars.ContextVar('llm_call_tags', default={})
+
+# USD per 1K tokens: model prefix -> (prompt, completion)
+DEFAULT_LLM_PRICING = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo': (0.0015, 0.002),
+    'text-embedding-ada-002': (0.0001, 0.0),
+}
+
+def get_call_tags():
+    return _call_tags.get()
+
+def set_call_tags(endpoint=None, user=None):
+    """
+    Attribute the LLM calls that follow in this context to an endpoint and user.
+
+    Returns:
+        A token for reset_call_tags
+    """
+    user_id = user.id if user is not None and getattr(user, 'is_authenticated', False) else None
+    return _call_tags.set({'endpoint': endpoint or '', 'user_id': user_id})
+
+def reset_call_tags(token):
+    _call_tags.reset(token)
+
+@contextlib.contextmanager
+def llm_call_tags(endpoint=None, user=None):
+    """
+    Context manager version of set_call_tags.
+    """
+    token = set_call_tags(endpoint, user)
+    try:
+        yield
+    finally:
+        reset_call_tags(token)
+
+@contextlib.contextmanager
+def llm_route_tags(route, reason):
+    """
+    Tag the LLM calls made inside with a routing decision (see model_routing).
+    """
+    token = _call_tags.set({**get_call_tags(), 'route': route, 'route_reason': reason})
+    try:
+        yield
+    finally:
+        reset_call_tags(token)
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Estimated cost of a call in USD, or None for models without a price
+    (the longest matching prefix in LLM_PRICING wins).
+    """
+    pricing = getattr(settings, 'LLM_PRICING', DEFAULT_LLM_PRICING)
+    matches = [prefix for prefix in pricing if model.startswith(prefix)]
+    if not matches or prompt_tokens is None:
+        return None
+    prompt_price, completion_price = pricing[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + (completion_tokens or 0) * completion_price) / 1000
+
+def usage_tokens(result):
+    """
+    (prompt_tokens, completion_tokens) reported by a provider response.
+    """
+    usage = getattr(result, 'usage', None)
+    if usage is None:
+        return None, None
+    return getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None)
+
+def record_llm_call(operation, model, started, retries, outcome, prompt_tokens=None, completion_tokens=None, error=None, tags=None):
+    """
+    Record one provider call as counters and an LLMCallLog row.
+
+    Counters (per endpoint): llm.calls.<endpoint>.<outcome>, and for
+    completed calls llm.latency_ms.<endpoint>, llm.tokens.<endpoint>.prompt,
+    llm.tokens.<endpoint>.completion and llm.cost_microusd.<endpoint>.
+    Routed calls also count llm.route_calls, llm.route_latency_ms and
+    llm.route_cost_microusd per <route>.<model>. Never raises.
+
+    Args:
+        operation: 'chat', 'embeddings' or 'transcription'
+        model: Model name
+        started: time.monotonic() when the call started
+        retries: Retries made
+        outcome: 'success', 'error', 'rejected' (circuit open) or
+            'cancelled' (stream closed early)
+        prompt_tokens: Prompt tokens used, if known
+        completion_tokens: Completion tokens used, if known
+        error: The exception for failed calls
+        tags: Call tags captured when the call started (defaults to the current ones)
+    """
+    from .models import LLMCallLog
+
+    latency_ms = int((time.monotonic() - started) * 1000)
+    tags = tags if tags is not None else get_call_tags()
+    endpoint = tags.get('endpoint') or 'other'
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+
+    increment(f"llm.calls.{endpoint}.{outcome}")
+    if outcome != 'rejected':
+        increment(f"llm.latency_ms.{endpoint}", latency_ms)
+    if prompt_tokens:
+        increment(f"llm.tokens.{endpoint}.prompt", prompt_tokens)
+    if completion_tokens:
+        increment(f"llm.tokens.{endpoint}.completion", completion_tokens)
+    if cost:
+        increment(f"llm.cost_microusd.{endpoint}", int(cost * 1000000))
+    if tags.get('route'):
+        route_model = f"{tags['route']}.{model}"
+        increment(f"llm.route_calls.{route_model}.{outcome}")
+        if outcome != 'rejected':
+            increment(f"llm.route_latency_ms.{route_model}", latency_ms)
+        if cost:
+            increment(f"llm.route_cost_microusd.{route_model}", int(cost * 1000000))
+
+    if not getattr(settings, 'LLM_CALL_LOG_ENABLED', True):
+        return
+    try:
+        LLMCallLog.objects.create(
+            endpoint=endpoint,
+            user_id=tags.get('user_id'),
+            route=tags.get('route', ''),
+            route_reason=tags.get('route_reason', ''),
+            operation=operation,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            latency_ms=latency_ms,
+            retries=retries,
+            outcome=outcome,
+            error=str(error)[:500] if error is not None else '',
+            cost=cost,
+        )
+    except Exception as e:
+        print(f"Error recording LLM call: {str(e)}")
+
+def summarize_llm_usage(since, group_by=('endpoint', 'route', 'model')):
+    """
+    Aggregate LLMCallLog rows for reporting.
+
+    Args:
+        since: Only include calls made at or after this datetime
+        group_by: LLMCallLog fields to group by
+
+    Returns:
+        list: One dict per group with calls, errors, rejected, cancelled,
+            total_retries, avg/max latency, total prompt/completion tokens
+            and total_cost, costliest first
+    """
+    from django.db.models import Avg, Count, F, Max, Q, Sum
+    from .models import LLMCallLog
+
+    rows = (
+        LLMCallLog.objects.filter(created_at__gte=since)
+        .values(*group_by)
+        .annotate(
+            calls=Count('id'),
+            errors=Count('id', filter=Q(outcome='error')),
+            rejected=Count('id', filter=Q(outcome='rejected')),
+            cancelled=Count('id', filter=Q(outcome='cancelled')),
+            total_retries=Sum('retries'),
+            avg_latency_ms=Avg('latency_ms', filter=~Q(outcome='rejected')),
+            max_latency_ms=Max('latency_ms'),
+            total_prompt_tokens=Sum('prompt_tokens'),
+            total_completion_tokens=Sum('completion_tokens'),
+            total_cost=Sum('cost'),
+        )
+        .order_by(F('total_cost').desc(nulls_last=True), '-calls')
+    )
+    return list(rows)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+import numpy as np
+
+# Sync (DRF) and async paths of each LLM-bound endpoint, relative to /api/v1/ai/
+LOAD_TEST_ENDPOINTS = {
+    'send_message': ('POST', 'chat/{session}/send_message/', {'content': "Explain recursion in one paragraph."}),
+    'grade_essay': ('POST', 'recommendations/grade_essay/', {
+        'essay_text': "Photosynthesis converts light energy into chemical energy stored in glucose.",
+        'max_score': 10,
+    }),
+    'personalized_feedback': ('GET', 'assessment/personalized_feedback/', None),
+    'study_plan': ('POST', 'assessment/study_plan/', {}),
+    'voice_command': ('POST', 'voice/command/', {'text': "What is a binary search tree?"}),
+}
+
+def endpoint_url(base_url, endpoint, asynchronous, session=None):
+    method, path, payload = LOAD_TEST_ENDPOINTS[endpoint]
+    prefix = 'async/' if asynchronous else ''
+    return method, f"{base_url.rstrip('/')}/api/v1/ai/{prefix}{path.format(session=session)}", payload
+
+async def _run(method, url, payload, token, requests, concurrency, timeout):
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(
+        headers={'Authorization': f"Bearer {token}"},
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=concurrency),
+    ) as client:
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=payload)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        'url': url,
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': errors,
+        'elapsed_s': elapsed,
+        'throughput_rps': requests / elapsed if elapsed else 0.0,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+    }
+
+def run_load_test(base_url, token, endpoint='grade_essay', modes=('sync', 'async'), requests=50,
+                  concurrency=10, session=None, timeout=120):
+    """
+    Fire concurrent requests at the sync and async versions of an endpoint
+    on a running server and compare throughput and latency.
+
+    The gain shows when the server runs under ASGI with few workers: sync
+    views hold a thread for each model call, async views do not. To test
+    without OpenAI, run the server with LLM_PROVIDER=replay and
+    LLM_REPLAY_LATENCY=synthetic (see ai_services.llm_fixtures).
+
+    Args:
+        base_url: Server root, e.g. http://localhost:8000
+        token: JWT access token of the user to call as
+        endpoint: One of LOAD_TEST_ENDPOINTS
+        modes: Which versions to test ('sync', 'async')
+        requests: Requests per mode
+        concurrency: Requests in flight at once
+        session: Chat session ID (send_message only)
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        dict: One result per mode, plus the async/sync throughput ratio when
+            both ran
+    """
+    results = {}
+    for mode in modes:
+        method, url, payload = endpoint_url(base_url, endpoint, mode == 'async', session)
+        results[mode] = asyncio.run(_run(method, url, payload, token, requests, concurrency, timeout))
+
+    report = {'endpoint': endpoint, 'results': results}
+    if 'sync' in results and 'async' in results and results['sync']['throughput_rps']:
+        report['throughput_gain'] = results['async']['throughput_rps'] / results['sync']['throughput_rps']
+    return report
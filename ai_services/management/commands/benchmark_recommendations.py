@@ -0,0 +1,57 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from courses.models import Course
+from ai_services.benchmark import run_benchmark
+from ai_services.embedding_providers import active_embedding_model
+
+class Command(BaseCommand):
+    help = "Benchmark course recommendations on synthetic catalogs and print a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help="Comma-separated catalog sizes")
+        parser.add_argument('--users', type=int, default=200, help="Synthetic users queried per catalog")
+        parser.add_argument('--count', type=int, default=10, help="K for recommendations and precision/recall@K")
+        parser.add_argument('--dimensions', type=int, default=64)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--snapshot', action='store_true', help="Serve from a memory-mapped snapshot")
+        parser.add_argument('--output', help="Write the report to this file instead of stdout")
+        parser.add_argument('--allow-existing-data', action='store_true', help="Run even if the database has courses")
+
+    def handle(self, *args, **options):
+        if Course.objects.exists() and not options['allow_existing_data']:
+            raise CommandError("The database has courses; run against an empty database or pass --allow-existing-data")
+
+        runs = []
+        for size in [int(s) for s in options['sizes'].split(',') if s]:
+            self.stderr.write(f"Benchmarking {size} courses...")
+            runs.append(run_benchmark(
+                size,
+                users=options['users'],
+                count=options['count'],
+                dimensions=options['dimensions'],
+                seed=options['seed'],
+                snapshot=options['snapshot'],
+            ))
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'embedding_model': active_embedding_model(),
+            'settings': {
+                name: getattr(settings, name, None)
+                for name in (
+                    'RECOMMENDER_ANN_BACKEND', 'RECOMMENDER_ANN_MIN_COURSES', 'RECOMMENDER_ANN_PROBES',
+                    'RECOMMENDER_COMPACT_SCORING', 'RECOMMENDER_PCA_COMPONENTS', 'RECOMMENDER_QUANTIZE',
+                    'RECOMMENDER_COMPACT_RERANK', 'RECOMMENDER_COLLAB_WEIGHT', 'RECOMMENDATION_CACHE_DEPTH',
+                )
+            },
+            'runs': runs,
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,37 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from ai_services.ann import ANN_BACKENDS, build_ann_index, evaluate_ann, sample_queries
+
+class Command(BaseCommand):
+    help = "Build the approximate nearest-neighbour index over the course snapshot and report recall vs latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', choices=sorted(ANN_BACKENDS), default='ivf')
+        parser.add_argument('--clusters', type=int, help="IVF cluster count (default sqrt(N))")
+        parser.add_argument('--bits', type=int, help="LSH hyperplanes per code")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--report', action='store_true', help="Evaluate against exact search after building")
+        parser.add_argument('--queries', type=int, default=200, help="Number of query vectors for the report")
+        parser.add_argument('--count', type=int, default=10, help="K for recall@K")
+        parser.add_argument('--probes', default='1,2,4,8,16,32', help="Comma-separated probe counts to evaluate")
+
+    def handle(self, *args, **options):
+        build_options = {'seed': options['seed']}
+        if options['backend'] == 'ivf' and options['clusters']:
+            build_options['n_clusters'] = options['clusters']
+        if options['backend'] == 'lsh' and options['bits']:
+            build_options['n_bits'] = options['bits']
+
+        built = build_ann_index(options['backend'], **build_options)
+        if built is None:
+            raise CommandError("No course embedding snapshot found; run the build_course_embedding_snapshot task first")
+        ann, vectors = built
+        self.stderr.write(f"Built {ann.name} index over {len(vectors)} courses")
+
+        if not options['report']:
+            return
+
+        queries = sample_queries(vectors, options['queries'], options['seed'])
+        probe_values = [int(p) for p in options['probes'].split(',') if p]
+        report = evaluate_ann(vectors, ann, queries, count=options['count'], probe_values=probe_values)
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,41 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from ai_services.ann import sample_queries
+from ai_services.compression import build_compressed_vectors, evaluate_compression
+
+class Command(BaseCommand):
+    help = "Build PCA/int8 compressed course vectors for the snapshot and report top-K overlap with full precision."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--components', type=int, help="PCA components (default RECOMMENDER_PCA_COMPONENTS)")
+        parser.add_argument('--no-quantize', action='store_true', help="Keep reduced vectors as float32")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--report', action='store_true', help="Evaluate against full-precision ranking after building")
+        parser.add_argument('--queries', type=int, default=200, help="Number of query vectors for the report")
+        parser.add_argument('--count', type=int, default=10, help="K for top-K overlap")
+        parser.add_argument('--rerank', default='0,2,4,8', help="Comma-separated rerank multipliers to evaluate")
+
+    def handle(self, *args, **options):
+        build_options = {'seed': options['seed']}
+        if options['components']:
+            build_options['n_components'] = options['components']
+        if options['no_quantize']:
+            build_options['quantize'] = False
+
+        built = build_compressed_vectors(**build_options)
+        if built is None:
+            raise CommandError("No course embedding snapshot with at least two courses; run the build_course_embedding_snapshot task first")
+        compressed, vectors = built
+        self.stderr.write(
+            f"Compressed {len(vectors)} courses to {compressed.components.shape[0]} components "
+            f"({compressed.explained_variance:.1%} of variance)"
+        )
+
+        if not options['report']:
+            return
+
+        queries = sample_queries(vectors, options['queries'], options['seed'])
+        rerank_values = [int(r) for r in options['rerank'].split(',') if r]
+        report = evaluate_compression(vectors, compressed, queries, count=options['count'], rerank_values=rerank_values)
+        report['explained_variance'] = compressed.explained_variance
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from ai_services.collaborative import build_collaborative_neighbors
+from ai_services.course_neighbors import build_content_neighbors
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed course neighbour lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['all', 'collaborative', 'content'], default='all')
+        parser.add_argument('--neighbors', type=int, default=None, help="Neighbours kept per course")
+        parser.add_argument('--min-support', type=int, default=None, help="Minimum co-enrollments per pair")
+        parser.add_argument('--block-size', type=int, default=None, help="Courses per matrix product")
+
+    def handle(self, *args, **options):
+        if options['source'] in ('all', 'collaborative'):
+            written = build_collaborative_neighbors(
+                neighbors=options['neighbors'],
+                min_support=options['min_support'],
+                block_size=options['block_size'],
+            )
+            self.stdout.write(f"Wrote {written} collaborative neighbours")
+
+        if options['source'] in ('all', 'content'):
+            written = build_content_neighbors(neighbors=options['neighbors'], block_size=options['block_size'])
+            self.stdout.write(f"Wrote {written} content neighbours")
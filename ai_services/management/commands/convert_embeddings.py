@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from ai_services.models import UserEmbedding, CourseEmbedding
+from ai_services.services import EMBEDDING_MODEL
+from ai_services.vectors import VECTOR_FORMAT_PICKLE, decode_vector, write_course_snapshot
+
+class Command(BaseCommand):
+    help = "Convert pickled embedding rows to the float32 vector format and write a course snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--skip-snapshot', action='store_true', help="Don't write the course embedding snapshot")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in (CourseEmbedding, UserEmbedding):
+            converted = 0
+            failed = 0
+            last_id = 0
+
+            while True:
+                # Walk by primary key so converted rows never shift the window
+                batch = list(
+                    model.objects.filter(vector_format=VECTOR_FORMAT_PICKLE, id__gt=last_id)
+                    .order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                updated = []
+                for embedding in batch:
+                    try:
+                        vector = decode_vector(embedding.embedding_vector, VECTOR_FORMAT_PICKLE, allow_pickle=True)
+                    except Exception as e:
+                        self.stderr.write(f"Skipping {model.__name__} {embedding.id}: {str(e)}")
+                        failed += 1
+                        continue
+                    # Pickled rows were all written by the OpenAI ada-002 model
+                    embedding.set_vector(vector, EMBEDDING_MODEL)
+                    updated.append(embedding)
+
+                model.objects.bulk_update(updated, ['embedding_vector', 'vector_format', 'dimensions', 'model_name'])
+                converted += len(updated)
+
+            self.stdout.write(f"{model.__name__}: converted {converted} rows, {failed} failed")
+
+        if not options['skip_snapshot']:
+            manifest = write_course_snapshot()
+            self.stdout.write(f"Wrote course snapshot {manifest['generation']} ({manifest['count']} courses)")
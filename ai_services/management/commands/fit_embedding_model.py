@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from ai_services.embedding_providers import (
+    TfidfSvdEmbeddingProvider, get_local_model_path, reset_embedding_providers
+)
+from ai_services.services import build_course_text
+
+class Command(BaseCommand):
+    help = "Fit the local TF-IDF + SVD embedding model on the course corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dimensions', type=int, default=256, help="SVD components")
+        parser.add_argument('--path', default=None, help="Output path (default EMBEDDING_LOCAL_MODEL_PATH)")
+
+    def handle(self, *args, **options):
+        texts = [build_course_text(course) for course in Course.objects.prefetch_related('lessons').iterator(chunk_size=500)]
+        if len(texts) < 2:
+            raise CommandError("At least two courses are needed to fit the model")
+
+        provider = TfidfSvdEmbeddingProvider.fit(texts, options['path'] or get_local_model_path(), options['dimensions'])
+        reset_embedding_providers()
+        self.stdout.write(f"Fitted {provider.name} on {len(texts)} courses")
+        self.stdout.write("Run update_all_course_embeddings to re-embed courses when EMBEDDING_PROVIDER is 'tfidf'")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from ai_services.batch_recommendations import generate_batch_recommendations
+
+class Command(BaseCommand):
+    help = "Precompute course recommendations for all users (e.g. for digest emails)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=None, help="Recommendations per user")
+        parser.add_argument('--user-block-size', type=int, default=None, help="Users scored per block")
+        parser.add_argument('--course-block-size', type=int, default=None, help="Courses scored per matrix multiply")
+
+    def handle(self, *args, **options):
+        stats = generate_batch_recommendations(
+            count=options['count'],
+            user_block_size=options['user_block_size'],
+            course_block_size=options['course_block_size'],
+        )
+        self.stdout.write(f"Wrote {stats['recommendations']} recommendations for {stats['users']} users")
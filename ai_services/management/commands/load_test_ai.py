@@ -0,0 +1,43 @@
+import json
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from ai_services.load_test import LOAD_TEST_ENDPOINTS, run_load_test
+from ai_services.models import ChatSession
+
+class Command(BaseCommand):
+    help = "Load test the sync and async AI endpoints of a running server and print a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help="User to send requests as (a token is minted locally)")
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--endpoint', default='grade_essay', choices=sorted(LOAD_TEST_ENDPOINTS))
+        parser.add_argument('--mode', default='both', choices=['sync', 'async', 'both'])
+        parser.add_argument('--requests', type=int, default=50, help="Requests per mode")
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--timeout', type=float, default=120, help="Per-request timeout in seconds")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['email']}")
+
+        session = None
+        if options['endpoint'] == 'send_message':
+            session, _ = ChatSession.objects.get_or_create(user=user, title="Load test")
+
+        modes = ('sync', 'async') if options['mode'] == 'both' else (options['mode'],)
+        report = run_load_test(
+            options['base_url'],
+            str(RefreshToken.for_user(user).access_token),
+            endpoint=options['endpoint'],
+            modes=modes,
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            session=session.id if session else None,
+            timeout=options['timeout'],
+        )
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+
+METRIC_PREFIX = 'metrics:'
+# Counter names are kept in numbered slots, since the cache cannot list keys
+METRIC_NAME_COUNT_KEY = 'metrics:names:count'
+METRIC_NAME_SLOT_KEY = 'metrics:names:{slot}'
+
+def _register(name):
+    # incr hands every new name its own slot, so concurrent registrations never overwrite each other
+    cache.add(METRIC_NAME_COUNT_KEY, 0, timeout=None)
+    slot = cache.incr(METRIC_NAME_COUNT_KEY)
+    cache.set(METRIC_NAME_SLOT_KEY.format(slot=slot), name, timeout=None)
+
+def increment(name, amount=1):
+    """
+    Increment a shared counter.
+
+    Counters live in the default cache so every web and Celery worker adds to
+    the same value. They are best-effort and never raise.
+
+    Args:
+        name: Dotted counter name, e.g. 'embeddings.course.skipped'
+        amount: Amount to add
+    """
+    key = f"{METRIC_PREFIX}{name}"
+    try:
+        if cache.add(key, amount, timeout=None):
+            # Only the worker that created the counter registers its name
+            _register(name)
+        else:
+            cache.incr(key, amount)
+    except Exception as e:
+        print(f"Error incrementing metric {name}: {str(e)}")
+
+def get_counters(prefix=''):
+    """
+    Read all known counters, optionally limited to a name prefix.
+
+    Returns:
+        dict: Counter name to value
+    """
+    slots = cache.get(METRIC_NAME_COUNT_KEY) or 0
+    registered = cache.get_many([METRIC_NAME_SLOT_KEY.format(slot=slot) for slot in range(1, slots + 1)])
+    names = {name for name in registered.values() if name.startswith(prefix)}
+    values = cache.get_many([f"{METRIC_PREFIX}{name}" for name in names])
+    return {name: values.get(f"{METRIC_PREFIX}{name}", 0) for name in sorted(names)}
@@ -0,0 +1,209 @@
+import json
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+from .chat_context import count_tokens
+from .llm import achat_completion, chat_completion
+from .llm_usage import llm_route_tags
+from .metrics import increment
+
+# Routing policy per call site; see LLM_ROUTES in settings
+DEFAULT_LLM_ROUTES = {
+    'chat': {'short_prompt_tokens': 600, 'max_small_prompt_tokens': 3000, 'slo_ms': 4000},
+    'essay_grading': {'short_prompt_tokens': 800, 'max_small_prompt_tokens': 3000, 'slo_ms': 8000},
+    'feedback': {'short_prompt_tokens': 1500, 'max_small_prompt_tokens': 3000, 'slo_ms': 8000},
+    'study_plan': {'short_prompt_tokens': 1500, 'max_small_prompt_tokens': 3000, 'slo_ms': 10000},
+}
+
+# Weight of the newest call in the per-model latency average
+LATENCY_SMOOTHING = 0.2
+
+# Seconds after which a latency average is ignored, so a model routed
+# around for being slow gets tried again
+LATENCY_STALE_SECONDS = 300
+
+RouteDecision = namedtuple('RouteDecision', ['task', 'model', 'reason', 'prompt_tokens'])
+
+class ValidationError(ValueError):
+    """
+    A model's output did not have the structure the call site needs.
+    """
+
+def get_routing_settings():
+    return (
+        getattr(settings, 'LLM_ROUTING_ENABLED', True),
+        getattr(settings, 'LLM_SMALL_MODEL', 'gpt-3.5-turbo'),
+        getattr(settings, 'LLM_LARGE_MODEL', 'gpt-4'),
+        getattr(settings, 'LLM_ROUTES', DEFAULT_LLM_ROUTES),
+    )
+
+_lock = threading.Lock()
+_latency_ms = {}
+
+def observe_latency(task, model, latency_ms):
+    """
+    Fold a call's wall time into the moving average for (task, model).
+    """
+    now = time.monotonic()
+    with _lock:
+        previous = expected_latency(task, model, now)
+        _latency_ms[(task, model)] = (latency_ms if previous is None else (
+            LATENCY_SMOOTHING * latency_ms + (1 - LATENCY_SMOOTHING) * previous
+        ), now)
+
+def expected_latency(task, model, now=None):
+    """
+    Recent average latency of (task, model) in this process, or None if
+    unseen for LATENCY_STALE_SECONDS.
+    """
+    average, updated_at = _latency_ms.get((task, model), (None, None))
+    if average is None or (now or time.monotonic()) - updated_at > LATENCY_STALE_SECONDS:
+        return None
+    return average
+
+def choose_model(task, messages):
+    """
+    Pick the model for a call.
+
+    Short prompts go to the small model. Longer ones go to the large model,
+    unless its recent latency for this task breaks the route's SLO and the
+    prompt still fits the small model. Prompts too long for the small model
+    always go to the large one.
+
+    Args:
+        task: Route name (a key of LLM_ROUTES)
+        messages: Chat messages of the call
+
+    Returns:
+        RouteDecision: (task, model, reason, prompt_tokens)
+    """
+    enabled, small_model, large_model, routes = get_routing_settings()
+    prompt_tokens = sum(count_tokens(message.get('content') or '') for message in messages)
+    route = routes.get(task)
+
+    if not enabled or route is None:
+        return RouteDecision(task, large_model, 'default', prompt_tokens)
+    if prompt_tokens <= route['short_prompt_tokens']:
+        return RouteDecision(task, small_model, 'short_prompt', prompt_tokens)
+    if prompt_tokens > route['max_small_prompt_tokens']:
+        return RouteDecision(task, large_model, 'long_prompt', prompt_tokens)
+
+    large_latency = expected_latency(task, large_model)
+    if large_latency is not None and large_latency > route['slo_ms']:
+        return RouteDecision(task, small_model, 'latency_slo', prompt_tokens)
+    return RouteDecision(task, large_model, 'default', prompt_tokens)
+
+def _record_route(decision, reason, started):
+    observe_latency(decision.task, decision.model, (time.monotonic() - started) * 1000)
+    increment(f"llm.route.{decision.task}.{reason}")
+
+def escalation_reason(decision, response, validate):
+    """
+    Why an answer should be retried on the large model, or None if it is usable.
+    """
+    _, _, large_model, _ = get_routing_settings()
+    if decision.model == large_model:
+        return None
+
+    choice = response.choices[0]
+    if choice.finish_reason == 'length':
+        return "Response cut off at max_tokens"
+    if validate is not None:
+        try:
+            validate(choice.message.content)
+        except Exception as e:
+            return str(e) or type(e).__name__
+    return None
+
+def routed_completion(task, messages, validate=None, **kwargs):
+    """
+    Create a chat completion on the model the routing policy picks.
+
+    An answer from the small model is escalated to the large model when it
+    was cut off at max_tokens or fails `validate`. Every call is recorded
+    with its route and reason (LLMCallLog.route / route_reason and the
+    llm.route.<task>.<reason> counters).
+
+    Args:
+        task: Route name (a key of LLM_ROUTES)
+        messages: Chat messages
+        validate: Optional callable taking the response text; raises if
+            the output is unusable
+        **kwargs: Other chat.completions.create arguments
+
+    Returns:
+        The chat completion
+    """
+    decision = choose_model(task, messages)
+
+    started = time.monotonic()
+    with llm_route_tags(task, decision.reason):
+        response = chat_completion(model=decision.model, messages=messages, **kwargs)
+    _record_route(decision, decision.reason, started)
+
+    reason = escalation_reason(decision, response, validate)
+    if reason is None:
+        return response
+
+    _, _, large_model, _ = get_routing_settings()
+    escalated = decision._replace(model=large_model)
+    started = time.monotonic()
+    with llm_route_tags(task, 'escalated'):
+        response = chat_completion(model=large_model, messages=messages, **kwargs)
+    _record_route(escalated, 'escalated', started)
+    return response
+
+async def arouted_completion(task, messages, validate=None, **kwargs):
+    """
+    Async version of routed_completion.
+    """
+    decision = choose_model(task, messages)
+
+    started = time.monotonic()
+    with llm_route_tags(task, decision.reason):
+        response = await achat_completion(model=decision.model, messages=messages, **kwargs)
+    _record_route(decision, decision.reason, started)
+
+    reason = escalation_reason(decision, response, validate)
+    if reason is None:
+        return response
+
+    _, _, large_model, _ = get_routing_settings()
+    escalated = decision._replace(model=large_model)
+    started = time.monotonic()
+    with llm_route_tags(task, 'escalated'):
+        response = await achat_completion(model=large_model, messages=messages, **kwargs)
+    _record_route(escalated, 'escalated', started)
+    return response
+
+def routed_stream(task, messages, **kwargs):
+    """
+    Open a streamed chat completion on the model the routing policy picks.
+    Streams are shown as they arrive, so they are never escalated.
+    """
+    decision = choose_model(task, messages)
+    increment(f"llm.route.{task}.{decision.reason}")
+    with llm_route_tags(task, decision.reason):
+        return chat_completion(model=decision.model, messages=messages, stream=True, **kwargs)
+
+def validate_json_object(*required_keys):
+    """
+    Validator for JSON-object responses that must contain `required_keys`.
+    """
+    def validate(response_text):
+        data = json.loads(response_text)
+        if not isinstance(data, dict):
+            raise ValidationError("Response is not a JSON object")
+        missing = [key for key in required_keys if key not in data]
+        if missing:
+            raise ValidationError(f"Response is missing {', '.join(missing)}")
+    return validate
+
+def validate_essay_grade(response_text):
+    """
+    Validator for essay grades: whatever services.parse_essay_grade accepts.
+    """
+    from .services import parse_essay_grade
+
+    parse_essay_grade(response_text)
@@ -1,12 +1,17 @@
 from django.db import models
 from django.conf import settings
+from .vectors import VECTOR_FORMAT_PICKLE, CURRENT_VECTOR_FORMAT, encode_vector, decode_vector
 
 class ChatSession(models.Model):
     """
     Stores chat sessions between users and the AI assistant.
     """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_sessions')
+    course = models.ForeignKey('courses.Course', on_delete=models.SET_NULL, null=True, blank=True, related_name='chat_sessions')
     title = models.CharField(max_length=255, blank=True)
+    summary = models.TextField(blank=True)  # Running summary of messages older than the recent window
+    summary_token_count = models.PositiveIntegerField(default=0)
+    summarized_through = models.PositiveIntegerField(null=True, blank=True)  # ID of the newest summarized message
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -29,36 +34,172 @@ class ChatMessage(models.Model):
     session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     content = models.TextField()
+    token_count = models.PositiveIntegerField(null=True, blank=True)  # Counted once, on first save
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Keyset pagination and "latest message" lookups within a session
+            models.Index(fields=['session', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        if self.token_count is None:
+            from .chat_context import count_tokens
+            self.token_count = count_tokens(self.content)
+        super().save(*args, **kwargs)
+
+class StoredEmbedding(models.Model):
+    """
+    Common storage for embedding vectors (see ai_services.vectors for the format).
+    """
+    embedding_vector = models.BinaryField()
+    # Rows written before the format field existed hold pickled arrays
+    vector_format = models.PositiveSmallIntegerField(default=VECTOR_FORMAT_PICKLE)
+    dimensions = models.PositiveIntegerField(default=0)
+    model_name = models.CharField(max_length=100, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)  # Fingerprint of the text the vector was built from
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        abstract = True
+    
+    def get_vector(self):
+        return decode_vector(self.embedding_vector, self.vector_format, self.dimensions or None)
+    
+    def set_vector(self, vector, model_name='', content_hash=''):
+        self.embedding_vector = encode_vector(vector)
+        self.vector_format = CURRENT_VECTOR_FORMAT
+        self.dimensions = len(vector)
+        self.model_name = model_name
+        self.content_hash = content_hash
+    
+    def is_current(self, content_hash):
+        """
+        Whether this vector was built from the given content with the current format.
+        """
+        return self.vector_format == CURRENT_VECTOR_FORMAT and self.content_hash == content_hash
 
-class UserEmbedding(models.Model):
+class UserEmbedding(StoredEmbedding):
     """
     Stores user embeddings for recommendation system.
+    
+    A user vector is either a text embedding of the profile or an
+    incrementally maintained, time-decayed sum of course vectors
+    (see ai_services.user_vectors).
     """
+    SOURCE_CHOICES = [
+        ('text', 'Profile text'),
+        ('incremental', 'Course history'),
+    ]
+    
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='embedding')
-    embedding_vector = models.BinaryField()  # Stored as pickled numpy array
-    updated_at = models.DateTimeField(auto_now=True)
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='text')
+    weight_sum = models.FloatField(default=0.0)  # Decayed total event weight behind an incremental vector
+    decayed_at = models.DateTimeField(null=True, blank=True)  # Time the incremental sum is decayed to
+    
+    def has_current_format(self):
+        return self.vector_format == CURRENT_VECTOR_FORMAT
+    
+    def set_vector(self, vector, model_name='', content_hash=''):
+        super().set_vector(vector, model_name, content_hash)
+        self.source = 'text'
+        self.weight_sum = 0.0
+        self.decayed_at = None
+    
+    def is_incremental(self, dimensions):
+        return (
+            self.source == 'incremental' and self.has_current_format()
+            and self.dimensions == dimensions and self.decayed_at is not None
+        )
+    
+    def set_incremental_vector(self, vector, model_name, weight_sum, decayed_at):
+        self.set_vector(vector, model_name)
+        self.source = 'incremental'
+        self.weight_sum = weight_sum
+        self.decayed_at = decayed_at
     
     def __str__(self):
         return f"Embedding for {self.user.email}"
 
-class CourseEmbedding(models.Model):
+class CourseEmbedding(StoredEmbedding):
     """
     Stores course embeddings for recommendation system.
     """
     course = models.OneToOneField('courses.Course', on_delete=models.CASCADE, related_name='embedding')
-    embedding_vector = models.BinaryField()  # Stored as pickled numpy array
-    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Embedding for {self.course.title}"
 
+class CourseNeighbor(models.Model):
+    """
+    Precomputed top-N similar courses per course, one list per source.
+    """
+    SOURCE_CHOICES = [
+        ('collaborative', 'Collaborative filtering'),
+        ('content', 'Content similarity'),
+    ]
+    
+    course = models.ForeignKey('courses.Course', on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey('courses.Course', on_delete=models.CASCADE, related_name='+')
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['course', 'source', 'rank']
+        unique_together = ('course', 'source', 'rank')
+    
+    def __str__(self):
+        return f"{self.course.title} -> {self.neighbor.title} ({self.source})"
+
+class CoursePopularity(models.Model):
+    """
+    Materialized popularity scores per course, refreshed periodically by
+    ai_services.popularity and used for fallback recommendations.
+    """
+    course = models.OneToOneField('courses.Course', on_delete=models.CASCADE, related_name='popularity')
+    # Copied from the course so each ranking variant is a single index scan
+    category = models.ForeignKey('courses.Category', on_delete=models.CASCADE, related_name='+')
+    level = models.CharField(max_length=20)
+    enrollment_count = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0.0)  # Time-decayed enrollment count
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name_plural = 'course popularity'
+        indexes = [
+            models.Index(fields=['-enrollment_count']),
+            models.Index(fields=['category', '-enrollment_count']),
+            models.Index(fields=['level', '-enrollment_count']),
+            models.Index(fields=['-trending_score']),
+        ]
+    
+    def __str__(self):
+        return f"Popularity of {self.course.title}"
+
+class UserRecommendation(models.Model):
+    """
+    Precomputed course recommendations for a user, written by the batch
+    engine in ai_services.batch_recommendations (e.g. for digest emails).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='course_recommendations')
+    course = models.ForeignKey('courses.Course', on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    generated_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['user', 'rank']
+        unique_together = ('user', 'rank')
+    
+    def __str__(self):
+        return f"Recommendation {self.rank} for {self.user.email}: {self.course.title}"
+
 class AIFeedback(models.Model):
     """
     Stores AI-generated feedback on user submissions.
@@ -76,3 +217,41 @@ class AIFeedback(models.Model):
     def __str__(self):
         return f"AI Feedback for {self.user.email} - {self.content_type} {self.content_id}"
 
+
+class LLMCallLog(models.Model):
+    """
+    One call to the LLM provider, for latency, usage and cost reporting
+    (written by ai_services.llm_usage).
+    """
+    OUTCOME_CHOICES = [
+        ('success', 'Success'),
+        ('error', 'Error'),
+        ('rejected', 'Rejected (circuit open)'),
+        ('cancelled', 'Cancelled (stream closed early)'),
+    ]
+    
+    endpoint = models.CharField(max_length=100)  # e.g. 'chat.send_message', 'task:...'
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    operation = models.CharField(max_length=20)  # 'chat', 'embeddings' or 'transcription'
+    model = models.CharField(max_length=100)
+    route = models.CharField(max_length=50, blank=True)  # Routing policy that picked the model, e.g. 'essay_grading'
+    route_reason = models.CharField(max_length=20, blank=True)  # e.g. 'short_prompt', 'latency_slo', 'escalated'
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField()  # Wall time including retries
+    retries = models.PositiveSmallIntegerField(default=0)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES)
+    error = models.CharField(max_length=500, blank=True)
+    cost = models.FloatField(null=True, blank=True)  # Estimated USD
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['endpoint', 'created_at']),
+            models.Index(fields=['route', 'created_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.operation} call to {self.model} from {self.endpoint} ({self.outcome})"
@@ -0,0 +1,83 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination over chat messages, newest first.
+
+    The cursor is the (created_at, id) of the last message on the page, so
+    each page is a range scan on the (session, created_at, id) index no
+    matter how deep into the history it is, and messages written while a
+    client pages back never shift pages.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 50
+    max_page_size = 200
+    invalid_cursor_message = 'Invalid cursor'
+
+    def encode_cursor(self, message):
+        position = f"{message.created_at.isoformat()}|{message.id}"
+        return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, message_id = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8').split('|')
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError(encoded)
+            return created_at, int(message_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-created_at', '-id')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            created_at, message_id = cursor
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id))
+
+        # One extra row tells whether there is an older page
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
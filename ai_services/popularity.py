@@ -0,0 +1,111 @@
+import numpy as np
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models import CoursePopularity
+
+RANKING_ORDER = {
+    'popular': '-enrollment_count',
+    'trending': '-trending_score',
+}
+
+def refresh_course_popularity():
+    """
+    Recompute enrollment counts and trending scores for every course.
+
+    The trending score sums each enrollment's weight, halved every
+    POPULARITY_TRENDING_HALF_LIFE_DAYS; enrollments older than ten
+    half-lives contribute under 0.1% and are not read.
+
+    Returns:
+        int: Number of courses written
+    """
+    from courses.models import Course, Enrollment
+
+    now = timezone.now()
+    half_life = getattr(settings, 'POPULARITY_TRENDING_HALF_LIFE_DAYS', 7) * 86400
+
+    counts = dict(
+        Enrollment.objects.values('course_id').annotate(total=Count('id')).values_list('course_id', 'total')
+    )
+
+    recent = Enrollment.objects.filter(
+        enrolled_at__gte=now - timedelta(seconds=10 * half_life)
+    ).values_list('course_id', 'enrolled_at')
+    trending = {}
+    for course_id, enrolled_at in recent.iterator(chunk_size=5000):
+        age = max((now - enrolled_at).total_seconds(), 0)
+        trending[course_id] = trending.get(course_id, 0.0) + float(np.exp2(-age / half_life))
+
+    rows = [
+        CoursePopularity(
+            course_id=course_id,
+            category_id=category_id,
+            level=level,
+            enrollment_count=counts.get(course_id, 0),
+            trending_score=trending.get(course_id, 0.0),
+            updated_at=now,
+        )
+        for course_id, category_id, level in Course.objects.values_list('id', 'category_id', 'level').iterator()
+    ]
+    CoursePopularity.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['course'],
+        update_fields=['category', 'level', 'enrollment_count', 'trending_score', 'updated_at'],
+    )
+    return len(rows)
+
+def get_popular_courses(count, exclude_ids=None, category_id=None, level=None, ranking='popular'):
+    """
+    Read the top of a materialized popularity ranking.
+
+    Each variant is served by an index on the popularity table, so the cost
+    depends on `count`, not on the catalog size. Until the first
+    refresh_course_popularity run fills the table, the ranking is computed
+    live from enrollments instead.
+
+    Args:
+        count: Number of courses to return
+        exclude_ids: Optional iterable of course IDs to leave out
+        category_id: Restrict to one category
+        level: Restrict to one course level
+        ranking: 'popular' (all-time enrollments) or 'trending' (time-decayed)
+
+    Returns:
+        list: Course objects, most popular first
+    """
+    if not CoursePopularity.objects.exists():
+        return _live_popular_courses(count, exclude_ids, category_id, level, ranking)
+
+    popularity = CoursePopularity.objects.select_related('course')
+    if category_id is not None:
+        popularity = popularity.filter(category_id=category_id)
+    if level is not None:
+        popularity = popularity.filter(level=level)
+    if exclude_ids:
+        popularity = popularity.exclude(course_id__in=exclude_ids)
+
+    return [entry.course for entry in popularity.order_by(RANKING_ORDER[ranking])[:count]]
+
+def _live_popular_courses(count, exclude_ids, category_id, level, ranking):
+    from courses.models import Course
+
+    # Trending counts the enrollments of the last half-life instead of decaying them
+    enrollments = Q()
+    if ranking == 'trending':
+        half_life = getattr(settings, 'POPULARITY_TRENDING_HALF_LIFE_DAYS', 7)
+        enrollments = Q(enrollments__enrolled_at__gte=timezone.now() - timedelta(days=half_life))
+
+    courses = Course.objects.all()
+    if category_id is not None:
+        courses = courses.filter(category_id=category_id)
+    if level is not None:
+        courses = courses.filter(level=level)
+    if exclude_ids:
+        courses = courses.exclude(id__in=exclude_ids)
+
+    courses = courses.annotate(score=Count('enrollments', filter=enrollments))
+    return list(courses.order_by('-score', 'id')[:count])
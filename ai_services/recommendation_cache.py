@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import increment
+
+RANKING_KEY = 'recs:ranking:{user_id}'
+INDEX_GENERATION_KEY = 'recs:index-generation'
+
+def embedding_version(user_embedding):
+    """
+    Version stamp of a user's embedding; changes whenever the row is saved.
+    """
+    return user_embedding.updated_at.isoformat()
+
+def index_generation():
+    """
+    Current generation of the course index, bumped on every rebuild.
+    """
+    generation = cache.get(INDEX_GENERATION_KEY)
+    if generation is None:
+        cache.add(INDEX_GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(INDEX_GENERATION_KEY, 1)
+    return generation
+
+def bump_index_generation():
+    """
+    Invalidate every cached ranking after the course index is rebuilt.
+    """
+    try:
+        cache.incr(INDEX_GENERATION_KEY)
+    except ValueError:
+        cache.add(INDEX_GENERATION_KEY, 1, timeout=None)
+
+def get_cached_ranking(user_id, version):
+    """
+    Look up a user's cached ranking.
+
+    Args:
+        user_id: The user ID
+        version: The user's current embedding version
+
+    Returns:
+        tuple: (ranking, enrolled course IDs) or None on a miss. The ranking
+            is a list of (course_id, score) pairs, enrolled courses included.
+    """
+    entry = cache.get(RANKING_KEY.format(user_id=user_id))
+    if entry is None or entry['embedding_version'] != version or entry['index_generation'] != index_generation():
+        increment('recommendations.cache.miss')
+        return None
+
+    increment('recommendations.cache.hit')
+    return [tuple(item) for item in entry['ranking']], set(entry['enrolled'])
+
+def set_cached_ranking(user_id, version, generation, ranking, enrolled_ids):
+    """
+    Store a user's ranking for the given embedding version and index generation.
+    """
+    entry = {
+        'embedding_version': version,
+        'index_generation': generation,
+        'ranking': ranking,
+        'enrolled': list(enrolled_ids),
+    }
+    cache.set(RANKING_KEY.format(user_id=user_id), entry, timeout=getattr(settings, 'RECOMMENDATION_CACHE_TTL', 3600))
+
+def invalidate_user_recommendations(user_id):
+    """
+    Drop a user's cached ranking, e.g. after their enrollments change.
+    """
+    cache.delete(RANKING_KEY.format(user_id=user_id))
@@ -0,0 +1,26 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+def sse_event(data, event=None):
+    """
+    Format one Server-Sent Event with a JSON payload.
+    """
+    lines = f"event: {event}\n" if event else ''
+    return f"{lines}data: {json.dumps(data)}\n\n"
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets `Accept: text/event-stream` requests through content negotiation.
+
+    Streaming views return a StreamingHttpResponse directly; this renderer
+    only renders regular responses (e.g. validation errors) as a single
+    `error` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return sse_event(data, 'error').encode(self.charset)
@@ -0,0 +1,170 @@
+import hashlib
+import time
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from .embedding_index import normalize
+from .embedding_providers import embed_with_fallback
+from .metrics import increment
+
+RESPONSE_CACHE_KEY = 'chat:answers:{scope}'
+
+def get_response_cache_settings():
+    return (
+        getattr(settings, 'RESPONSE_CACHE_ENABLED', True),
+        getattr(settings, 'RESPONSE_CACHE_THRESHOLD', 0.95),
+        getattr(settings, 'RESPONSE_CACHE_TTL', 24 * 60 * 60),
+        getattr(settings, 'RESPONSE_CACHE_MAX_ENTRIES', 256),
+    )
+
+def normalize_question(text):
+    """
+    Lowercase and collapse whitespace so trivially different phrasings embed alike.
+    """
+    return ' '.join(text.lower().split())
+
+def response_cache_scope(user, course_id, model_name):
+    """
+    Answers are only shared between questions about the same course, from
+    users with the same learning style, embedded in the same vector space.
+    """
+    scope = f"{course_id or 'general'}|{user.learning_style or 'any'}|{model_name}"
+    return hashlib.md5(scope.encode('utf-8')).hexdigest()
+
+def is_standalone_question(context_messages):
+    """
+    Whether a question can be answered from the cache: only the first
+    question of a session, since follow-ups depend on earlier replies.
+    """
+    return not context_messages.filter(role='assistant').exists()
+
+def _similarity_bucket(similarity):
+    # Counters of nearest-neighbour similarity, 0.05 wide, for tuning the threshold
+    return f"{np.floor(max(similarity, 0.0) * 20) / 20:.2f}"
+
+def _live(entry, now, ttl):
+    return np.array(entry['created'], dtype=np.float64) > now - ttl
+
+def check_response_cache(question, context_messages, user, course_id=None, use_cache=True):
+    """
+    Look up a cached answer when the cache applies to this request.
+
+    Args:
+        question: The user's message
+        context_messages: Messages in the session so far
+        user: The user object
+        course_id: Optional course the conversation is about
+        use_cache: False to bypass the cache for this request
+
+    Returns:
+        tuple: (answer, probe) as from lookup_cached_response, or
+            (None, None) when the cache does not apply
+    """
+    if not get_response_cache_settings()[0]:
+        return None, None
+    if not use_cache:
+        increment('chat.cache.bypass')
+        return None, None
+    if not is_standalone_question(context_messages):
+        return None, None
+    return lookup_cached_response(question, user, course_id)
+
+def lookup_cached_response(question, user, course_id=None):
+    """
+    Find a cached answer to a semantically equivalent question.
+
+    The question is embedded and compared by cosine similarity with the
+    questions previously answered in the same scope; the best match above
+    RESPONSE_CACHE_THRESHOLD is returned and marked as recently used.
+
+    Args:
+        question: The user's message
+        user: The user object
+        course_id: Optional course the conversation is about
+
+    Returns:
+        tuple: (answer, probe). The answer is None on a miss; pass the probe
+            to store_cached_response once the answer is generated. The
+            probe is None when the question could not be embedded.
+    """
+    _, threshold, ttl, _ = get_response_cache_settings()
+
+    embedded = embed_with_fallback([normalize_question(question)])[0]
+    if embedded is None:
+        increment('chat.cache.miss')
+        return None, None
+
+    vector, model_name = embedded
+    probe = (response_cache_scope(user, course_id, model_name), normalize(vector))
+    key = RESPONSE_CACHE_KEY.format(scope=probe[0])
+
+    try:
+        entry = cache.get(key)
+    except Exception as e:
+        print(f"Error reading response cache: {str(e)}")
+        entry = None
+
+    if entry is not None and len(entry['answers']) and entry['vectors'].shape[1] == probe[1].shape[0]:
+        now = time.time()
+        scores = entry['vectors'].astype(np.float32) @ probe[1]
+        scores[~_live(entry, now, ttl)] = -np.inf
+        best = int(np.argmax(scores))
+        if np.isfinite(scores[best]):
+            increment(f"chat.cache.similarity.{_similarity_bucket(scores[best])}")
+            if scores[best] >= threshold:
+                entry['used'][best] = now
+                try:
+                    cache.set(key, entry, timeout=ttl)
+                except Exception as e:
+                    print(f"Error updating response cache: {str(e)}")
+                increment('chat.cache.hit')
+                return entry['answers'][best], probe
+
+    increment('chat.cache.miss')
+    return None, probe
+
+def store_cached_response(probe, answer):
+    """
+    Cache an answer for the question a lookup missed on.
+
+    Expired entries are dropped first; when the scope is full, the least
+    recently used answer is evicted. Concurrent writers to one scope may
+    overwrite each other's additions, which only costs a future miss.
+
+    Args:
+        probe: The probe returned by lookup_cached_response
+        answer: The generated answer
+    """
+    if probe is None or not answer:
+        return
+
+    _, threshold, ttl, max_entries = get_response_cache_settings()
+    scope, vector = probe
+    key = RESPONSE_CACHE_KEY.format(scope=scope)
+    now = time.time()
+
+    try:
+        entry = cache.get(key)
+        if entry is None or entry['vectors'].shape[1] != vector.shape[0]:
+            entry = {'vectors': np.empty((0, vector.shape[0]), dtype=np.float16), 'answers': [], 'created': [], 'used': []}
+
+        keep = _live(entry, now, ttl)
+        if len(entry['answers']) and (entry['vectors'][keep].astype(np.float32) @ vector >= threshold).any():
+            return  # Another request already answered this question
+
+        keep = np.flatnonzero(keep)
+        if len(keep) >= max_entries:
+            used = np.array(entry['used'], dtype=np.float64)[keep]
+            increment('chat.cache.evicted', len(keep) - (max_entries - 1))
+            keep = np.sort(keep[np.argsort(-used)[:max_entries - 1]])
+
+        entry = {
+            'vectors': np.vstack([entry['vectors'][keep], vector.astype(np.float16)[None, :]]),
+            'answers': [entry['answers'][i] for i in keep] + [answer],
+            'created': [entry['created'][i] for i in keep] + [now],
+            'used': [entry['used'][i] for i in keep] + [now],
+        }
+        cache.set(key, entry, timeout=ttl)
+        increment('chat.cache.stored')
+    except Exception as e:
+        print(f"Error writing response cache: {str(e)}")
@@ -18,16 +18,37 @@ class ChatSessionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = ChatSession
-        fields = ('id', 'title', 'created_at', 'updated_at', 'messages')
+        fields = ('id', 'title', 'course', 'created_at', 'updated_at', 'messages')
+        read_only_fields = ('created_at', 'updated_at')
+
+class ChatSessionListSerializer(serializers.ModelSerializer):
+    """
+    Serializer for chat session list view (metadata only).
+    
+    The message fields come from annotations on the queryset (see
+    ChatSessionViewSet.get_queryset); history is paged separately.
+    """
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_preview = serializers.CharField(read_only=True, allow_null=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+    
+    class Meta:
+        model = ChatSession
+        fields = ('id', 'title', 'course', 'created_at', 'updated_at',
+                  'message_count', 'last_message_preview', 'last_activity')
         read_only_fields = ('created_at', 'updated_at')
 
 class ChatMessageCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating new chat messages.
+    
+    `use_cache=false` skips the semantic response cache for this message.
     """
+    use_cache = serializers.BooleanField(default=True, write_only=True)
+    
     class Meta:
         model = ChatMessage
-        fields = ('content',)
+        fields = ('content', 'use_cache')
 
 class AIFeedbackSerializer(serializers.ModelSerializer):
     """
@@ -1,127 +1,284 @@
 import os
-import pickle
+import hashlib
 import numpy as np
 from django.conf import settings
-from openai import OpenAI
-from django.db.models import Count, Avg, Q
+from django.db.models import Avg, Prefetch, Q
+from django.utils import timezone
 from courses.models import Course, Enrollment, LessonProgress, QuizAttempt
 from users.models import LearningActivity
 from .models import UserEmbedding, CourseEmbedding, AIFeedback
+from .embedding_index import course_index
+from .embedding_providers import OPENAI_EMBEDDING_MODEL, active_embedding_model, embed_with_fallback
+from .embedding_queue import schedule_embedding_retry
+from .metrics import increment
+from .user_vectors import UserEmbeddingPending, get_user_embedding, incremental_mode
+from .popularity import get_popular_courses
+from .collaborative import blend_rankings, collaborative_scores
+from .recommendation_cache import (
+    embedding_version, index_generation, get_cached_ranking, set_cached_ranking
+)
+from .response_cache import check_response_cache, store_cached_response
+from .chat_context import count_tokens, fit_history, get_chat_context_settings
+from .model_routing import ValidationError, routed_completion, routed_stream, validate_essay_grade
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+EMBEDDING_MODEL = OPENAI_EMBEDDING_MODEL  # Model of legacy pickled vectors
+EMBEDDING_MAX_INPUT_TOKENS = 8191
 
-def get_ai_response(message, context_messages, user):
+AI_RESPONSE_FALLBACK = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+ESSAY_GRADING_FALLBACK = "Error processing essay. Please try again later."
+
+def build_chat_messages(message, context_messages, user, session=None, personal=True):
     """
-    Get a response from the AI assistant.
+    Build the OpenAI chat messages for an assistant reply.
+    
+    The prompt fits CHAT_CONTEXT_TOKEN_BUDGET: the system prompt (with the
+    session's running summary) and the new message always go in, and the
+    most recent unsummarized messages fill the rest.
     
     Args:
         message: The user's message
         context_messages: Previous messages in the conversation
         user: The user object
+        session: Optional ChatSession whose summary replaces older messages
+        personal: False to leave the user's name and interests out of the
+            prompt, for answers that go into the shared response cache
         
     Returns:
-        str: The AI assistant's response
+        list: Chat messages, system prompt first
     """
     # Format context messages for OpenAI
     formatted_messages = []
     
-    # Add system message with context about the user
+    # Add system message with context about the user. Shared answers only
+    # get the learning style, which is part of the response cache scope.
+    if personal:
+        user_information = f"""
+    - Name: {user.first_name} {user.last_name}
+    - Learning interests: {', '.join(user.interests) if user.interests else 'Not specified'}"""
+    else:
+        user_information = ""
     system_message = f"""
     You are an AI learning assistant for the EduLearn platform. 
     Your goal is to help users learn and understand course materials.
     
-    User information:
-    - Name: {user.first_name} {user.last_name}
-    - Learning interests: {', '.join(user.interests) if user.interests else 'Not specified'}
+    User information:{user_information}
     - Learning style: {user.learning_style if user.learning_style else 'Not specified'}
     
     Respond in a helpful, educational manner. If asked about course content you're not familiar with,
     suggest the user check the course materials or contact their instructor.
     """
+    summarized_through = None
+    if session is not None and session.summary:
+        system_message += f"\nSummary of the conversation so far:\n{session.summary}\n"
+        summarized_through = session.summarized_through
     formatted_messages.append({"role": "system", "content": system_message})
     
-    # Add conversation history (up to last 10 messages)
-    for msg in context_messages.order_by('-created_at')[:10][::-1]:
-        formatted_messages.append({"role": msg.role, "content": msg.content})
+    # Add as much recent conversation history as the token budget allows
+    budget = get_chat_context_settings()[0] - count_tokens(system_message) - count_tokens(message)
+    formatted_messages.extend(fit_history(context_messages, message, budget, summarized_through))
     
     # Add the current message
     formatted_messages.append({"role": "user", "content": message})
     
+    return formatted_messages
+
+def get_ai_response(message, context_messages, user, session=None, use_cache=True):
+    """
+    Get a response from the AI assistant.
+    
+    The first question of a session may be answered from the semantic
+    response cache (see response_cache.py).
+    
+    Args:
+        message: The user's message
+        context_messages: Previous messages in the conversation
+        user: The user object
+        session: Optional ChatSession (summary and response cache scope)
+        use_cache: False to bypass the response cache
+        
+    Returns:
+        str: The AI assistant's response
+    """
+    course_id = session.course_id if session is not None else None
+    cached, probe = check_response_cache(message, context_messages, user, course_id, use_cache)
+    if cached is not None:
+        return cached
+    
+    # A probe means the answer will be cached for other users
+    formatted_messages = build_chat_messages(message, context_messages, user, session, personal=probe is None)
+    
     try:
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=formatted_messages,
+        response = routed_completion(
+            'chat',
+            formatted_messages,
             max_tokens=1000,
             temperature=0.7,
         )
         
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        store_cached_response(probe, answer)
+        return answer
     
     except Exception as e:
         # Log the error and return a fallback message
         print(f"Error getting AI response: {str(e)}")
-        return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+        return AI_RESPONSE_FALLBACK
+
+def stream_ai_response(message, context_messages, user, session=None, use_cache=True):
+    """
+    Stream a response from the AI assistant as it is generated.
+    
+    Closing the generator early (e.g. when the client disconnects) closes
+    the upstream HTTP response, which cancels the completion. A cached
+    answer is yielded as a single chunk; completed answers are cached.
+    
+    Args:
+        message: The user's message
+        context_messages: Previous messages in the conversation
+        user: The user object
+        session: Optional ChatSession (summary and response cache scope)
+        use_cache: False to bypass the response cache
+        
+    Yields:
+        str: Chunks of the assistant's response
+    """
+    course_id = session.course_id if session is not None else None
+    cached, probe = check_response_cache(message, context_messages, user, course_id, use_cache)
+    if cached is not None:
+        yield cached
+        return
+    
+    stream = routed_stream(
+        'chat',
+        build_chat_messages(message, context_messages, user, session, personal=probe is None),
+        max_tokens=1000,
+        temperature=0.7,
+    )
+    
+    chunks = []
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+    
+    store_cached_response(probe, ''.join(chunks))
 
 def generate_embeddings(text):
     """
-    Generate embeddings for text using OpenAI's embedding model.
+    Generate embeddings for text with the configured embedding provider.
     
     Args:
         text: The text to generate embeddings for
         
     Returns:
-        numpy.ndarray: The embedding vector
+        numpy.ndarray: The embedding vector, or None if every provider failed
     """
-    try:
-        response = client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return np.array(response.data[0].embedding)
+    result = embed_with_fallback([text[:EMBEDDING_MAX_INPUT_TOKENS * 4] or ' '])[0]
+    return result[0] if result is not None else None
+
+def estimate_tokens(text):
+    """
+    Cheaply estimate the token count of a text (about 4 characters per token).
+    """
+    return len(text) // 4 + 1
+
+def generate_embeddings_batch(texts):
+    """
+    Generate embeddings for many texts with as few API requests as possible.
     
-    except Exception as e:
-        print(f"Error generating embeddings: {str(e)}")
-        return np.zeros(1536)  # Default embedding dimension for text-embedding-ada-002
+    Texts are packed into requests of at most EMBEDDING_BATCH_SIZE inputs and
+    EMBEDDING_BATCH_MAX_TOKENS estimated tokens, and each text is truncated to
+    the model's per-input limit.
+    
+    Args:
+        texts: List of texts to generate embeddings for
+        
+    Returns:
+        list: One (vector, model_name) tuple per text, or None where embedding failed
+    """
+    max_inputs = getattr(settings, 'EMBEDDING_BATCH_SIZE', 256)
+    max_tokens = getattr(settings, 'EMBEDDING_BATCH_MAX_TOKENS', 100000)
+    max_chars = EMBEDDING_MAX_INPUT_TOKENS * 4
+    
+    vectors = []
+    chunk = []
+    chunk_tokens = 0
+    for text in texts:
+        text = text[:max_chars] or ' '
+        tokens = estimate_tokens(text)
+        if chunk and (len(chunk) >= max_inputs or chunk_tokens + tokens > max_tokens):
+            vectors.extend(embed_with_fallback(chunk))
+            chunk = []
+            chunk_tokens = 0
+        chunk.append(text)
+        chunk_tokens += tokens
+    
+    if chunk:
+        vectors.extend(embed_with_fallback(chunk))
+    
+    return vectors
 
-def update_user_embedding(user):
+def user_text_prefetches():
     """
-    Update the embedding vector for a user based on their activities.
+    Prefetches that let build_user_text run without queries per user.
+    """
+    return [
+        Prefetch(
+            'learning_activities',
+            queryset=LearningActivity.objects.order_by('-created_at')[:50],
+            to_attr='recent_activities'
+        ),
+        Prefetch(
+            'enrollments',
+            queryset=Enrollment.objects.select_related('course').order_by('-course__created_at'),
+            to_attr='course_enrollments'
+        ),
+    ]
+
+def build_user_text(user):
+    """
+    Build the text a user's embedding is generated from.
     
     Args:
-        user: The user object
+        user: The user object (prefetch `user_text_prefetches()` when building many)
+        
+    Returns:
+        str: The user profile text
     """
     # Collect user data for embedding
     interests = ', '.join(user.interests) if user.interests else ''
     learning_style = user.learning_style if user.learning_style else ''
     
     # Get recent learning activities
-    activities = LearningActivity.objects.filter(user=user).order_by('-created_at')[:50]
+    activities = getattr(user, 'recent_activities', None)
+    if activities is None:
+        activities = LearningActivity.objects.filter(user=user).order_by('-created_at')[:50]
     activity_text = ' '.join([f"{a.activity_type} {a.content_type}" for a in activities])
     
     # Get enrolled courses
-    enrollments = Enrollment.objects.filter(user=user)
-    enrolled_courses = Course.objects.filter(enrollments__in=enrollments)
+    if hasattr(user, 'course_enrollments'):
+        enrolled_courses = [enrollment.course for enrollment in user.course_enrollments]
+    else:
+        enrollments = Enrollment.objects.filter(user=user)
+        enrolled_courses = Course.objects.filter(enrollments__in=enrollments)
     course_text = ' '.join([f"{c.title} {c.description}" for c in enrolled_courses])
     
     # Combine all text
-    user_text = f"Interests: {interests}. Learning style: {learning_style}. Activities: {activity_text}. Courses: {course_text}"
-    
-    # Generate embedding
-    embedding_vector = generate_embeddings(user_text)
-    
-    # Save or update embedding
-    user_embedding, created = UserEmbedding.objects.get_or_create(user=user)
-    user_embedding.embedding_vector = pickle.dumps(embedding_vector)
-    user_embedding.save()
+    return f"Interests: {interests}. Learning style: {learning_style}. Activities: {activity_text}. Courses: {course_text}"
 
-def update_course_embedding(course):
+def build_course_text(course):
     """
-    Update the embedding vector for a course.
+    Build the text a course's embedding is generated from.
     
     Args:
-        course: The course object
+        course: The course object (prefetch `lessons` when building many)
+        
+    Returns:
+        str: The course text
     """
     # Collect course data for embedding
     course_text = f"{course.title}. {course.description}. {course.short_description}. Level: {course.level}."
@@ -131,15 +288,308 @@ def update_course_embedding(course):
     lesson_text = ' '.join([f"{l.title}. {l.description}" for l in lessons])
     
     # Combine all text
-    full_text = f"{course_text} {lesson_text}"
+    return f"{course_text} {lesson_text}"
+
+def content_fingerprint(text, model_name=None):
+    """
+    Fingerprint the exact input an embedding is built from.
+    
+    The model name is part of the fingerprint so switching models
+    regenerates every vector.
+    
+    Args:
+        text: The embedding input text
+        model_name: The model the vector is built with (defaults to the active one)
+        
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    model_name = model_name or active_embedding_model()
+    return hashlib.sha256(f"{model_name}\n{text}".encode('utf-8')).hexdigest()
+
+def _keep_active_vector(kind, owner_id, embedding, model_name):
+    """
+    Handle a vector that came from the fallback provider.
+    
+    A retry is queued for when the primary provider is back. An existing
+    vector from the primary provider is kept rather than replaced, since the
+    fallback's vectors are in another space; it is marked stale so the
+    refresh re-embeds it.
+    
+    Returns:
+        bool: True if the existing vector was kept and the new one should be dropped
+    """
+    active_model = active_embedding_model()
+    if model_name == active_model:
+        return False
+    
+    schedule_embedding_retry(kind, owner_id)
+    if embedding is None or embedding.model_name != active_model:
+        return False
+    
+    type(embedding).objects.filter(pk=embedding.pk).update(content_hash='')
+    increment(f'embeddings.{kind}.kept_stale')
+    return True
+
+def update_user_embedding(user, force=False):
+    """
+    Update the embedding vector for a user based on their activities.
+    
+    Args:
+        user: The user object
+        force: Regenerate even if the profile text is unchanged
+        
+    Returns:
+        bool: True if the embedding was regenerated, False if skipped
+    """
+    user_embedding = UserEmbedding.objects.filter(user=user).first()
+    
+    # In incremental mode the text embedding only seeds users without course history
+    if not force and incremental_mode() and user_embedding is not None and user_embedding.source == 'incremental':
+        increment('embeddings.user.skipped')
+        return False
+    
+    user_text = build_user_text(user)
+    content_hash = content_fingerprint(user_text)
+    
+    # Skip the API call when nothing that feeds the embedding has changed
+    if not force and user_embedding is not None and user_embedding.is_current(content_hash):
+        increment('embeddings.user.skipped')
+        return False
     
     # Generate embedding
-    embedding_vector = generate_embeddings(full_text)
+    result = generate_embeddings_batch([user_text])[0]
+    if result is None:
+        return False
+    embedding_vector, model_name = result
+    if _keep_active_vector('user', user.id, user_embedding, model_name):
+        return False
     
     # Save or update embedding
-    course_embedding, created = CourseEmbedding.objects.get_or_create(course=course)
-    course_embedding.embedding_vector = pickle.dumps(embedding_vector)
+    if user_embedding is None:
+        user_embedding = UserEmbedding(user=user)
+    user_embedding.set_vector(embedding_vector, model_name, content_fingerprint(user_text, model_name))
+    user_embedding.save()
+    
+    increment('embeddings.user.regenerated')
+    return True
+
+def update_course_embedding(course, force=False):
+    """
+    Update the embedding vector for a course.
+    
+    Args:
+        course: The course object
+        force: Regenerate even if the course text is unchanged
+        
+    Returns:
+        bool: True if the embedding was regenerated, False if skipped
+    """
+    course_text = build_course_text(course)
+    content_hash = content_fingerprint(course_text)
+    
+    # Skip the API call when nothing that feeds the embedding has changed
+    course_embedding = CourseEmbedding.objects.filter(course=course).first()
+    if not force and course_embedding is not None and course_embedding.is_current(content_hash):
+        increment('embeddings.course.skipped')
+        return False
+    
+    # Generate embedding
+    result = generate_embeddings_batch([course_text])[0]
+    if result is None:
+        return False
+    embedding_vector, model_name = result
+    if _keep_active_vector('course', course.id, course_embedding, model_name):
+        return False
+    
+    # Save or update embedding
+    if course_embedding is None:
+        course_embedding = CourseEmbedding(course=course)
+    course_embedding.set_vector(embedding_vector, model_name, content_fingerprint(course_text, model_name))
     course_embedding.save()
+    
+    # Keep this process's recommendation index current without a rebuild;
+    # fallback vectors live in another space and stay out of it
+    if model_name == active_embedding_model():
+        course_index.upsert(course.id, embedding_vector)
+    else:
+        course_index.remove(course.id)
+    
+    increment('embeddings.course.regenerated')
+    return True
+
+def _refresh_embeddings_bulk(model, owner_field, owners, texts, force=False, extra_fields=()):
+    """
+    Regenerate the embeddings whose text changed, with batched API requests,
+    and write them with one bulk_update and one bulk_create.
+    
+    Args:
+        model: UserEmbedding or CourseEmbedding
+        owner_field: 'user_id' or 'course_id'
+        owners: The user or course objects
+        texts: The embedding text for each owner
+        force: Regenerate even if the text is unchanged
+        extra_fields: Model-specific fields set_vector also writes
+        
+    Returns:
+        tuple: (saved embedding objects, vectors in the active space by
+            owner ID, skipped count)
+    """
+    existing = {
+        getattr(embedding, owner_field): embedding
+        for embedding in model.objects.filter(**{f"{owner_field}__in": [owner.id for owner in owners]})
+    }
+    
+    # Only embed owners whose text differs from what their vector was built from
+    pending = []
+    for owner, text in zip(owners, texts):
+        content_hash = content_fingerprint(text)
+        embedding = existing.get(owner.id)
+        if not force and embedding is not None and embedding.is_current(content_hash):
+            continue
+        pending.append((owner.id, text, content_hash))
+    skipped = len(owners) - len(pending)
+    
+    vectors = generate_embeddings_batch([text for _, text, _ in pending])
+    
+    # bulk_update skips auto_now, so stamp the rows explicitly
+    now = timezone.now()
+    to_update = []
+    to_create = []
+    vectors_by_owner = {}
+    active_model = active_embedding_model()
+    kind = owner_field[:-len('_id')]
+    for (owner_id, text, content_hash), result in zip(pending, vectors):
+        if result is None:
+            continue
+        vector, model_name = result
+        embedding = existing.get(owner_id)
+        if _keep_active_vector(kind, owner_id, embedding, model_name):
+            continue
+        if model_name != active_model:
+            content_hash = content_fingerprint(text, model_name)
+        if embedding is None:
+            embedding = model(**{owner_field: owner_id})
+            to_create.append(embedding)
+        else:
+            to_update.append(embedding)
+        embedding.set_vector(vector, model_name, content_hash)
+        embedding.updated_at = now
+        if model_name == active_model:
+            vectors_by_owner[owner_id] = vector
+    
+    fields = ['embedding_vector', 'vector_format', 'dimensions', 'model_name', 'content_hash', 'updated_at']
+    fields.extend(extra_fields)
+    model.objects.bulk_update(to_update, fields, batch_size=500)
+    model.objects.bulk_create(to_create, batch_size=500)
+    
+    return to_update + to_create, vectors_by_owner, skipped
+
+def bulk_update_course_embeddings(course_ids, force=False):
+    """
+    Regenerate embeddings for many courses with batched API requests.
+    
+    Args:
+        course_ids: IDs of the courses to refresh
+        force: Regenerate even if the course text is unchanged
+        
+    Returns:
+        list: IDs of the courses whose embedding was written
+    """
+    courses = list(Course.objects.filter(id__in=course_ids).prefetch_related('lessons'))
+    saved, vectors_by_course, skipped = _refresh_embeddings_bulk(
+        CourseEmbedding, 'course_id', courses, [build_course_text(course) for course in courses], force
+    )
+    
+    for embedding in saved:
+        if embedding.course_id in vectors_by_course:
+            course_index.upsert(embedding.course_id, vectors_by_course[embedding.course_id])
+        else:
+            course_index.remove(embedding.course_id)
+    
+    increment('embeddings.course.skipped', skipped)
+    increment('embeddings.course.regenerated', len(saved))
+    return [embedding.course_id for embedding in saved]
+
+def bulk_update_user_embeddings(user_ids, force=False):
+    """
+    Regenerate embeddings for many users with batched API requests.
+    
+    Args:
+        user_ids: IDs of the users to refresh
+        force: Regenerate even if the profile text is unchanged
+        
+    Returns:
+        int: Number of embeddings written
+    """
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    
+    users = User.objects.filter(id__in=user_ids)
+    if not force and incremental_mode():
+        # Users with course history are maintained incrementally
+        users = users.exclude(embedding__source='incremental')
+    users = list(users.prefetch_related(*user_text_prefetches()))
+    
+    saved, _, skipped = _refresh_embeddings_bulk(
+        UserEmbedding, 'user_id', users, [build_user_text(user) for user in users], force,
+        extra_fields=['source', 'weight_sum', 'decayed_at']
+    )
+    
+    increment('embeddings.user.skipped', skipped + len(user_ids) - len(users))
+    increment('embeddings.user.regenerated', len(saved))
+    return len(saved)
+
+def _format_recommendation(course, similarity):
+    return {
+        'id': course.id,
+        'title': course.title,
+        'slug': course.slug,
+        'short_description': course.short_description,
+        'level': course.level,
+        'similarity_score': similarity,
+        'thumbnail': course.thumbnail.url if course.thumbnail else None,
+    }
+
+def rank_courses_for_user(user):
+    """
+    Rank courses for a user, serving from the per-user ranking cache when
+    the user's embedding and the course index are unchanged.
+    
+    The cached ranking includes enrolled courses and is deep enough to serve
+    any `count` with enrolled courses filtered out, so request variations
+    never trigger rescoring. Embedding similarity is blended with
+    item-item collaborative scores from the course neighbour table.
+    
+    Args:
+        user: The user object
+        
+    Returns:
+        tuple: (list of (course_id, similarity), set of enrolled course IDs)
+    """
+    # Get user embedding, creating it if it doesn't exist
+    user_embedding = get_user_embedding(user)
+    if user_embedding.model_name != active_embedding_model():
+        raise ValueError(f"User embedding from {user_embedding.model_name} is not in the course index's vector space")
+    version = embedding_version(user_embedding)
+    
+    cached = get_cached_ranking(user.id, version)
+    if cached is not None:
+        return cached
+    
+    generation = index_generation()
+    enrolled_ids = set(Enrollment.objects.filter(user=user).values_list('course_id', flat=True))
+    depth = getattr(settings, 'RECOMMENDATION_CACHE_DEPTH', 50) + len(enrolled_ids)
+    
+    # Score every course with one matrix-vector product
+    user_vector = user_embedding.get_vector()
+    ranking = course_index.search(user_vector, depth)
+    
+    # Blend in what learners with the same enrollments also took
+    ranking = blend_rankings(ranking, collaborative_scores(enrolled_ids), user_vector, depth)
+    
+    set_cached_ranking(user.id, version, generation, ranking, enrolled_ids)
+    return ranking, enrolled_ids
 
 def generate_course_recommendations(user, count=5, include_enrolled=False):
     """
@@ -154,82 +604,144 @@ def generate_course_recommendations(user, count=5, include_enrolled=False):
         list: List of recommended course objects with similarity scores
     """
     try:
-        # Get user embedding
-        try:
-            user_embedding = UserEmbedding.objects.get(user=user)
-            user_vector = pickle.loads(user_embedding.embedding_vector)
-        except UserEmbedding.DoesNotExist:
-            # Create embedding if it doesn't exist
-            update_user_embedding(user)
-            user_embedding = UserEmbedding.objects.get(user=user)
-            user_vector = pickle.loads(user_embedding.embedding_vector)
-        
-        # Get all course embeddings
-        course_embeddings = CourseEmbedding.objects.all()
-        
-        # Calculate similarity scores
-        similarities = []
-        for ce in course_embeddings:
-            course_vector = pickle.loads(ce.embedding_vector)
-            
-            # Calculate cosine similarity
-            similarity = np.dot(user_vector, course_vector) / (np.linalg.norm(user_vector) * np.linalg.norm(course_vector))
-            
-            similarities.append({
-                'course': ce.course,
-                'similarity': float(similarity)
-            })
+        ranking, enrolled_ids = rank_courses_for_user(user)
         
         # Filter out enrolled courses if needed
         if not include_enrolled:
-            enrolled_course_ids = Enrollment.objects.filter(user=user).values_list('course_id', flat=True)
-            similarities = [s for s in similarities if s['course'].id not in enrolled_course_ids]
+            ranking = [item for item in ranking if item[0] not in enrolled_ids]
+        top_recommendations = ranking[:count]
         
-        # Sort by similarity and return top N
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        top_recommendations = similarities[:count]
+        courses = Course.objects.in_bulk([course_id for course_id, _ in top_recommendations])
         
         # Format response
         result = []
-        for rec in top_recommendations:
-            course = rec['course']
-            result.append({
-                'id': course.id,
-                'title': course.title,
-                'slug': course.slug,
-                'short_description': course.short_description,
-                'level': course.level,
-                'similarity_score': rec['similarity'],
-                'thumbnail': course.thumbnail.url if course.thumbnail else None,
-            })
+        for course_id, similarity in top_recommendations:
+            course = courses.get(course_id)
+            if course is not None:
+                result.append(_format_recommendation(course, similarity))
         
         return result
     
+    except UserEmbeddingPending:
+        # New user; serve popular courses until their embedding is ready
+        increment('recommendations.cold_start')
+        return _popular_recommendations(user, count, include_enrolled)
+    
     except Exception as e:
         print(f"Error generating recommendations: {str(e)}")
+        return _popular_recommendations(user, count, include_enrolled)
+
+def _popular_recommendations(user, count, include_enrolled):
+    # Fallback to the materialized popularity ranking
+    enrolled_course_ids = None
+    if not include_enrolled:
+        enrolled_course_ids = list(Enrollment.objects.filter(user=user).values_list('course_id', flat=True))
+    
+    result = []
+    for course in get_popular_courses(count, exclude_ids=enrolled_course_ids):
+        result.append(_format_recommendation(course, 0.0))  # No similarity score for fallback
+    
+    return result
+
+def build_essay_grading_messages(essay_text, rubric='', max_score=100):
+    """
+    Build the OpenAI chat messages for grading an essay.
+    
+    Args:
+        essay_text: The essay text to grade
+        rubric: Grading rubric or criteria
+        max_score: Maximum possible score
         
-        # Fallback to popularity-based recommendations
-        popular_courses = Course.objects.annotate(
-            enrollment_count=Count('enrollments')
-        ).order_by('-enrollment_count')[:count]
+    Returns:
+        list: Chat messages
+    """
+    if rubric:
+        prompt = f"""
+        Please grade the following essay according to this rubric:
         
-        if not include_enrolled:
-            enrolled_course_ids = Enrollment.objects.filter(user=user).values_list('course_id', flat=True)
-            popular_courses = popular_courses.exclude(id__in=enrolled_course_ids)
+        {rubric}
         
-        result = []
-        for course in popular_courses:
-            result.append({
-                'id': course.id,
-                'title': course.title,
-                'slug': course.slug,
-                'short_description': course.short_description,
-                'level': course.level,
-                'similarity_score': 0.0,  # No similarity score for fallback
-                'thumbnail': course.thumbnail.url if course.thumbnail else None,
-            })
+        The maximum score is {max_score}.
         
-        return result
+        Essay:
+        {essay_text}
+        
+        Provide a detailed assessment with specific feedback on strengths and areas for improvement.
+        Format your response as:
+        
+        Score: [numerical score out of {max_score}]
+        
+        Feedback:
+        [detailed feedback]
+        """
+    else:
+        prompt = f"""
+        Please grade the following essay on a scale of 0 to {max_score}.
+        Consider factors such as:
+        - Clarity and coherence
+        - Quality of arguments and evidence
+        - Grammar and writing style
+        - Organization and structure
+        
+        Essay:
+        {essay_text}
+        
+        Provide a detailed assessment with specific feedback on strengths and areas for improvement.
+        Format your response as:
+        
+        Score: [numerical score out of {max_score}]
+        
+        Feedback:
+        [detailed feedback]
+        """
+    
+    return [
+        {"role": "system", "content": "You are an expert educator who grades essays fairly and provides constructive feedback."},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_essay_grade(response_text):
+    """
+    Extract the score and feedback from a grading response.
+    
+    This is also the check that escalates essay grading to the large model
+    (model_routing.validate_essay_grade), so an answer is only accepted if
+    it parses here.
+    
+    Returns:
+        tuple: (score, feedback)
+        
+    Raises:
+        ValidationError: No 'Score:' line with a number, or no 'Feedback:'
+    """
+    import re
+    
+    # Parse the first number on the score line
+    score_line = [line for line in response_text.split('\n') if line.strip().lower().startswith('score:')]
+    score_match = re.search(r'\d+(\.\d+)?', score_line[0].split(':', 1)[1]) if score_line else None
+    if score_match is None:
+        raise ValidationError("Response has no score")
+    
+    # Extract feedback (everything after "Feedback:")
+    feedback_parts = response_text.split('Feedback:', 1)
+    if len(feedback_parts) < 2:
+        raise ValidationError("Response has no feedback")
+    
+    return float(score_match.group(0)), feedback_parts[1].strip()
+
+def essay_grade_or_default(response_text, max_score=100):
+    """
+    Parse a grading response, falling back to the middle score and the
+    full response when it has no score or feedback.
+    
+    Returns:
+        tuple: (score, feedback)
+    """
+    try:
+        return parse_essay_grade(response_text)
+    except ValidationError as e:
+        print(f"Error parsing AI response: {str(e)}")
+        return max_score / 2, response_text
 
 def grade_essay(essay_text, rubric='', max_score=100):
     """
@@ -244,92 +756,20 @@ def grade_essay(essay_text, rubric='', max_score=100):
         tuple: (score, feedback)
     """
     try:
-        # Prepare prompt for the AI
-        if rubric:
-            prompt = f"""
-            Please grade the following essay according to this rubric:
-            
-            {rubric}
-            
-            The maximum score is {max_score}.
-            
-            Essay:
-            {essay_text}
-            
-            Provide a detailed assessment with specific feedback on strengths and areas for improvement.
-            Format your response as:
-            
-            Score: [numerical score out of {max_score}]
-            
-            Feedback:
-            [detailed feedback]
-            """
-        else:
-            prompt = f"""
-            Please grade the following essay on a scale of 0 to {max_score}.
-            Consider factors such as:
-            - Clarity and coherence
-            - Quality of arguments and evidence
-            - Grammar and writing style
-            - Organization and structure
-            
-            Essay:
-            {essay_text}
-            
-            Provide a detailed assessment with specific feedback on strengths and areas for improvement.
-            Format your response as:
-            
-            Score: [numerical score out of {max_score}]
-            
-            Feedback:
-            [detailed feedback]
-            """
-        
         # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an expert educator who grades essays fairly and provides constructive feedback."},
-                {"role": "user", "content": prompt}
-            ],
+        response = routed_completion(
+            'essay_grading',
+            build_essay_grading_messages(essay_text, rubric, max_score),
+            validate=validate_essay_grade,
             max_tokens=1000,
             temperature=0.3,
         )
         
-        response_text = response.choices[0].message.content
-        
-        # Extract score and feedback
-        try:
-            # Try to parse the score from the response
-            score_line = [line for line in response_text.split('\n') if line.lower().startswith('score:')]
-            if score_line:
-                score_text = score_line[0].split(':', 1)[1].strip()
-                # Extract the first number from the score text
-                import re
-                score_match = re.search(r'\d+(\.\d+)?', score_text)
-                if score_match:
-                    score = float(score_match.group(0))
-                else:
-                    score = max_score / 2  # Default to middle score if parsing fails
-            else:
-                score = max_score / 2
-            
-            # Extract feedback (everything after "Feedback:")
-            feedback_parts = response_text.split('Feedback:', 1)
-            if len(feedback_parts) > 1:
-                feedback = feedback_parts[1].strip()
-            else:
-                feedback = response_text  # Use full response if can't parse
-            
-            return score, feedback
-            
-        except Exception as parsing_error:
-            print(f"Error parsing AI response: {str(parsing_error)}")
-            return max_score / 2, response_text  # Return middle score and full response
+        return essay_grade_or_default(response.choices[0].message.content, max_score)
     
     except Exception as e:
         print(f"Error grading essay: {str(e)}")
-        return 0, "Error processing essay. Please try again later."
+        return 0, ESSAY_GRADING_FALLBACK
 
 def grade_essay_response(response_id, answer_key=''):
     """
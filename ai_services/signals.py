@@ -1,22 +1,127 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from courses.models import Course
+from celery.signals import task_postrun, task_prerun
+from courses.models import Course, Lesson, Enrollment
+from users.models import LearningActivity
 from django.contrib.auth import get_user_model
-from .tasks import update_course_embedding_task, update_user_embedding_task
+from .embedding_queue import schedule_embedding_refresh
+from .tasks import apply_user_embedding_event_task, rebuild_user_embedding_task, summarize_chat_session_task
+from .user_vectors import activity_course_id, incremental_mode
+from .recommendation_cache import invalidate_user_recommendations
+from .chat_context import needs_summary
+from .llm_usage import reset_call_tags, set_call_tags
+from .models import ChatMessage
 
 User = get_user_model()
 
+# Model fields that feed each embedding's text (see build_course_text / build_user_text)
+COURSE_EMBEDDING_FIELDS = {'title', 'description', 'short_description', 'level'}
+LESSON_EMBEDDING_FIELDS = {'title', 'description', 'course'}
+USER_EMBEDDING_FIELDS = {'interests', 'learning_style'}
+
+def touches_fields(update_fields, fields):
+    """
+    Whether a save may have changed any of the given fields.
+    """
+    return update_fields is None or not fields.isdisjoint(update_fields)
+
 @receiver(post_save, sender=Course)
-def update_course_embedding_on_save(sender, instance, created, **kwargs):
+def update_course_embedding_on_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Update course embedding when a course is created or updated.
     """
-    update_course_embedding_task.delay(instance.id)
+    if not touches_fields(update_fields, COURSE_EMBEDDING_FIELDS):
+        return
+    schedule_embedding_refresh('course', instance.id)
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def update_course_embedding_on_lesson_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Update course embedding when one of its lessons changes.
+    """
+    if not touches_fields(update_fields, LESSON_EMBEDDING_FIELDS):
+        return
+    schedule_embedding_refresh('course', instance.course_id)
 
 @receiver(post_save, sender=User)
-def update_user_embedding_on_save(sender, instance, created, **kwargs):
+def update_user_embedding_on_save(sender, instance, created, update_fields=None, **kwargs):
     """
     Update user embedding when a user is created or updated.
     """
-    update_user_embedding_task.delay(instance.id)
+    # Incremental user vectors are driven by enrollments and activities instead
+    if incremental_mode():
+        return
+    # Logins save with update_fields=['last_login'], which never affects the embedding
+    if not touches_fields(update_fields, USER_EMBEDDING_FIELDS):
+        return
+    schedule_embedding_refresh('user', instance.id)
+
+@receiver(post_save, sender=Enrollment)
+def update_user_embedding_on_enrollment(sender, instance, created, **kwargs):
+    """
+    Fold a new enrollment into the user's incremental vector.
+    """
+    if not created or not incremental_mode():
+        return
+    args = (instance.user_id, instance.course_id, 'enrollment', instance.enrolled_at.isoformat())
+    transaction.on_commit(lambda: apply_user_embedding_event_task.delay(*args))
+
+@receiver(post_delete, sender=Enrollment)
+def rebuild_user_embedding_on_unenroll(sender, instance, **kwargs):
+    """
+    Recompute the user's incremental vector when an enrollment is removed.
+    """
+    if not incremental_mode():
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: rebuild_user_embedding_task.delay(user_id))
+
+@receiver(post_save, sender=LearningActivity)
+def update_user_embedding_on_activity(sender, instance, created, **kwargs):
+    """
+    Fold a new course, lesson or quiz activity into the user's incremental vector.
+    """
+    if not created or not incremental_mode():
+        return
+    course_id = activity_course_id(instance)
+    if course_id is None:
+        return
+    args = (instance.user_id, course_id, 'activity', instance.created_at.isoformat())
+    transaction.on_commit(lambda: apply_user_embedding_event_task.delay(*args))
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_recommendations_on_enrollment_change(sender, instance, **kwargs):
+    """
+    Drop the user's cached recommendations when their enrollments change.
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate_user_recommendations(user_id))
+
+@receiver(post_save, sender=ChatMessage)
+def summarize_chat_session_on_reply(sender, instance, created, **kwargs):
+    """
+    Summarize older messages once a session's recent history outgrows its budget.
+    """
+    if not created or instance.role != 'assistant' or not needs_summary(instance.session_id):
+        return
+    session_id = instance.session_id
+    transaction.on_commit(lambda: summarize_chat_session_task.delay(session_id))
+
+# LLM call attribution tokens of running tasks, by task ID
+_task_call_tags = {}
+
+@task_prerun.connect
+def tag_llm_calls_for_task(task_id=None, task=None, **kwargs):
+    """
+    Attribute LLM calls made by a Celery task to 'task:<name>'.
+    """
+    _task_call_tags[task_id] = set_call_tags(f"task:{task.name}")
 
+@task_postrun.connect
+def untag_llm_calls_for_task(task_id=None, **kwargs):
+    token = _task_call_tags.pop(task_id, None)
+    if token is not None:
+        reset_call_tags(token)
@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from .metrics import increment
+
+FLIGHT_LOCK_KEY = 'llm:flight:{key}'
+FLIGHT_RESULT_KEY = 'llm:flight:{key}:{flight_id}'
+
+class SharedCallError(Exception):
+    """
+    The call this request was coalesced onto failed in another worker.
+    """
+
+def get_single_flight_settings():
+    return (
+        getattr(settings, 'LLM_SINGLE_FLIGHT_ENABLED', True),
+        # A flight may take as long as a call with all its retries
+        getattr(settings, 'LLM_TIMEOUT', 30.0) + getattr(settings, 'LLM_SINGLE_FLIGHT_GRACE', 5.0),
+        getattr(settings, 'LLM_SINGLE_FLIGHT_POLL_INTERVAL', 0.05),
+    )
+
+def request_key(**kwargs):
+    """
+    Hash the model, messages and parameters of a call into a flight key.
+    """
+    payload = json.dumps(kwargs, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+_lock = threading.Lock()
+_flights = {}
+_async_flights = {}
+
+def _join_or_lead(key, lock_timeout):
+    """
+    Claim the cross-worker flight for a key, or find the one in progress.
+
+    Returns:
+        tuple: (flight_id, is_leader)
+    """
+    flight_id = uuid.uuid4().hex
+    lock_key = FLIGHT_LOCK_KEY.format(key=key)
+    while True:
+        if cache.add(lock_key, flight_id, timeout=lock_timeout):
+            return flight_id, True
+        current = cache.get(lock_key)
+        if current is not None:
+            return current, False
+        # The leader finished between add and get; try to lead again
+
+def _publish(key, flight_id, result, error, lock_timeout):
+    # Followers poll the result key; the lock is only released once it is set
+    outcome = {'error': str(error)} if error is not None else {'result': result}
+    cache.set(FLIGHT_RESULT_KEY.format(key=key, flight_id=flight_id), outcome, timeout=lock_timeout)
+    cache.delete(FLIGHT_LOCK_KEY.format(key=key))
+
+def _read_outcome(key, flight_id):
+    """
+    The published outcome of a flight, or None while it is still in the air.
+    A flight whose leader vanished without publishing counts as failed.
+    """
+    outcome = cache.get(FLIGHT_RESULT_KEY.format(key=key, flight_id=flight_id))
+    if outcome is None and cache.get(FLIGHT_LOCK_KEY.format(key=key)) != flight_id:
+        outcome = cache.get(FLIGHT_RESULT_KEY.format(key=key, flight_id=flight_id))
+        if outcome is None:
+            outcome = {'error': 'Coalesced call ended without a result'}
+    return outcome
+
+def _unwrap(outcome):
+    if 'error' in outcome:
+        raise SharedCallError(outcome['error'])
+    return outcome['result']
+
+def _call_across_workers(key, operation):
+    _, lock_timeout, poll_interval = get_single_flight_settings()
+
+    flight_id, is_leader = _join_or_lead(key, lock_timeout)
+    if is_leader:
+        try:
+            result = operation()
+        except Exception as e:
+            _publish(key, flight_id, None, e, lock_timeout)
+            raise
+        _publish(key, flight_id, result, None, lock_timeout)
+        return result
+
+    increment('llm.single_flight.shared_remote')
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        outcome = _read_outcome(key, flight_id)
+        if outcome is not None:
+            return _unwrap(outcome)
+        time.sleep(poll_interval)
+    raise SharedCallError('Timed out waiting for a coalesced call')
+
+def single_flight(key, operation):
+    """
+    Run `operation` once for all concurrent callers with the same key.
+
+    Threads of a process share one flight through an in-process table; one
+    thread per process then joins the cross-worker flight in the cache,
+    whose leader makes the upstream call and publishes its result (or
+    failure) for the others. Nothing is kept once the flight lands, so this
+    only merges calls that overlap in time; it is not a cache.
+
+    Args:
+        key: Flight key, e.g. from request_key()
+        operation: Callable making the upstream call
+
+    Returns:
+        The operation's result, shared by every caller of the flight
+
+    Raises:
+        SharedCallError: The flight failed in another worker
+    """
+    enabled, lock_timeout, _ = get_single_flight_settings()
+    if not enabled:
+        return operation()
+
+    with _lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if is_leader:
+            flight = _flights[key] = _Flight()
+
+    if not is_leader:
+        increment('llm.single_flight.shared')
+        if not flight.event.wait(lock_timeout):
+            raise SharedCallError('Timed out waiting for a coalesced call')
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _call_across_workers(key, operation)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+        flight.event.set()
+
+async def _acall_across_workers(key, operation):
+    from asgiref.sync import sync_to_async
+
+    _, lock_timeout, poll_interval = get_single_flight_settings()
+
+    flight_id, is_leader = await sync_to_async(_join_or_lead, thread_sensitive=False)(key, lock_timeout)
+    if is_leader:
+        try:
+            result = await operation()
+        except Exception as e:
+            await sync_to_async(_publish, thread_sensitive=False)(key, flight_id, None, e, lock_timeout)
+            raise
+        await sync_to_async(_publish, thread_sensitive=False)(key, flight_id, result, None, lock_timeout)
+        return result
+
+    increment('llm.single_flight.shared_remote')
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        outcome = await sync_to_async(_read_outcome, thread_sensitive=False)(key, flight_id)
+        if outcome is not None:
+            return _unwrap(outcome)
+        await asyncio.sleep(poll_interval)
+    raise SharedCallError('Timed out waiting for a coalesced call')
+
+async def asingle_flight(key, operation):
+    """
+    Async version of single_flight; `operation` returns an awaitable.
+    Callers on the same event loop share one task.
+    """
+    enabled, _, _ = get_single_flight_settings()
+    if not enabled:
+        return await operation()
+
+    loop_key = (id(asyncio.get_running_loop()), key)
+    task = _async_flights.get(loop_key)
+    if task is not None:
+        increment('llm.single_flight.shared')
+        # Shielded so one caller giving up does not cancel the others' call
+        return await asyncio.shield(task)
+
+    task = asyncio.ensure_future(_acall_across_workers(key, operation))
+    _async_flights[loop_key] = task
+    task.add_done_callback(lambda _: _async_flights.pop(loop_key, None))
+    return await asyncio.shield(task)
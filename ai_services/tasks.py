@@ -1,5 +1,20 @@
-from celery import shared_task
-from .services import grade_essay_response, update_course_embedding, update_user_embedding
+from celery import chord, shared_task
+from django.conf import settings
+from .services import (
+    grade_essay_response, update_course_embedding, update_user_embedding,
+    bulk_update_course_embeddings, bulk_update_user_embeddings
+)
+from .vectors import write_course_snapshot
+from .embedding_queue import clear_pending_refresh
+from .user_vectors import apply_user_event, rebuild_user_vector
+from .recommendation_cache import bump_index_generation
+from .ann import build_ann_index, get_ann_settings
+from .compression import build_compressed_vectors, get_compression_settings
+from .batch_recommendations import generate_batch_recommendations
+from .popularity import refresh_course_popularity
+from .collaborative import build_collaborative_neighbors
+from .course_neighbors import build_content_neighbors, update_content_neighbors
+from .chat_context import summarize_session
 
 @shared_task
 def grade_essay_response_task(response_id, answer_key=''):
@@ -14,8 +29,12 @@ def update_course_embedding_task(course_id):
     Celery task to update a course embedding asynchronously.
     """
     from courses.models import Course
-    course = Course.objects.get(id=course_id)
-    update_course_embedding(course)
+    clear_pending_refresh('course', course_id)
+    course = Course.objects.filter(id=course_id).first()
+    if course is None:
+        return  # Deleted while the refresh was pending
+    if update_course_embedding(course):
+        update_content_neighbors(course_id)
 
 @shared_task
 def update_user_embedding_task(user_id):
@@ -24,18 +43,68 @@ def update_user_embedding_task(user_id):
     """
     from django.contrib.auth import get_user_model
     User = get_user_model()
-    user = User.objects.get(id=user_id)
+    clear_pending_refresh('user', user_id)
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return  # Deleted while the refresh was pending
     update_user_embedding(user)
 
+@shared_task
+def apply_user_embedding_event_task(user_id, course_id, event, occurred_at=None):
+    """
+    Celery task to fold an enrollment or activity into a user's vector.
+    """
+    from django.utils.dateparse import parse_datetime
+    apply_user_event(user_id, course_id, event, parse_datetime(occurred_at) if occurred_at else None)
+
+@shared_task
+def rebuild_user_embedding_task(user_id):
+    """
+    Celery task to recompute a user's vector from their course history.
+    """
+    rebuild_user_vector(user_id)
+
+@shared_task
+def bulk_update_course_embeddings_task(course_ids, update_neighbors=True):
+    """
+    Celery task to update a chunk of course embeddings with batched API calls.
+    Pass update_neighbors=False when the caller rebuilds every neighbour list.
+    """
+    updated_ids = bulk_update_course_embeddings(course_ids)
+    if updated_ids:
+        bump_index_generation()
+        if update_neighbors:
+            for course_id in updated_ids:
+                update_content_neighbors(course_id)
+    return len(updated_ids)
+
+@shared_task
+def bulk_update_user_embeddings_task(user_ids):
+    """
+    Celery task to update a chunk of user embeddings with batched API calls.
+    """
+    bulk_update_user_embeddings(user_ids)
+
+def _id_chunks(queryset):
+    chunk_size = getattr(settings, 'EMBEDDING_REFRESH_CHUNK_SIZE', 500)
+    ids = list(queryset.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
 @shared_task
 def update_all_course_embeddings():
     """
     Celery task to update all course embeddings.
     """
     from courses.models import Course
-    courses = Course.objects.all()
-    for course in courses:
-        update_course_embedding_task.delay(course.id)
+    chunks = [
+        bulk_update_course_embeddings_task.s(course_ids, update_neighbors=False)
+        for course_ids in _id_chunks(Course.objects.all())
+    ]
+    if chunks:
+        # One full neighbour rebuild once every chunk is done, instead of
+        # an incremental update per course
+        chord(chunks)(build_content_neighbors_task.si())
 
 @shared_task
 def update_all_user_embeddings():
@@ -44,7 +113,59 @@ def update_all_user_embeddings():
     """
     from django.contrib.auth import get_user_model
     User = get_user_model()
-    users = User.objects.all()
-    for user in users:
-        update_user_embedding_task.delay(user.id)
+    for user_ids in _id_chunks(User.objects.all()):
+        bulk_update_user_embeddings_task.delay(user_ids)
+
+@shared_task
+def build_course_embedding_snapshot():
+    """
+    Celery task to write the shared, memory-mapped course embedding snapshot.
+    """
+    write_course_snapshot()
+    
+    # The ANN index addresses snapshot rows, so it is rebuilt with every snapshot
+    backend, _, _ = get_ann_settings()
+    if backend != 'exact':
+        build_ann_index(backend)
+    
+    if get_compression_settings()[0]:
+        build_compressed_vectors()
+    
+    bump_index_generation()
+
+@shared_task
+def generate_recommendation_digests(count=None):
+    """
+    Celery task to precompute recommendations for every user in one batch run.
+    """
+    return generate_batch_recommendations(count=count)
+
+@shared_task
+def refresh_course_popularity_task():
+    """
+    Celery task to rebuild the materialized course popularity rankings.
+    """
+    return refresh_course_popularity()
+
+@shared_task
+def build_collaborative_neighbors_task():
+    """
+    Celery task to rebuild the collaborative-filtering course neighbour lists.
+    """
+    written = build_collaborative_neighbors()
+    bump_index_generation()
+    return written
+
+@shared_task
+def build_content_neighbors_task():
+    """
+    Celery task to rebuild the content-similarity course neighbour lists.
+    """
+    return build_content_neighbors()
 
+@shared_task
+def summarize_chat_session_task(session_id):
+    """
+    Celery task to fold older chat messages into the session's running summary.
+    """
+    summarize_session(session_id)
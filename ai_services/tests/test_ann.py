@@ -0,0 +1,93 @@
+import tempfile
+import numpy as np
+from django.test import SimpleTestCase
+from ai_services.ann import IVFIndex, LSHIndex, ann_search, load_ann_index, save_ann_index, top_k
+
+def clustered_vectors(clusters=8, per_cluster=40, dimensions=16, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimensions))
+    vectors = np.repeat(centres, per_cluster, axis=0) + 0.1 * rng.standard_normal((clusters * per_cluster, dimensions))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+def exact_top(vectors, query, count, exclude_mask=None):
+    scores = vectors @ query
+    if exclude_mask is not None:
+        scores[exclude_mask] = -np.inf
+    return top_k(scores, count)
+
+class TopKTests(SimpleTestCase):
+    def test_returns_best_first_and_clamps_count(self):
+        scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+        self.assertEqual(top_k(scores, 2).tolist(), [1, 3])
+        self.assertEqual(top_k(scores, 10).tolist(), [1, 3, 2, 0])
+        self.assertEqual(len(top_k(scores, 0)), 0)
+
+class IVFIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.vectors = clustered_vectors()
+        self.ivf = IVFIndex.build(self.vectors, n_clusters=8)
+
+    def test_every_row_is_in_exactly_one_list(self):
+        self.assertEqual(sorted(self.ivf.order.tolist()), list(range(len(self.vectors))))
+        self.assertEqual(self.ivf.offsets[-1], len(self.vectors))
+
+    def test_probing_every_cluster_is_exact(self):
+        query = self.vectors[5]
+        rows, scores = ann_search(self.ivf, self.vectors, query, 10, probes=8)
+        self.assertEqual(rows.tolist(), exact_top(self.vectors, query, 10).tolist())
+        np.testing.assert_allclose(scores, self.vectors[rows] @ query, rtol=1e-6)
+
+    def test_one_probe_finds_the_neighbours_in_the_query_cluster(self):
+        for row in range(0, len(self.vectors), 40):
+            query = self.vectors[row]
+            rows, _ = ann_search(self.ivf, self.vectors, query, 10, probes=1)
+            self.assertEqual(set(rows.tolist()), set(exact_top(self.vectors, query, 10).tolist()))
+
+    def test_excluded_rows_are_never_returned(self):
+        query = self.vectors[0]
+        exclude = np.zeros(len(self.vectors), dtype=bool)
+        exclude[exact_top(self.vectors, query, 3)] = True
+        rows, _ = ann_search(self.ivf, self.vectors, query, 10, probes=8, exclude_mask=exclude)
+        self.assertFalse(exclude[rows].any())
+        self.assertEqual(rows.tolist(), exact_top(self.vectors, query, 10, exclude).tolist())
+
+class LSHIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.vectors = clustered_vectors()
+        self.lsh = LSHIndex.build(self.vectors, n_bits=6)
+
+    def test_probing_every_bucket_is_exact(self):
+        query = self.vectors[17]
+        rows, _ = ann_search(self.lsh, self.vectors, query, 10, probes=1 << 6)
+        self.assertEqual(rows.tolist(), exact_top(self.vectors, query, 10).tolist())
+
+    def test_probes_visit_distinct_buckets_starting_with_the_query_bucket(self):
+        query = self.vectors[3]
+        codes = self.lsh._probe_codes(query, 8)
+        own = int(((self.lsh.planes @ query) > 0).astype(np.int64) @ self.lsh._weights)
+        self.assertEqual(codes[0], own)
+        self.assertEqual(len(set(codes)), 8)
+
+    def test_more_probes_never_lose_candidates(self):
+        query = self.vectors[80]
+        fewer = set(self.lsh.candidates(query, 2).tolist())
+        more = set(self.lsh.candidates(query, 8).tolist())
+        self.assertTrue(fewer <= more)
+
+    def test_query_in_an_empty_bucket_returns_nothing(self):
+        lsh = LSHIndex.build(self.vectors[:1], n_bits=4)
+        rows, scores = ann_search(lsh, self.vectors[:1], -self.vectors[0], 5, probes=1)
+        self.assertEqual((len(rows), len(scores)), (0, 0))
+
+class PersistenceTests(SimpleTestCase):
+    def test_round_trip_and_generation_check(self):
+        vectors = clustered_vectors()
+        ivf = IVFIndex.build(vectors, n_clusters=4)
+        with tempfile.TemporaryDirectory() as directory:
+            save_ann_index(ivf, 'gen-1', directory)
+            loaded = load_ann_index('gen-1', directory)
+            self.assertIsInstance(loaded, IVFIndex)
+            for name, array in ivf.arrays().items():
+                np.testing.assert_array_equal(loaded.arrays()[name], array)
+            self.assertIsNone(load_ann_index('gen-2', directory))
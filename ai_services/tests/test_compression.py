@@ -0,0 +1,75 @@
+import numpy as np
+from django.test import SimpleTestCase
+from ai_services.ann import top_k
+from ai_services.compression import CompressedVectors, compact_search
+
+def normalized_vectors(rows=200, dimensions=24, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((rows, dimensions))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+class Int8QuantizationTests(SimpleTestCase):
+    def setUp(self):
+        self.vectors = normalized_vectors()
+        # Keep every component, so quantization is the only loss
+        self.compressed = CompressedVectors.fit(self.vectors, n_components=24)
+
+    def reconstruct(self):
+        c = self.compressed
+        return c.mean + (c.scales[:, None] * c.codes.astype(np.float32)) @ c.components
+
+    def test_codes_are_int8_and_use_the_full_range(self):
+        codes = self.compressed.codes
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertTrue(self.compressed.quantized)
+        self.assertEqual(np.abs(codes.astype(np.int16)).max(axis=1).tolist(), [127] * len(codes))
+
+    def test_round_trip_error_is_within_half_a_step(self):
+        c = self.compressed
+        projected = (self.vectors - c.mean) @ c.components.T
+        decoded = c.scales[:, None] * c.codes.astype(np.float32)
+        self.assertTrue(np.all(np.abs(decoded - projected) <= c.scales[:, None] / 2 + 1e-6))
+        np.testing.assert_allclose(self.reconstruct(), self.vectors, atol=0.05)
+
+    def test_scores_match_the_decoded_vectors(self):
+        query = self.vectors[7]
+        np.testing.assert_allclose(self.compressed.scores(query), self.reconstruct() @ query, atol=1e-4)
+        np.testing.assert_allclose(self.compressed.scores(query), self.vectors @ query, atol=0.05)
+
+    def test_constant_rows_do_not_divide_by_zero(self):
+        vectors = np.vstack([self.vectors, self.vectors.mean(axis=0, keepdims=True)]).astype(np.float32)
+        compressed = CompressedVectors.fit(vectors, n_components=24)
+        self.assertTrue(np.all(np.isfinite(compressed.scales)))
+        self.assertTrue(np.all(np.isfinite(compressed.scores(vectors[0]))))
+
+    def test_unquantized_codes_are_float(self):
+        compressed = CompressedVectors.fit(self.vectors, n_components=8, quantize=False)
+        self.assertFalse(compressed.quantized)
+        self.assertEqual(compressed.codes.dtype, np.float32)
+
+class CompactSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.vectors = normalized_vectors(rows=300)
+        self.compressed = CompressedVectors.fit(self.vectors, n_components=24)
+
+    def test_rerank_returns_exact_scores_of_the_true_top(self):
+        query = self.vectors[11]
+        rows, scores = compact_search(self.compressed, self.vectors, query, 10, rerank=4)
+        exact = self.vectors @ query
+        self.assertEqual(rows.tolist(), top_k(exact, 10).tolist())
+        np.testing.assert_allclose(scores, exact[rows], rtol=1e-6)
+
+    def test_excluded_rows_are_never_returned(self):
+        query = self.vectors[0]
+        exclude = np.zeros(len(self.vectors), dtype=bool)
+        exclude[:150] = True
+        for rerank in (0, 4):
+            rows, _ = compact_search(self.compressed, self.vectors, query, 10, rerank=rerank, exclude_mask=exclude)
+            self.assertEqual(len(rows), 10)
+            self.assertFalse(exclude[rows].any())
+
+    def test_count_is_limited_to_the_rows_left(self):
+        exclude = np.ones(len(self.vectors), dtype=bool)
+        exclude[:3] = False
+        rows, _ = compact_search(self.compressed, self.vectors, self.vectors[0], 10, rerank=4, exclude_mask=exclude)
+        self.assertEqual(sorted(rows.tolist()), [0, 1, 2])
@@ -0,0 +1,74 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from users.models import User
+from ai_services.models import ChatMessage, ChatSession
+from ai_services.pagination import MessageKeysetPagination
+
+class MessageKeysetPaginationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='learner', email='learner@example.com', password='x')
+        self.session = ChatSession.objects.create(user=user, title='Session')
+        ChatMessage.objects.bulk_create(
+            ChatMessage(session=self.session, role='user', content=f"message {i}") for i in range(7)
+        )
+        self.factory = APIRequestFactory()
+
+    def page(self, cursor=None, limit=3):
+        params = {'limit': limit}
+        if cursor is not None:
+            params['cursor'] = cursor
+        paginator = MessageKeysetPagination()
+        request = Request(self.factory.get('/messages/', params))
+        page = paginator.paginate_queryset(ChatMessage.objects.filter(session=self.session), request)
+        return [message.id for message in page], paginator.next_cursor
+
+    def walk(self, limit):
+        ids, cursor = self.page(limit=limit)
+        while cursor is not None:
+            more, cursor = self.page(cursor, limit)
+            ids.extend(more)
+        return ids
+
+    def test_ties_on_created_at_are_broken_by_id(self):
+        ChatMessage.objects.filter(session=self.session).update(created_at=timezone.now())
+        expected = list(ChatMessage.objects.filter(session=self.session).order_by('-id').values_list('id', flat=True))
+
+        for limit in (1, 2, 3, 7, 50):
+            self.assertEqual(self.walk(limit), expected)
+
+    def test_page_boundary_inside_a_run_of_ties(self):
+        now = timezone.now()
+        ids = list(ChatMessage.objects.filter(session=self.session).order_by('id').values_list('id', flat=True))
+        # Two older messages, then five sharing one timestamp
+        ChatMessage.objects.filter(id__in=ids[:2]).update(created_at=now - timedelta(minutes=1))
+        ChatMessage.objects.filter(id__in=ids[2:]).update(created_at=now)
+
+        first, cursor = self.page(limit=3)
+        second, cursor = self.page(cursor, limit=3)
+        third, cursor = self.page(cursor, limit=3)
+
+        self.assertEqual(first, ids[6:3:-1])
+        self.assertEqual(second, [ids[3], ids[2], ids[1]])
+        self.assertEqual(third, [ids[0]])
+        self.assertIsNone(cursor)
+
+    def test_new_messages_do_not_shift_older_pages(self):
+        first, cursor = self.page(limit=3)
+        ChatMessage.objects.bulk_create([ChatMessage(session=self.session, role='assistant', content='late reply')])
+        second, _ = self.page(cursor, limit=3)
+        self.assertFalse(set(first) & set(second))
+        self.assertLess(max(second), min(first))
+
+    def test_last_full_page_has_no_next_cursor(self):
+        ids, cursor = self.page(limit=7)
+        self.assertEqual(len(ids), 7)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor_is_not_found(self):
+        for cursor in ('not-base64!', 'bm9waXBl', 'MjAyNC0wMS0wMXx4'):
+            with self.assertRaises(NotFound):
+                self.page(cursor)
@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from django.test import SimpleTestCase
+from ai_services.llm import RecordedStream
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FakeStream:
+    def __init__(self, texts, error=None):
+        self.texts = texts
+        self.error = error
+        self.response = FakeResponse()
+
+    def __iter__(self):
+        for text in self.texts:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        if self.error is not None:
+            raise self.error
+
+class FakeRecord:
+    def __init__(self):
+        self.finished = []
+
+    def finish(self, outcome, prompt_tokens=None, completion_tokens=None, error=None):
+        self.finished.append((outcome, completion_tokens, error))
+
+class RecordedStreamTests(SimpleTestCase):
+    def open_stream(self, texts, error=None):
+        record = FakeRecord()
+        stream = RecordedStream(FakeStream(texts, error), record, [{'role': 'user', 'content': 'Hi'}])
+        return stream, record
+
+    def test_full_stream_is_recorded_as_success_once(self):
+        stream, record = self.open_stream(['Hello', ' there'])
+
+        self.assertEqual(len(list(stream)), 2)
+        stream.close()
+
+        self.assertEqual([outcome for outcome, _, _ in record.finished], ['success'])
+        self.assertTrue(stream.response.closed)
+
+    def test_stream_closed_early_is_recorded_as_cancelled(self):
+        stream, record = self.open_stream(['Hello', ' there', ' friend'])
+
+        chunks = iter(stream)
+        next(chunks)
+        stream.close()
+        chunks.close()
+
+        self.assertEqual(len(record.finished), 1)
+        outcome, completion_tokens, error = record.finished[0]
+        self.assertEqual(outcome, 'cancelled')
+        self.assertGreater(completion_tokens, 0)
+        self.assertIsNone(error)
+        self.assertTrue(stream.response.closed)
+
+    def test_stream_closed_before_first_chunk_is_recorded_as_cancelled(self):
+        stream, record = self.open_stream(['Hello'])
+
+        stream.close()
+
+        self.assertEqual([outcome for outcome, _, _ in record.finished], ['cancelled'])
+
+    def test_failed_stream_is_recorded_as_error(self):
+        error = ConnectionError("connection reset")
+        stream, record = self.open_stream(['Hello'], error)
+
+        with self.assertRaises(ConnectionError):
+            list(stream)
+        stream.close()
+
+        self.assertEqual([(outcome, e) for outcome, _, e in record.finished], [('error', error)])
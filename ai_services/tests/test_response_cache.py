@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from users.models import User
+from ai_services.models import ChatMessage
+from ai_services.services import get_ai_response
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+def fake_embeddings(texts):
+    # Same question, same vector
+    return [(np.frombuffer(text.encode('utf-8').ljust(32)[:32], dtype=np.uint8).astype(np.float32), 'test-model') for text in texts]
+
+def echo_prompt(task, messages, **kwargs):
+    # An answer that leaks whatever the system prompt contained
+    message = SimpleNamespace(content=messages[0]['content'])
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')])
+
+@override_settings(CACHES=LOCMEM_CACHE, RESPONSE_CACHE_ENABLED=True)
+class SharedAnswerPrivacyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='x', first_name='Alice', last_name='Anders',
+            interests=['astronomy'], learning_style='visual',
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='x', first_name='Bob', last_name='Berg',
+            interests=['botany'], learning_style='visual',
+        )
+
+    def ask(self, user):
+        with mock.patch('ai_services.response_cache.embed_with_fallback', fake_embeddings), \
+                mock.patch('ai_services.services.routed_completion', side_effect=echo_prompt) as completion:
+            answer = get_ai_response('What is a derivative?', ChatMessage.objects.none(), user)
+        return answer, completion.call_count
+
+    def test_users_in_one_scope_never_see_each_others_name(self):
+        alice_answer, alice_calls = self.ask(self.alice)
+        bob_answer, bob_calls = self.ask(self.bob)
+
+        self.assertEqual((alice_calls, bob_calls), (1, 0))
+        self.assertEqual(bob_answer, alice_answer)
+        for answer in (alice_answer, bob_answer):
+            for private in ('Alice', 'Anders', 'astronomy', 'Bob', 'Berg', 'botany'):
+                self.assertNotIn(private, answer)
+
+    def test_uncached_answers_stay_personal(self):
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            answer, _ = self.ask(self.alice)
+
+        self.assertIn('Alice Anders', answer)
+        self.assertIn('astronomy', answer)
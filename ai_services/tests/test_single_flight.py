@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from ai_services.metrics import get_counters
+from ai_services.single_flight import (
+    FLIGHT_LOCK_KEY, FLIGHT_RESULT_KEY, SharedCallError, asingle_flight, single_flight
+)
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+class UpstreamError(Exception):
+    pass
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, LLM_SINGLE_FLIGHT_ENABLED=True, LLM_TIMEOUT=2.0,
+    LLM_SINGLE_FLIGHT_GRACE=1.0, LLM_SINGLE_FLIGHT_POLL_INTERVAL=0.01,
+)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def wait_for_followers(self, count):
+        deadline = time.monotonic() + 2
+        while get_counters('llm.single_flight.shared').get('llm.single_flight.shared', 0) < count:
+            self.assertLess(time.monotonic(), deadline, "followers never joined the flight")
+            time.sleep(0.01)
+
+    def run_flight(self, key, operation, followers):
+        outcomes = [None] * (followers + 1)
+
+        def call(i):
+            try:
+                outcomes[i] = ('result', single_flight(key, operation))
+            except Exception as e:
+                outcomes[i] = ('error', e)
+
+        leader = threading.Thread(target=call, args=(0,))
+        leader.start()
+        self.started.wait(2)
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(1, followers + 1)]
+        for thread in threads:
+            thread.start()
+        self.wait_for_followers(followers)
+        self.release.set()
+        for thread in [leader] + threads:
+            thread.join(5)
+        return outcomes
+
+    def blocking_operation(self, calls, error=None):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+        def operation():
+            calls.append(1)
+            self.started.set()
+            self.release.wait(2)
+            if error is not None:
+                raise error
+            return 'answer'
+        return operation
+
+    def test_followers_share_the_leaders_result(self):
+        calls = []
+        outcomes = self.run_flight('ok', self.blocking_operation(calls), followers=3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(outcomes, [('result', 'answer')] * 4)
+
+    def test_leader_error_reaches_every_follower(self):
+        calls = []
+        error = UpstreamError('rate limited')
+        outcomes = self.run_flight('fails', self.blocking_operation(calls, error), followers=3)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(outcomes, [('error', error)] * 4)
+
+    def test_failed_flight_is_not_remembered(self):
+        calls = []
+        self.run_flight('retry', self.blocking_operation(calls, UpstreamError('down')), followers=1)
+        self.assertEqual(single_flight('retry', lambda: 'recovered'), 'recovered')
+        self.assertIsNone(cache.get(FLIGHT_LOCK_KEY.format(key='retry')))
+
+    def test_error_from_another_worker_is_a_shared_call_error(self):
+        cache.set(FLIGHT_LOCK_KEY.format(key='remote'), 'flight-1')
+        cache.set(FLIGHT_RESULT_KEY.format(key='remote', flight_id='flight-1'), {'error': 'upstream timed out'})
+
+        with self.assertRaisesMessage(SharedCallError, 'upstream timed out'):
+            single_flight('remote', lambda: self.fail("a follower must not call upstream"))
+
+    def test_result_from_another_worker_is_shared(self):
+        cache.set(FLIGHT_LOCK_KEY.format(key='remote'), 'flight-1')
+        cache.set(FLIGHT_RESULT_KEY.format(key='remote', flight_id='flight-1'), {'result': 'answer'})
+
+        self.assertEqual(single_flight('remote', lambda: self.fail("a follower must not call upstream")), 'answer')
+
+    def test_leader_that_vanishes_fails_its_followers(self):
+        lock_key = FLIGHT_LOCK_KEY.format(key='vanished')
+        cache.set(lock_key, 'flight-1')
+        threading.Timer(0.1, cache.delete, args=(lock_key,)).start()
+
+        with self.assertRaisesMessage(SharedCallError, 'ended without a result'):
+            single_flight('vanished', lambda: self.fail("a follower must not call upstream"))
+
+    def test_async_followers_share_the_leaders_error(self):
+        calls = []
+        error = UpstreamError('bad gateway')
+
+        async def operation():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            raise error
+
+        async def main():
+            return await asyncio.gather(*[asingle_flight('async', operation) for _ in range(4)], return_exceptions=True)
+
+        self.assertEqual(asyncio.run(main()), [error] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_cancelled_follower_does_not_cancel_the_flight(self):
+        async def operation():
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            leader = asyncio.ensure_future(asingle_flight('cancel', operation))
+            follower = asyncio.ensure_future(asingle_flight('cancel', operation))
+            await asyncio.sleep(0.01)
+            follower.cancel()
+            return await leader
+
+        self.assertEqual(asyncio.run(main()), 'answer')
@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import (
     ChatSessionViewSet, AIFeedbackViewSet, RecommendationViewSet,
-    VoiceAssistantViewSet, AssessmentViewSet
+    VoiceAssistantViewSet, AssessmentViewSet, MetricsViewSet
 )
 
 router = DefaultRouter()
@@ -11,8 +12,19 @@ router.register(r'feedback', AIFeedbackViewSet, basename='feedback')
 router.register(r'recommendations', RecommendationViewSet, basename='recommendations')
 router.register(r'voice', VoiceAssistantViewSet, basename='voice')
 router.register(r'assessment', AssessmentViewSet, basename='assessment')
+router.register(r'metrics', MetricsViewSet, basename='metrics')
+
+# Async (ASGI) versions of the LLM-bound endpoints
+async_urlpatterns = [
+    path('chat/<int:pk>/send_message/', async_views.send_message, name='async-chat-send-message'),
+    path('recommendations/grade_essay/', async_views.grade_essay, name='async-grade-essay'),
+    path('assessment/personalized_feedback/', async_views.personalized_feedback, name='async-personalized-feedback'),
+    path('assessment/study_plan/', async_views.study_plan, name='async-study-plan'),
+    path('voice/command/', async_views.voice_command, name='async-voice-command'),
+]
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
 ]
 
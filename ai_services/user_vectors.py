@@ -0,0 +1,228 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .embedding_index import course_index
+from .embedding_providers import active_embedding_model
+from .embedding_queue import schedule_embedding_refresh
+from .models import UserEmbedding
+
+SOURCE_TEXT = 'text'
+SOURCE_INCREMENTAL = 'incremental'
+
+# Default weight of each event type in the user vector
+DEFAULT_EVENT_WEIGHTS = {
+    'enrollment': 1.0,
+    'activity': 0.25,
+}
+
+class UserEmbeddingPending(Exception):
+    """
+    The user has no usable embedding yet; one is being generated in the background.
+    """
+
+def incremental_mode():
+    """
+    Whether user vectors are maintained incrementally from course vectors.
+    """
+    return getattr(settings, 'USER_EMBEDDING_MODE', SOURCE_INCREMENTAL) == SOURCE_INCREMENTAL
+
+def event_weight(event):
+    weights = getattr(settings, 'USER_EMBEDDING_EVENT_WEIGHTS', DEFAULT_EVENT_WEIGHTS)
+    return weights.get(event, DEFAULT_EVENT_WEIGHTS.get(event, 0.0))
+
+def decay_factor(elapsed_seconds):
+    """
+    Exponential decay for an event `elapsed_seconds` old.
+
+    Args:
+        elapsed_seconds: Age of the event (negative ages are treated as zero)
+
+    Returns:
+        float: Weight multiplier in (0, 1]
+    """
+    half_life = getattr(settings, 'USER_EMBEDDING_HALF_LIFE_DAYS', 30) * 86400
+    return 0.5 ** (max(elapsed_seconds, 0) / half_life)
+
+def activity_course_id(activity):
+    """
+    Map a LearningActivity to the course it concerns, or None.
+
+    Args:
+        activity: The LearningActivity object
+    """
+    from courses.models import Lesson, Quiz
+
+    if activity.content_type == 'course':
+        return activity.content_id
+    if activity.content_type == 'lesson':
+        return Lesson.objects.filter(id=activity.content_id).values_list('course_id', flat=True).first()
+    if activity.content_type == 'quiz':
+        return Quiz.objects.filter(id=activity.content_id).values_list('lesson__course_id', flat=True).first()
+    return None
+
+def activity_course_ids(activities):
+    """
+    Map LearningActivities to the courses they concern, with one query per
+    content type rather than one per activity.
+
+    Args:
+        activities: LearningActivity objects
+
+    Returns:
+        list: The course ID (or None) of each activity, in order
+    """
+    from courses.models import Lesson, Quiz
+
+    lesson_ids = [activity.content_id for activity in activities if activity.content_type == 'lesson']
+    quiz_ids = [activity.content_id for activity in activities if activity.content_type == 'quiz']
+    lesson_courses = dict(Lesson.objects.filter(id__in=lesson_ids).values_list('id', 'course_id')) if lesson_ids else {}
+    quiz_courses = dict(Quiz.objects.filter(id__in=quiz_ids).values_list('id', 'lesson__course_id')) if quiz_ids else {}
+
+    course_ids = []
+    for activity in activities:
+        if activity.content_type == 'course':
+            course_ids.append(activity.content_id)
+        elif activity.content_type == 'lesson':
+            course_ids.append(lesson_courses.get(activity.content_id))
+        elif activity.content_type == 'quiz':
+            course_ids.append(quiz_courses.get(activity.content_id))
+        else:
+            course_ids.append(None)
+    return course_ids
+
+def _embedding_model():
+    # Incremental vectors are sums of course vectors, so they share their space
+    return active_embedding_model()
+
+def apply_user_event(user_id, course_id, event, occurred_at=None):
+    """
+    Fold one enrollment or activity into a user's vector in O(dimensions).
+
+    The stored vector is an exponentially time-decayed, weighted sum of the
+    normalized course vectors the user interacted with, kept relative to
+    `decayed_at`. Adding an event decays the sum to the event time and adds
+    the course vector, so no other events have to be read.
+
+    Args:
+        user_id: The user ID
+        course_id: The course the event concerns
+        event: 'enrollment' or 'activity'
+        occurred_at: When the event happened (defaults to now)
+
+    Returns:
+        bool: True if the vector was updated
+    """
+    course_vector = course_index.get_vector(course_id)
+    if course_vector is None:
+        return False
+
+    occurred_at = occurred_at or timezone.now()
+    weight = event_weight(event)
+
+    with transaction.atomic():
+        user_embedding = UserEmbedding.objects.select_for_update().filter(user_id=user_id).first()
+
+        if user_embedding is None or not user_embedding.is_incremental(course_vector.shape[0]):
+            # No incremental state to extend yet; derive it from the full history once
+            transaction.on_commit(lambda: rebuild_user_vector(user_id))
+            return False
+
+        elapsed = (occurred_at - user_embedding.decayed_at).total_seconds()
+        if elapsed >= 0:
+            decay = decay_factor(elapsed)
+            vector = user_embedding.get_vector() * decay + weight * course_vector
+            weight_sum = user_embedding.weight_sum * decay + weight
+            decayed_at = occurred_at
+        else:
+            # Late event: decay it to the stored reference time instead
+            decay = decay_factor(-elapsed)
+            vector = user_embedding.get_vector() + weight * decay * course_vector
+            weight_sum = user_embedding.weight_sum + weight * decay
+            decayed_at = user_embedding.decayed_at
+
+        user_embedding.set_incremental_vector(vector, _embedding_model(), weight_sum, decayed_at)
+        user_embedding.save()
+
+    return True
+
+def rebuild_user_vector(user_id):
+    """
+    Recompute a user's incremental vector from their enrollments and recent
+    activities. Used to seed the vector and after enrollments are removed.
+
+    Args:
+        user_id: The user ID
+
+    Returns:
+        UserEmbedding: The saved embedding, or None if none of the user's
+            courses has a vector yet
+    """
+    from courses.models import Enrollment
+    from users.models import LearningActivity
+
+    events = [
+        (course_id, 'enrollment', enrolled_at)
+        for course_id, enrolled_at in Enrollment.objects.filter(user_id=user_id).values_list('course_id', 'enrolled_at')
+    ]
+    activities = list(LearningActivity.objects.filter(
+        user_id=user_id, content_type__in=['course', 'lesson', 'quiz']
+    ).order_by('-created_at')[:50])
+    for activity, course_id in zip(activities, activity_course_ids(activities)):
+        if course_id is not None:
+            events.append((course_id, 'activity', activity.created_at))
+
+    now = timezone.now()
+    vector = None
+    weight_sum = 0.0
+    for course_id, event, occurred_at in events:
+        course_vector = course_index.get_vector(course_id)
+        if course_vector is None:
+            continue
+        weight = event_weight(event) * decay_factor((now - occurred_at).total_seconds())
+        vector = weight * course_vector if vector is None else vector + weight * course_vector
+        weight_sum += weight
+
+    if vector is None:
+        return None
+
+    with transaction.atomic():
+        user_embedding = UserEmbedding.objects.select_for_update().filter(user_id=user_id).first()
+        if user_embedding is None:
+            user_embedding = UserEmbedding(user_id=user_id)
+        user_embedding.set_incremental_vector(vector, _embedding_model(), weight_sum, now)
+        user_embedding.save()
+
+    return user_embedding
+
+def get_user_embedding(user):
+    """
+    Return the embedding recommendations are scored against, without network
+    calls when possible.
+
+    In incremental mode a missing vector is derived from the user's course
+    history. A user with no embedded courses at all gets a text embedding
+    of their profile, generated in the background so the request is not
+    held up by the embeddings API.
+
+    Args:
+        user: The user object
+
+    Returns:
+        UserEmbedding: The user's embedding
+
+    Raises:
+        UserEmbeddingPending: The embedding is queued; serve a fallback meanwhile
+    """
+    user_embedding = UserEmbedding.objects.filter(user=user).first()
+    if (user_embedding is not None and user_embedding.has_current_format()
+            and user_embedding.model_name == active_embedding_model()):
+        return user_embedding
+
+    if incremental_mode():
+        user_embedding = rebuild_user_vector(user.id)
+        if user_embedding is not None:
+            return user_embedding
+
+    # Cold start: embed the profile text
+    schedule_embedding_refresh('user', user.id)
+    raise UserEmbeddingPending(f"Embedding for user {user.id} is being generated")
@@ -0,0 +1,178 @@
+import json
+import os
+import pickle
+import uuid
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+# Storage formats for embedding_vector blobs
+VECTOR_FORMAT_PICKLE = 0  # Legacy pickled numpy array, read only by convert_embeddings
+VECTOR_FORMAT_FLOAT32 = 1  # Raw little-endian float32 bytes
+
+CURRENT_VECTOR_FORMAT = VECTOR_FORMAT_FLOAT32
+VECTOR_DTYPE = np.dtype('<f4')
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_MANIFEST = 'courses.json'
+
+def encode_vector(vector):
+    """
+    Serialize an embedding vector in the current storage format.
+
+    Args:
+        vector: 1-D array-like embedding
+
+    Returns:
+        bytes: Raw little-endian float32 bytes
+    """
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+def decode_vector(blob, vector_format=CURRENT_VECTOR_FORMAT, dimensions=None, allow_pickle=False):
+    """
+    Deserialize an embedding vector.
+
+    Args:
+        blob: The stored bytes (bytes or memoryview)
+        vector_format: The format the blob was written in
+        dimensions: Expected vector length, checked when given
+        allow_pickle: Whether legacy pickled blobs may be loaded
+
+    Returns:
+        numpy.ndarray: The float32 embedding vector
+    """
+    if vector_format == VECTOR_FORMAT_PICKLE:
+        if not allow_pickle:
+            raise ValueError("Legacy pickled embedding; run the convert_embeddings command")
+        vector = np.asarray(pickle.loads(bytes(blob)), dtype=np.float32)
+    elif vector_format == VECTOR_FORMAT_FLOAT32:
+        vector = np.frombuffer(bytes(blob), dtype=VECTOR_DTYPE).astype(np.float32, copy=False)
+    else:
+        raise ValueError(f"Unknown embedding vector format: {vector_format}")
+
+    if dimensions and vector.shape[0] != dimensions:
+        raise ValueError(f"Expected {dimensions} dimensions, got {vector.shape[0]}")
+
+    return vector
+
+def get_snapshot_dir():
+    return getattr(settings, 'EMBEDDING_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'embedding_snapshots'))
+
+def read_snapshot_manifest(directory=None):
+    """
+    Read the manifest of the current course embedding snapshot.
+
+    Args:
+        directory: Snapshot directory (defaults to EMBEDDING_SNAPSHOT_DIR)
+
+    Returns:
+        dict: The manifest, or None if no snapshot has been written
+    """
+    path = os.path.join(directory or get_snapshot_dir(), SNAPSHOT_MANIFEST)
+    try:
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return None
+    return manifest
+
+def write_course_snapshot(directory=None):
+    """
+    Write all course embeddings to a memory-mappable snapshot.
+
+    The snapshot is a pair of .npy files (a pre-normalized float32 matrix and
+    a parallel int64 course ID array) plus a JSON manifest. New files are
+    written under a fresh generation name and the manifest is swapped in
+    atomically, so readers never see a half-written snapshot.
+
+    Args:
+        directory: Snapshot directory (defaults to EMBEDDING_SNAPSHOT_DIR)
+
+    Returns:
+        dict: The manifest of the new snapshot
+    """
+    from .embedding_index import indexed_embeddings, normalize
+
+    directory = directory or get_snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    rows = indexed_embeddings().values_list('course_id', 'embedding_vector', 'model_name', 'dimensions', 'updated_at')
+
+    ids = []
+    vectors = []
+    model_name = ''
+    dimensions = 0
+    synced_at = None
+    for course_id, blob, row_model, row_dimensions, updated_at in rows.iterator(chunk_size=2000):
+        # Keep a single vector space; rows from another model wait for re-embedding
+        if not dimensions:
+            model_name, dimensions = row_model, row_dimensions
+        if row_dimensions != dimensions:
+            continue
+        ids.append(course_id)
+        vectors.append(normalize(decode_vector(blob, dimensions=dimensions)))
+        if synced_at is None or updated_at > synced_at:
+            synced_at = updated_at
+
+    matrix = np.vstack(vectors) if vectors else np.empty((0, dimensions), dtype=np.float32)
+
+    generation = f"{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    vectors_file = f"courses-{generation}.vectors.npy"
+    ids_file = f"courses-{generation}.ids.npy"
+    np.save(os.path.join(directory, vectors_file), matrix.astype(VECTOR_DTYPE, copy=False))
+    np.save(os.path.join(directory, ids_file), np.array(ids, dtype='<i8'))
+
+    previous = read_snapshot_manifest(directory)
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'generation': generation,
+        'model_name': model_name,
+        'dimensions': dimensions,
+        'count': len(ids),
+        'synced_at': synced_at.isoformat() if synced_at else None,
+        'vectors_file': vectors_file,
+        'ids_file': ids_file,
+    }
+
+    temp_path = os.path.join(directory, f".{SNAPSHOT_MANIFEST}.{generation}")
+    with open(temp_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(temp_path, os.path.join(directory, SNAPSHOT_MANIFEST))
+
+    # Processes that still map the old files keep their pages until they reload
+    if previous:
+        for name in (previous['vectors_file'], previous['ids_file']):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+    return manifest
+
+def load_course_snapshot(directory=None):
+    """
+    Memory-map the current course embedding snapshot.
+
+    Args:
+        directory: Snapshot directory (defaults to EMBEDDING_SNAPSHOT_DIR)
+
+    Returns:
+        tuple: (manifest, vectors, ids) with read-only memory-mapped arrays,
+            or None if no usable snapshot exists
+    """
+    directory = directory or get_snapshot_dir()
+    manifest = read_snapshot_manifest(directory)
+    if manifest is None:
+        return None
+
+    try:
+        vectors = np.load(os.path.join(directory, manifest['vectors_file']), mmap_mode='r')
+        ids = np.load(os.path.join(directory, manifest['ids_file']), mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        return None
+
+    return manifest, vectors, ids
@@ -1,15 +1,20 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Substr
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from datetime import timedelta
 from .models import ChatSession, ChatMessage, AIFeedback
 from .serializers import (
-    ChatSessionSerializer, ChatMessageSerializer, ChatMessageCreateSerializer,
+    ChatSessionSerializer, ChatSessionListSerializer, ChatMessageSerializer, ChatMessageCreateSerializer,
     AIFeedbackSerializer, CourseRecommendationRequestSerializer,
     EssayGradingRequestSerializer
 )
 from .services import (
-    get_ai_response, generate_course_recommendations,
+    get_ai_response, stream_ai_response, generate_course_recommendations,
     grade_essay, update_user_embedding
 )
 from .voice_services import (
@@ -20,20 +25,75 @@ from .assessment_services import (
     analyze_quiz_results, generate_personalized_feedback,
     identify_knowledge_gaps, generate_study_plan
 )
+from .llm_usage import get_call_tags, llm_call_tags, reset_call_tags, set_call_tags, summarize_llm_usage
+from .metrics import get_counters, increment
+from .pagination import MessageKeysetPagination
+from .renderers import EventStreamRenderer, sse_event
+from .user_vectors import incremental_mode
 
-class ChatSessionViewSet(viewsets.ModelViewSet):
+class LLMCallTagsMixin:
+    """
+    Attribute LLM calls made while handling a request to the endpoint
+    ('<basename>.<action>') and the user (see ai_services.llm_usage).
+    """
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.llm_call_tags_token = set_call_tags(f"{self.basename}.{self.action}", request.user)
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'llm_call_tags_token', None)
+        if token is not None:
+            reset_call_tags(token)
+            self.llm_call_tags_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+class ChatSessionViewSet(LLMCallTagsMixin, viewsets.ModelViewSet):
     """
     API endpoint for chat sessions.
     """
     serializer_class = ChatSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    # Characters of the last message shown in session lists
+    PREVIEW_LENGTH = 100
+    
     def get_queryset(self):
-        return ChatSession.objects.filter(user=self.request.user)
+        queryset = ChatSession.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            last_message = ChatMessage.objects.filter(
+                session=OuterRef('pk')
+            ).order_by('-created_at', '-id').annotate(
+                preview=Substr('content', 1, self.PREVIEW_LENGTH)
+            )
+            queryset = queryset.annotate(
+                message_count=Count('messages'),
+                last_activity=Coalesce(Max('messages__created_at'), F('created_at')),
+                last_message_preview=Subquery(last_message.values('preview')[:1]),
+            ).order_by('-updated_at')  # Meta.ordering is not applied to aggregate queries
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ChatSessionListSerializer
+        return ChatSessionSerializer
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """
+        Page through a session's messages, newest first.
+        
+        Pass the `cursor` from `next` to get older messages; `limit` sets
+        the page size (default 50, max 200).
+        """
+        session = self.get_object()
+        paginator = MessageKeysetPagination()
+        page = paginator.paginate_queryset(ChatMessage.objects.filter(session=session), request, view=self)
+        return paginator.get_paginated_response(ChatMessageSerializer(page, many=True).data)
+    
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
         """
@@ -57,7 +117,9 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
             ai_response = get_ai_response(
                 user_message.content,
                 context_messages,
-                request.user
+                request.user,
+                session=session,
+                use_cache=serializer.validated_data['use_cache']
             )
             
             # Save AI response
@@ -78,6 +140,74 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'], renderer_classes=[EventStreamRenderer, JSONRenderer])
+    def stream_message(self, request, pk=None):
+        """
+        Send a message to the AI assistant and stream the response as
+        Server-Sent Events.
+        
+        Events: `user_message` (the saved user message), unnamed events
+        with `{"delta": ...}` as tokens arrive, then `assistant_message`
+        once the reply is saved, or `error` if generation fails. If the
+        client disconnects, the upstream completion is cancelled and no
+        assistant message is saved.
+        """
+        session = self.get_object()
+        serializer = ChatMessageCreateSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Save user message
+        user_message = ChatMessage.objects.create(
+            session=session,
+            role='user',
+            content=serializer.validated_data['content']
+        )
+        context_messages = ChatMessage.objects.filter(session=session).order_by('created_at')
+        # The body is generated after the view returns; keep its LLM calls attributed
+        call_tags = get_call_tags()
+        
+        def generate_events():
+            yield sse_event(ChatMessageSerializer(user_message).data, 'user_message')
+            
+            deltas = stream_ai_response(
+                user_message.content, context_messages, request.user,
+                session=session, use_cache=serializer.validated_data['use_cache']
+            )
+            chunks = []
+            try:
+                for delta in deltas:
+                    chunks.append(delta)
+                    yield sse_event({'delta': delta})
+            except GeneratorExit:
+                # The server closes the response when the client goes away
+                increment('chat.stream.cancelled')
+                raise
+            except Exception as e:
+                print(f"Error streaming AI response: {str(e)}")
+                yield sse_event({'detail': "I'm sorry, I'm having trouble processing your request right now. Please try again later."}, 'error')
+                return
+            finally:
+                deltas.close()
+            
+            assistant_message = ChatMessage.objects.create(
+                session=session,
+                role='assistant',
+                content=''.join(chunks)
+            )
+            session.save()  # This will update the updated_at field
+            yield sse_event(ChatMessageSerializer(assistant_message).data, 'assistant_message')
+        
+        def events():
+            with llm_call_tags(call_tags.get('endpoint'), request.user):
+                yield from generate_events()
+        
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+        return response
+
 class AIFeedbackViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for AI feedback.
@@ -88,7 +218,7 @@ class AIFeedbackViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         return AIFeedback.objects.filter(user=self.request.user)
 
-class RecommendationViewSet(viewsets.ViewSet):
+class RecommendationViewSet(LLMCallTagsMixin, viewsets.ViewSet):
     """
     API endpoint for AI-powered recommendations.
     """
@@ -104,8 +234,10 @@ class RecommendationViewSet(viewsets.ViewSet):
             count = serializer.validated_data['count']
             include_enrolled = serializer.validated_data['include_enrolled']
             
-            # Update user embedding before generating recommendations
-            update_user_embedding(request.user)
+            # Text-mode user embeddings are refreshed before scoring; incremental
+            # ones are kept current by enrollment and activity events
+            if not incremental_mode():
+                update_user_embedding(request.user)
             
             # Get recommendations
             recommendations = generate_course_recommendations(
@@ -148,7 +280,7 @@ class RecommendationViewSet(viewsets.ViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class VoiceAssistantViewSet(viewsets.ViewSet):
+class VoiceAssistantViewSet(LLMCallTagsMixin, viewsets.ViewSet):
     """
     API endpoint for voice assistant features.
     """
@@ -327,7 +459,7 @@ class VoiceAssistantViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class AssessmentViewSet(viewsets.ViewSet):
+class AssessmentViewSet(LLMCallTagsMixin, viewsets.ViewSet):
     """
     API endpoint for assessment and feedback features.
     """
@@ -418,3 +550,28 @@ class AssessmentViewSet(viewsets.ViewSet):
         
         return Response(plan)
 
+
+class MetricsViewSet(viewsets.ViewSet):
+    """
+    API endpoint for AI service counters (staff only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def list(self, request):
+        """
+        Get all counters, optionally filtered by a name prefix.
+        """
+        return Response(get_counters(request.query_params.get('prefix', '')))
+    
+    @action(detail=False, methods=['get'])
+    def llm_usage(self, request):
+        """
+        Get LLM calls, latency, tokens and estimated cost per endpoint,
+        route and model over the last `days` days (default 7).
+        """
+        try:
+            days = int(request.query_params.get('days', 7))
+        except ValueError:
+            return Response({"error": "days must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(summarize_llm_usage(timezone.now() - timedelta(days=days)))
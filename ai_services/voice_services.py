@@ -4,12 +4,14 @@ import uuid
 from pathlib import Path
 import requests
 from django.conf import settings
-from openai import OpenAI
 from pydub import AudioSegment
 from gtts import gTTS
+from .llm import transcribe
 
-# Initialize OpenAI client
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# Phrases that trigger built-in voice commands
+SEARCH_COMMANDS = ('find course', 'search course', 'search for course')
+ENROLLMENT_COMMANDS = ('my courses', 'enrolled courses')
+RESUME_COMMANDS = ('continue learning', 'resume course')
 
 def transcribe_audio(audio_file_path):
     """
@@ -22,11 +24,7 @@ def transcribe_audio(audio_file_path):
         str: Transcribed text
     """
     try:
-        with open(audio_file_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
+        transcription = transcribe(audio_file_path, model="whisper-1")
         return transcription.text
     except Exception as e:
         print(f"Error transcribing audio: {str(e)}")
@@ -99,6 +97,28 @@ def convert_lesson_to_audio(lesson_id, language='en'):
         print(f"Error converting lesson to audio: {str(e)}")
         return None
 
+def attach_spoken_response(command_response):
+    """
+    Add an `audio_url` with the spoken message to a command response that
+    asks for one.
+    
+    Args:
+        command_response: Response dict from process_command_text
+        
+    Returns:
+        dict: The same response
+    """
+    if command_response.get('speak_response', False):
+        response_text = command_response.get('message', '')
+        audio_path = text_to_speech(response_text)
+        
+        if audio_path:
+            # Get relative path for URL
+            relative_path = os.path.relpath(audio_path, settings.MEDIA_ROOT)
+            command_response['audio_url'] = f"{settings.MEDIA_URL}{relative_path}"
+    
+    return command_response
+
 def process_voice_command(audio_file_path, user):
     """
     Process a voice command from the user.
@@ -124,16 +144,7 @@ def process_voice_command(audio_file_path, user):
         command_response = process_command_text(transcription, user)
         
         # Generate audio response if needed
-        if command_response.get('speak_response', False):
-            response_text = command_response.get('message', '')
-            audio_path = text_to_speech(response_text)
-            
-            if audio_path:
-                # Get relative path for URL
-                relative_path = os.path.relpath(audio_path, settings.MEDIA_ROOT)
-                command_response['audio_url'] = f"{settings.MEDIA_URL}{relative_path}"
-        
-        return command_response
+        return attach_spoken_response(command_response)
     
     except Exception as e:
         print(f"Error processing voice command: {str(e)}")
@@ -159,7 +170,7 @@ def process_command_text(command_text, user):
     command = command_text.lower()
     
     # Check for course-related commands
-    if 'find course' in command or 'search course' in command or 'search for course' in command:
+    if any(phrase in command for phrase in SEARCH_COMMANDS):
         # Extract search term
         search_terms = command.split('course')[-1].strip()
         if search_terms:
@@ -184,7 +195,7 @@ def process_command_text(command_text, user):
                 }
     
     # Check for enrollment-related commands
-    elif 'my courses' in command or 'enrolled courses' in command:
+    elif any(phrase in command for phrase in ENROLLMENT_COMMANDS):
         enrollments = Enrollment.objects.filter(user=user)
         if enrollments:
             courses = [{'id': e.course.id, 'title': e.course.title, 'slug': e.course.slug, 
@@ -206,7 +217,7 @@ def process_command_text(command_text, user):
             }
     
     # Check for lesson-related commands
-    elif 'continue learning' in command or 'resume course' in command:
+    elif any(phrase in command for phrase in RESUME_COMMANDS):
         # Find the most recently accessed lesson
         from courses.models import LessonProgress
         
@@ -244,43 +255,83 @@ def process_command_text(command_text, user):
     else:
         from .services import get_ai_response
         
-        # Create a temporary chat session for this command
-        from .models import ChatSession, ChatMessage
-        
-        session, created = ChatSession.objects.get_or_create(
-            user=user,
-            title="Voice Assistant Session",
-            defaults={'title': "Voice Assistant Session"}
-        )
-        
-        # Save the user's message
-        user_message = ChatMessage.objects.create(
-            session=session,
-            role='user',
-            content=command_text
-        )
-        
-        # Get context from previous messages
-        context_messages = ChatMessage.objects.filter(session=session).order_by('created_at')
+        session, context_messages = start_voice_question(command_text, user)
         
         # Get AI response
-        ai_response = get_ai_response(command_text, context_messages, user)
+        ai_response = get_ai_response(command_text, context_messages, user, session)
         
-        # Save AI response
-        assistant_message = ChatMessage.objects.create(
-            session=session,
-            role='assistant',
-            content=ai_response
-        )
+        return finish_voice_question(session, command_text, ai_response)
+
+def is_builtin_command(command_text):
+    """
+    Whether a text command is handled without the AI assistant.
+    """
+    command = command_text.lower()
+    return any(
+        phrase in command
+        for phrase in SEARCH_COMMANDS + ENROLLMENT_COMMANDS + RESUME_COMMANDS
+    )
+
+def start_voice_question(command_text, user):
+    """
+    Save a question for the AI assistant in the user's voice session.
+    
+    Args:
+        command_text: The question
+        user: User object
         
-        return {
-            'success': True,
-            'action': 'ai_response',
-            'data': {
-                'question': command_text,
-                'answer': ai_response
-            },
-            'message': ai_response,
-            'speak_response': True
-        }
+    Returns:
+        tuple: (session, context_messages)
+    """
+    # Create a temporary chat session for this command
+    from .models import ChatSession, ChatMessage
+    
+    session, created = ChatSession.objects.get_or_create(
+        user=user,
+        title="Voice Assistant Session",
+        defaults={'title': "Voice Assistant Session"}
+    )
+    
+    # Save the user's message
+    ChatMessage.objects.create(
+        session=session,
+        role='user',
+        content=command_text
+    )
+    
+    # Get context from previous messages
+    context_messages = ChatMessage.objects.filter(session=session).order_by('created_at')
+    
+    return session, context_messages
 
+def finish_voice_question(session, command_text, ai_response):
+    """
+    Save the AI assistant's answer and build the command response.
+    
+    Args:
+        session: The voice ChatSession
+        command_text: The question
+        ai_response: The assistant's answer
+        
+    Returns:
+        dict: Response with action and data
+    """
+    from .models import ChatMessage
+    
+    # Save AI response
+    ChatMessage.objects.create(
+        session=session,
+        role='assistant',
+        content=ai_response
+    )
+    
+    return {
+        'success': True,
+        'action': 'ai_response',
+        'data': {
+            'question': command_text,
+            'answer': ai_response
+        },
+        'message': ai_response,
+        'speak_response': True
+    }
@@ -16,6 +16,7 @@ from .serializers import (
 )
 from .permissions import IsInstructorOrReadOnly, IsEnrolledOrInstructor
 from ai_services.tasks import grade_essay_response
+from ai_services.course_neighbors import get_similar_courses
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -39,6 +40,12 @@ class CourseViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description', 'short_description']
     ordering_fields = ['created_at', 'title', 'lesson_count']
     
+    def get_queryset(self):
+        if self.action == 'similar':
+            # Only looks the course up; the lesson counts are not needed
+            return Course.objects.all()
+        return super().get_queryset()
+    
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return CourseDetailSerializer
@@ -78,6 +85,30 @@ class CourseViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    @action(detail=True, methods=['get'])
+    def similar(self, request, slug=None):
+        """
+        Get courses similar to this one from the precomputed neighbour lists.
+        
+        Query params: `source` ('content' or 'collaborative') and `count`.
+        """
+        course = self.get_object()
+        source = request.query_params.get('source', 'content')
+        if source not in ('content', 'collaborative'):
+            return Response(
+                {"detail": "source must be 'content' or 'collaborative'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            count = min(max(int(request.query_params.get('count', 10)), 1), 50)
+        except ValueError:
+            return Response(
+                {"detail": "count must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response(get_similar_courses(course.slug, count=count, source=source))
+    
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def my_courses(self, request):
         """
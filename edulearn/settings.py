@@ -88,6 +88,15 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by all web and Celery workers (metrics, coalescing and result caches)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://localhost:6379/1'),
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -166,6 +175,95 @@ CORS_ALLOW_CREDENTIALS = True
 
 # OpenAI API settings
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))  # Seconds per LLM call, retries included
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))  # Retries on timeouts, rate limits and server errors
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', '0.5'))  # Seconds; doubles per retry, full jitter
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', '8'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))  # Pooled connections per process
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))  # Consecutive failures that open the circuit
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))  # Open time before a trial call
+LLM_SINGLE_FLIGHT_ENABLED = os.getenv('LLM_SINGLE_FLIGHT_ENABLED', 'True') == 'True'  # Share one call among identical concurrent requests
+LLM_SINGLE_FLIGHT_GRACE = float(os.getenv('LLM_SINGLE_FLIGHT_GRACE', '5'))  # Seconds past LLM_TIMEOUT before a flight lock expires
+LLM_SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv('LLM_SINGLE_FLIGHT_POLL_INTERVAL', '0.05'))  # Seconds between checks for another worker's result
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')  # 'openai', 'record' (live, saving fixtures) or 'replay' (fixtures only, no network)
+LLM_FIXTURE_DIR = os.getenv('LLM_FIXTURE_DIR', os.path.join(BASE_DIR, 'llm_fixtures'))
+LLM_REPLAY_STRICT = os.getenv('LLM_REPLAY_STRICT', 'False') == 'True'  # Fail unrecorded requests instead of reusing a similar fixture
+LLM_REPLAY_LATENCY = os.getenv('LLM_REPLAY_LATENCY', 'none')  # 'none', 'recorded' or 'synthetic'
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv('LLM_REPLAY_LATENCY_SCALE', '1'))  # Multiplier for recorded latencies
+LLM_REPLAY_LATENCY_BASE = float(os.getenv('LLM_REPLAY_LATENCY_BASE', '0.5'))  # Synthetic seconds to first token
+LLM_REPLAY_LATENCY_PER_TOKEN = float(os.getenv('LLM_REPLAY_LATENCY_PER_TOKEN', '0.02'))  # Synthetic seconds per completion token
+LLM_REPLAY_LATENCY_JITTER = float(os.getenv('LLM_REPLAY_LATENCY_JITTER', '0.25'))  # Sigma of the log-normal jitter
+LLM_REPLAY_SEED = int(os.getenv('LLM_REPLAY_SEED')) if os.getenv('LLM_REPLAY_SEED') else None  # Fixed seed for repeatable latencies
+LLM_CALL_LOG_ENABLED = os.getenv('LLM_CALL_LOG_ENABLED', 'True') == 'True'  # Write an LLMCallLog row per provider call
+LLM_PRICING = {  # USD per 1K tokens (prompt, completion), by model name prefix
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5-turbo': (0.0015, 0.002),
+    'text-embedding-ada-002': (0.0001, 0.0),
+}
+LLM_ROUTING_ENABLED = os.getenv('LLM_ROUTING_ENABLED', 'True') == 'True'  # Off: every routed call uses LLM_LARGE_MODEL
+LLM_SMALL_MODEL = os.getenv('LLM_SMALL_MODEL', 'gpt-3.5-turbo')
+LLM_LARGE_MODEL = os.getenv('LLM_LARGE_MODEL', 'gpt-4')
+LLM_ROUTES = {  # Per call site: prompt tokens always sent to the small model, most it may take, latency SLO of the large model
+    'chat': {'short_prompt_tokens': 600, 'max_small_prompt_tokens': 3000, 'slo_ms': 4000},
+    'essay_grading': {'short_prompt_tokens': 800, 'max_small_prompt_tokens': 3000, 'slo_ms': 8000},
+    'feedback': {'short_prompt_tokens': 1500, 'max_small_prompt_tokens': 3000, 'slo_ms': 8000},
+    'study_plan': {'short_prompt_tokens': 1500, 'max_small_prompt_tokens': 3000, 'slo_ms': 10000},
+}
+
+# Embedding settings
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'openai')  # 'openai', 'hashing' or 'tfidf' (local, no network)
+EMBEDDING_FALLBACK_PROVIDER = os.getenv('EMBEDDING_FALLBACK_PROVIDER', 'hashing')  # Used when the provider fails; '' disables
+EMBEDDING_LOCAL_DIMENSIONS = int(os.getenv('EMBEDDING_LOCAL_DIMENSIONS', '512'))  # Hashing vectorizer features
+EMBEDDING_LOCAL_MODEL_PATH = os.getenv('EMBEDDING_LOCAL_MODEL_PATH', os.path.join(BASE_DIR, 'embedding_models', 'tfidf-svd.npz'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '256'))  # Inputs per embeddings API request
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', '100000'))  # Estimated tokens per request
+EMBEDDING_REFRESH_CHUNK_SIZE = int(os.getenv('EMBEDDING_REFRESH_CHUNK_SIZE', '500'))  # Objects per bulk refresh task
+EMBEDDING_REFRESH_DEBOUNCE = int(os.getenv('EMBEDDING_REFRESH_DEBOUNCE', '30'))  # Seconds to coalesce refreshes per object
+EMBEDDING_RETRY_DELAY = int(os.getenv('EMBEDDING_RETRY_DELAY', '600'))  # Seconds before re-embedding a fallback-provider vector
+
+# User vectors: 'incremental' (time-decayed sum of course vectors) or 'text' (profile text embedding)
+USER_EMBEDDING_MODE = os.getenv('USER_EMBEDDING_MODE', 'incremental')
+USER_EMBEDDING_HALF_LIFE_DAYS = float(os.getenv('USER_EMBEDDING_HALF_LIFE_DAYS', '30'))
+USER_EMBEDDING_EVENT_WEIGHTS = {
+    'enrollment': 1.0,
+    'activity': 0.25,
+}
+
+# Recommendation settings
+RECOMMENDER_INDEX_REFRESH_INTERVAL = int(os.getenv('RECOMMENDER_INDEX_REFRESH_INTERVAL', '30'))  # Seconds between index sync checks
+RECOMMENDER_INDEX_SYNC_MARGIN = int(os.getenv('RECOMMENDER_INDEX_SYNC_MARGIN', '60'))  # Seconds of overlap when reading rows changed since the last sync
+RECOMMENDER_INDEX_MAX_DELTA = int(os.getenv('RECOMMENDER_INDEX_MAX_DELTA', '5000'))  # Rows held outside the snapshot before a reload
+RECOMMENDER_ANN_BACKEND = os.getenv('RECOMMENDER_ANN_BACKEND', 'exact')  # 'exact', 'ivf' or 'lsh'
+RECOMMENDER_ANN_MIN_COURSES = int(os.getenv('RECOMMENDER_ANN_MIN_COURSES', '20000'))  # Below this, exact search is used
+RECOMMENDER_ANN_PROBES = int(os.getenv('RECOMMENDER_ANN_PROBES', '8'))  # IVF clusters or LSH buckets visited per query
+RECOMMENDER_COMPACT_SCORING = os.getenv('RECOMMENDER_COMPACT_SCORING', 'True') == 'True'  # Rank snapshot rows on PCA/int8 vectors
+RECOMMENDER_PCA_COMPONENTS = int(os.getenv('RECOMMENDER_PCA_COMPONENTS', '128'))
+RECOMMENDER_QUANTIZE = os.getenv('RECOMMENDER_QUANTIZE', 'True') == 'True'  # int8 codes with a per-vector scale
+RECOMMENDER_COMPACT_RERANK = int(os.getenv('RECOMMENDER_COMPACT_RERANK', '4'))  # Candidates per result rescored at full precision
+RECOMMENDER_NEIGHBORS = int(os.getenv('RECOMMENDER_NEIGHBORS', '20'))  # Stored neighbours per course
+RECOMMENDER_NEIGHBOR_BLOCK_SIZE = int(os.getenv('RECOMMENDER_NEIGHBOR_BLOCK_SIZE', '1000'))  # Courses per matrix multiply in content rebuilds
+RECOMMENDER_NEIGHBOR_CANDIDATES = int(os.getenv('RECOMMENDER_NEIGHBOR_CANDIDATES', '100'))  # Nearest courses whose lists an embedding change re-checks
+RECOMMENDER_COLLAB_WEIGHT = float(os.getenv('RECOMMENDER_COLLAB_WEIGHT', '0.3'))  # Share of collaborative score in the blend
+RECOMMENDER_COLLAB_MIN_SUPPORT = int(os.getenv('RECOMMENDER_COLLAB_MIN_SUPPORT', '2'))  # Minimum co-enrollments per pair
+RECOMMENDER_COLLAB_BLOCK_SIZE = int(os.getenv('RECOMMENDER_COLLAB_BLOCK_SIZE', '2000'))  # Courses per sparse product
+RECOMMENDATION_CACHE_TTL = int(os.getenv('RECOMMENDATION_CACHE_TTL', '3600'))  # Seconds a cached ranking may be served
+RECOMMENDATION_CACHE_DEPTH = int(os.getenv('RECOMMENDATION_CACHE_DEPTH', '50'))  # Ranked courses kept beyond enrolled ones
+RECOMMENDATION_DIGEST_COUNT = int(os.getenv('RECOMMENDATION_DIGEST_COUNT', '10'))  # Courses per user in batch runs
+RECOMMENDATION_BATCH_USER_BLOCK = int(os.getenv('RECOMMENDATION_BATCH_USER_BLOCK', '2000'))  # Users scored per block
+RECOMMENDATION_BATCH_COURSE_BLOCK = int(os.getenv('RECOMMENDATION_BATCH_COURSE_BLOCK', '10000'))  # Courses per matrix multiply
+POPULARITY_TRENDING_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_TRENDING_HALF_LIFE_DAYS', '7'))  # Decay of the trending score
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '3000'))  # Prompt tokens per assistant reply
+CHAT_CONTEXT_MAX_MESSAGES = int(os.getenv('CHAT_CONTEXT_MAX_MESSAGES', '50'))  # Recent messages considered for the prompt
+CHAT_RECENT_TOKENS = int(os.getenv('CHAT_RECENT_TOKENS', '1500'))  # Unsummarized history allowed before older turns are summarized
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv('CHAT_SUMMARY_MAX_TOKENS', '400'))
+CHAT_SUMMARY_MODEL = os.getenv('CHAT_SUMMARY_MODEL', 'gpt-3.5-turbo')
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'  # Semantic cache of assistant answers
+RESPONSE_CACHE_THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.95'))  # Cosine similarity needed to reuse an answer
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '86400'))  # Seconds a cached answer may be served
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '256'))  # Answers per scope before LRU eviction
+EMBEDDING_SNAPSHOT_DIR = os.getenv('EMBEDDING_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'embedding_snapshots'))
 
 # Celery settings
 CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
@@ -174,6 +272,28 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'build-course-embedding-snapshot': {
+        'task': 'ai_services.tasks.build_course_embedding_snapshot',
+        'schedule': 15 * 60,
+    },
+    'refresh-course-popularity': {
+        'task': 'ai_services.tasks.refresh_course_popularity_task',
+        'schedule': 60 * 60,
+    },
+    'build-collaborative-neighbors': {
+        'task': 'ai_services.tasks.build_collaborative_neighbors_task',
+        'schedule': 24 * 60 * 60,
+    },
+    'build-content-neighbors': {
+        'task': 'ai_services.tasks.build_content_neighbors_task',
+        'schedule': 24 * 60 * 60,
+    },
+    'generate-recommendation-digests': {
+        'task': 'ai_services.tasks.generate_recommendation_digests',
+        'schedule': 7 * 24 * 60 * 60,
+    },
+}
 
 # Logging configuration
 LOGGING = {